@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the contrast checks of the keyboard focus indicator check.
+
+Generates random focus style records, each with the base and focused text and
+background colors of an element, its outline color and its box shadow colors,
+as computed style strings. For each record, it decides whether the focus is
+visible: a text or background color change with enough contrast, or an
+outline or box shadow with enough contrast with the background. The legacy
+checks parse every color with a regular expression and compute the luminance
+with a power per channel, pair by pair, while crest.utils.contrast parses each
+distinct color once and computes all the ratios at once. The analysis of
+FocusIndicator on the same records, as compact style records, is timed too.
+
+Usage: PYTHONPATH=src python benchmarks/contrast_benchmark.py [--records N]
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import argparse
+import json
+import random
+import re
+import time
+
+import numpy as np
+
+from crest.perceivable import keyboard_focus_indicator
+from crest.utils import contrast
+
+RATIO = keyboard_focus_indicator.FOCUS_CONTRAST_RATIO
+# Computed styles of an element without border, outline or box shadow.
+DEFAULT_STYLES = dict(
+    {name: "rgb(0, 0, 0)" for name in keyboard_focus_indicator.FOCUS_COLOR_STYLES},
+    **{name: "0px" for name in keyboard_focus_indicator.FOCUS_WIDTH_STYLES},
+    **{name: "none" for name in keyboard_focus_indicator.FOCUS_KEYWORD_STYLES},
+)
+
+
+def legacy_extract_color(color):
+    return [int(i) for i in re.search(r"\((.*?)\)", color).group(1).split(",")[:3]]
+
+
+def legacy_luminance(color):
+    channels = []
+    for value in color:
+        value /= 255
+        channels.append(value / 12.92 if value <= 0.03928 else ((value + 0.055) / 1.055) ** 2.4)
+    return 0.2126 * channels[0] + 0.7152 * channels[1] + 0.0722 * channels[2]
+
+
+def legacy_ratio_check(color1, color2):
+    ratio = (legacy_luminance(color1) + 0.05) / (legacy_luminance(color2) + 0.05)
+    return ratio <= 1 / RATIO or ratio >= RATIO
+
+
+def legacy_is_visible(record):
+    check = legacy_ratio_check
+    fg_old, fg_new, bg_old, bg_new, outline = (
+        legacy_extract_color(record[name])
+        for name in ("fg_old", "fg_new", "bg_old", "bg_new", "outline")
+    )
+    if fg_old != fg_new and (
+        check(fg_old, fg_new) or check(bg_old, fg_new) or check(bg_new, fg_new)
+    ):
+        return True
+    if bg_old != bg_new and (
+        check(bg_old, bg_new) or check(fg_old, bg_new) or check(fg_new, bg_new)
+    ):
+        return True
+    if check(outline, bg_new):
+        return True
+    return any(check(legacy_extract_color(color), bg_new) for color in record["shadows"])
+
+
+def vectorized_is_visible(records):
+    colors = {
+        name: keyboard_focus_indicator.get_color_array([record[name] for record in records])
+        for name in ("fg_old", "fg_new", "bg_old", "bg_new")
+    }
+    lum = {name: array[2] for name, array in colors.items()}
+    visible = keyboard_focus_indicator.is_visible_contrast
+    fg_change = keyboard_focus_indicator.is_color_change(colors["fg_old"], colors["fg_new"]) & (
+        visible(lum["fg_old"], lum["fg_new"])
+        | visible(lum["bg_old"], lum["fg_new"])
+        | visible(lum["bg_new"], lum["fg_new"])
+    )
+    bg_change = keyboard_focus_indicator.is_color_change(colors["bg_old"], colors["bg_new"]) & (
+        visible(lum["bg_old"], lum["bg_new"])
+        | visible(lum["fg_old"], lum["bg_new"])
+        | visible(lum["fg_new"], lum["bg_new"])
+    )
+    outline = visible(contrast.luminance([record["outline"] for record in records]), lum["bg_new"])
+    owners = np.array([i for i, record in enumerate(records) for _ in record["shadows"]], dtype=int)
+    shadow_lum = contrast.luminance([color for record in records for color in record["shadows"]])
+    shadow = np.zeros(len(records), dtype=bool)
+    np.logical_or.at(shadow, owners, visible(shadow_lum, lum["bg_new"][owners]))
+    return fg_change | bg_change | outline | shadow
+
+
+def make_records(count, palette_size):
+    # Pages use a limited palette: colors are drawn from palette_size colors.
+    rng = random.Random(0)
+    palette = [
+        "rgb(%d, %d, %d)" % (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+        for _ in range(palette_size)
+    ]
+    records = []
+    for _ in range(count):
+        fg, bg = rng.choice(palette), rng.choice(palette)
+        records.append(
+            {
+                "fg_old": fg,
+                "fg_new": fg if rng.random() < 0.7 else rng.choice(palette),
+                "bg_old": bg,
+                "bg_new": bg if rng.random() < 0.7 else rng.choice(palette),
+                "outline": rng.choice(palette),
+                "shadows": rng.sample(palette, rng.choice((0, 0, 1, 2))),
+            }
+        )
+    return records
+
+
+def to_focus_records(records):
+    # (base styles, focused record) of FocusIndicator for the records.
+    base_css, focused = [], []
+    for i, record in enumerate(records):
+        base = dict(
+            DEFAULT_STYLES,
+            **{"text-decoration-color": record["fg_old"], "background-color": record["bg_old"]},
+        )
+        new = dict(
+            DEFAULT_STYLES,
+            **{
+                "text-decoration-color": record["fg_new"],
+                "background-color": record["bg_new"],
+                "outline-color": record["outline"],
+                "outline-style": "solid",
+                "outline-width": "2px",
+                "box-shadow": ", ".join(color + " 0px 0px 3px" for color in record["shadows"])
+                or "none",
+            },
+        )
+        base_css.append(keyboard_focus_indicator.compact_styles(base))
+        # Sent by the page as JSON.
+        styles = json.loads(json.dumps(keyboard_focus_indicator.compact_styles(new)))
+        focused.append((i, i, styles))
+    return base_css, focused
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--records", type=int, default=10000, help="Number of records")
+    parser.add_argument("--palette", type=int, default=200, help="Number of distinct colors")
+    args = parser.parse_args()
+
+    records = make_records(args.records, args.palette)
+    print(f"{args.records} records, {args.palette} distinct colors")
+    legacy_ms, legacy = timed(lambda: [legacy_is_visible(record) for record in records])
+    contrast.parse_color.cache_clear()
+    vectorized_ms, vectorized = timed(vectorized_is_visible, records)
+    print(
+        f"contrast checks: legacy {legacy_ms:8.1f} ms, vectorized {vectorized_ms:8.1f} ms, "
+        f"speed-up x{legacy_ms / max(vectorized_ms, 0.001):.1f}"
+    )
+    print("Same results:", legacy == vectorized.tolist())
+
+    base_css, focused = to_focus_records(records)
+    focus_indicator = object.__new__(keyboard_focus_indicator.FocusIndicator)
+    focus_indicator.base_css = base_css
+    focus_indicator.focus_low_elems = []
+    focus_indicator.focus_missing_elems = []
+    analysis_ms, _ = timed(focus_indicator.analyse_focus, focused)
+    failed = len(focus_indicator.focus_low_elems) + len(focus_indicator.focus_missing_elems)
+    print(f"FocusIndicator.analyse_focus: {analysis_ms:8.1f} ms, {failed} failed elements")
+    print("Same failed elements:", failed == legacy.count(False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the injected xpath/CSS path helpers.
+
+Builds a synthetic DOM of about 50,000 nodes (a wide table plus deeply nested
+lists) in headless Chrome, then times the legacy helpers, which walk the
+previous siblings of every ancestor, against the memoized helpers defined in
+crest.utils, computing the locator of every element. Timings are measured
+inside the page with performance.now(), so they exclude WebDriver overhead.
+
+Usage: PYTHONPATH=src python benchmarks/locator_benchmark.py [--nodes N]
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import argparse
+
+from crest import utils
+from crest.utils import get_common_function
+
+LEGACY_HELPERS_JS = """
+window.legacyAbsoluteXPath = function(element) {
+    var comp, comps = [];
+    var xpath = '';
+    var getPos = function(element) {
+        var position = 1, curNode;
+        if (element.nodeType == Node.ATTRIBUTE_NODE) {
+            return null;
+        }
+        for (curNode = element.previousSibling; curNode; curNode = curNode.previousSibling) {
+            if (curNode.nodeName == element.nodeName) {
+                ++position;
+            }
+        }
+        return position;
+    }
+    for (; element && !(element instanceof Document); element = element.parentNode) {
+        comp = comps[comps.length] = {};
+        comp.name = element.nodeType == Node.TEXT_NODE ? 'text()' : element.nodeName;
+        comp.position = getPos(element);
+    }
+    for (var i = comps.length - 1; i >= 0; i--) {
+        comp = comps[i];
+        xpath += '/' + comp.name.toLowerCase() + '[' + comp.position + ']';
+    }
+    return xpath;
+};
+window.legacyCssPath = function (el) {
+    var path = [];
+    while (el.nodeType === Node.ELEMENT_NODE) {
+        var selector = el.nodeName.toLowerCase();
+        if (el.id) {
+            path.unshift(selector + "#" + el.id);
+            break;
+        }
+        var sib = el, nth = 1;
+        while (sib = sib.previousElementSibling) {
+            if (sib.nodeName.toLowerCase() == selector) nth++;
+        }
+        if (nth != 1) selector += ":nth-of-type(" + nth + ")";
+        path.unshift(selector);
+        el = el.parentNode;
+    }
+    return path.join(" > ");
+};
+"""
+
+BUILD_DOM_JS = """
+var nodes = arguments[0];
+document.body.innerHTML = '';
+var table = document.createElement('table');
+var tbody = table.appendChild(document.createElement('tbody'));
+var count = 0;
+// Half of the nodes in a wide table: rows of 4 cells.
+while (count < nodes / 2) {
+    var row = tbody.appendChild(document.createElement('tr'));
+    count++;
+    for (var c = 0; c < 4; c++) {
+        row.appendChild(document.createElement('td')).textContent = 'x';
+        count += 2;
+    }
+}
+document.body.appendChild(table);
+// The other half in nested lists, 20 levels deep.
+while (count < nodes) {
+    var parent = document.body;
+    for (var d = 0; d < 20 && count < nodes; d++) {
+        var list = parent.appendChild(document.createElement('ul'));
+        parent = list.appendChild(document.createElement('li'));
+        count += 2;
+    }
+}
+return document.getElementsByTagName('*').length;
+"""
+
+TIME_JS = """
+var fn = window[arguments[0]];
+var elements = Array.prototype.slice.call(document.body.getElementsByTagName('*'));
+var start = performance.now();
+for (var i = 0; i < elements.length; i++) {
+    fn(elements[i]);
+}
+return performance.now() - start;
+"""
+
+CHECK_JS = """
+var elements = Array.prototype.slice.call(document.body.getElementsByTagName('*'));
+for (var i = 0; i < elements.length; i++) {
+    if (absoluteXPath(elements[i]) != legacyAbsoluteXPath(elements[i])
+            || cssPath(elements[i]) != legacyCssPath(elements[i])) {
+        return false;
+    }
+}
+return true;
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--nodes", type=int, default=50000, help="Number of DOM nodes")
+    args = parser.parse_args()
+
+    driver = get_common_function.get_driver()
+    try:
+        driver.get("about:blank")
+        elements = driver.execute_script(BUILD_DOM_JS, args.nodes)
+        driver.execute_script(LEGACY_HELPERS_JS)
+        utils.define_absolute_xpath_fn(driver)
+        utils.define_css_path_fn(driver)
+        print(f"Synthetic DOM: {elements} elements")
+        for legacy, current in (
+            ("legacyAbsoluteXPath", "absoluteXPath"),
+            ("legacyCssPath", "cssPath"),
+        ):
+            legacy_ms = driver.execute_script(TIME_JS, legacy)
+            current_ms = driver.execute_script(TIME_JS, current)
+            print(
+                f"{current:>14}: legacy {legacy_ms:9.1f} ms, "
+                f"memoized {current_ms:9.1f} ms, "
+                f"speed-up x{legacy_ms / max(current_ms, 0.001):.1f}"
+            )
+        print("Same locators:", driver.execute_script(CHECK_JS))
+    finally:
+        driver.quit()
+
+
+if __name__ == "__main__":
+    main()
@@ -41,8 +41,15 @@ setuptools.setup(
         "pandas>=1.0.5",
         "numpy>=1.19.0",
         "lxml>=4.5.2",
+        "cssselect>=1.1.0",
         "flask>=1.1.2",
         "flask_cors>=3.0.10",
         "torch",
     ],
+    entry_points={
+        "console_scripts": [
+            "crest-scan=crest.cli:main",
+            "crest-serve=crest.serve:main",
+        ],
+    },
 )
\ No newline at end of file
@@ -12,90 +12,150 @@ import re
 import traceback
 import logging
 from crest.composition.clarity import ClarityComposition
-from crest.perceivable.keyboard_focus_indicator import FocusIndicator
+from crest.perceivable.keyboard_focus_indicator import FocusIndicator, get_base_css, get_target_keys
 from crest.perceivable.cc_transcript import AudioVideo
 from crest.operable.heading_analysis import HeadingContent
-from multiprocessing import Process
+from crest.all_in_one.page_session import PageSession, Task, iter_graph
 from crest.config import *
+from crest.utils import snapshot
+from crest.utils import timeline
 from crest.utils.get_common_function import *
-from threading import *
+
+# Checks run by AllFuncCheck, on top of a single PageSession.
+CHECKS = ("kfi", "ht", "ct", "cc")
+
 
 class AllFuncCheck:
-    def __init__(self, url, locator= global_args["reporttype"]):
+    def __init__(self, url, locator= global_args["reporttype"], focus_mode=None):
+        # focus_mode: traversal mode of the keyboard focus indicator check.
         self.url = to_valid_url(url)
         self.locator = locator
+        self.focus_mode = focus_mode
+
+    def run_cc(self, session):
+        dom_snapshot = session.artifact("snapshot", snapshot.capture)
+        response = ClarityComposition(self.url, self.locator, dom_snapshot=dom_snapshot).main()
+        with timeline.span("serialize"):
+            return response.asdict(), 200
+
+    def run_kfi(self, session):
+        dom_snapshot = session.artifact("snapshot", snapshot.capture)
+        base_css = get_base_css(dom_snapshot)
+        target_keys = get_target_keys(dom_snapshot)
+        with session.tab(clone=True) as driver:
+            return FocusIndicator(
+                self.url, self.locator, driver, base_css, self.focus_mode, target_keys
+            ).main()
+
+    def run_ct(self, session):
+        # The visibility of the media is read in the cloned page itself.
+        with session.tab(clone=True) as driver:
+            return AudioVideo(self.url, self.locator, driver).main()
+
+    def run_ht(self, session):
+        return HeadingContent(self.url, self.locator, session.page_source()).main()
+
+    def iter_results(self):
+        # Yield the name and the (response, status code) of each check, in
+        # order of completion. Checks raising an exception yield a failed
+        # response, while a page that cannot be loaded raises.
+        session = PageSession(self.url)
+        tasks = {
+            "page": Task(session.open),
+            "dom": Task(session.page_source, ("page",)),
+            "snapshot": Task(lambda: session.artifact("snapshot", snapshot.capture), ("page",)),
+            "cc": Task(lambda: self.run_cc(session), ("snapshot",)),
+            "kfi": Task(lambda: self.run_kfi(session), ("snapshot",)),
+            "ct": Task(lambda: self.run_ct(session), ("page",)),
+            "ht": Task(lambda: self.run_ht(session), ("dom",)),
+        }
+        graph = iter_graph(tasks)
+        try:
+            for name, future in graph:
+                if name == "page":
+                    future.result()
+                elif name in CHECKS:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logging.exception("Exception in check %s", name)
+                        result = failed_response(e)
+                    yield name, result
+        finally:
+            graph.close()
+            session.close()
+
+    def stream(self):
+        # Yield the name, response and status code of each check as soon as it
+        # completes, then of the merged response, named "all".
+        self.start_time = time.time()
+        responses = {}
+        try:
+            for name, (response, status_code) in self.iter_results():
+                responses[name] = response, status_code
+                yield name, response, status_code
+            with timeline.span("merge"):
+                merged = merge_responses(
+                    self.url, [responses[name] for name in CHECKS], self.start_time
+                )
+            yield ("all",) + merged
+        except Exception as e:
+            logging.exception("Exception in AllFuncCheck")
+            yield ("all",) + failed_response(e)
 
     def main(self):
         try:
             self.start_time = time.time()
-            fi = FocusIndicator(self.url, self.locator)
-            hc = HeadingContent(self.url, self.locator)
-            av = AudioVideo(self.url, self.locator)
-            cc = ClarityComposition(self.url, self.locator)
-            
-            responses = {}
-            kfi_thread = Thread(
-                target=lambda responses, arg: responses.update({"kfi": fi.main()}),
-                args=(responses, ""),
-            )
-            ht_thread = Thread(
-                target=lambda responses, arg: responses.update({"ht": hc.main()}),
-                args=(responses, ""),
-            )
-            ct_thread = Thread(
-                target=lambda responses, arg: responses.update({"ct": av.main()}),
-                args=(responses, ""),
-            )
-            cc_thread = Thread(
-                target=lambda responses, arg: responses.update({"cc": (cc.main().asdict(), 200)}),
-                args=(responses, ""),
-            )
-            kfi_thread.start()
-            ht_thread.start()
-            ct_thread.start()
-            cc_thread.start()
-            kfi_thread.join()
-            ht_thread.join()
-            ct_thread.join()
-            cc_thread.join()
-
-            categories_error_count =0
-            categories_error_items ={}
-            categories_alert_count =0
-            categories_alert_items ={}
-            all_item_count =0
-            total_elements =0
-            total_videos =0
-            total_audios =0
-            for response, _ in responses.values():
-                all_item_count += response['statistics']['allitemcount']
-                total_elements += response['statistics']['totalelements']
-                if 'totalvideos' in response['statistics'].keys():
-                    total_videos += response['statistics']['totalvideos']
-                
-                if 'totalaudios' in response['statistics'].keys():
-                    total_audios += response['statistics']['totalaudios']
-                
-                if 'error' in response['categories'].keys():
-                    categories_error_count += response['categories']['error']['count']
-                    categories_error_items.update(response['categories']['error']['items'])
-                
-                if 'alert' in response['categories'].keys():
-                    categories_alert_count += response['categories']['alert']['count']
-                    categories_alert_items.update(response['categories']['alert']['items'])
-            
-            output = {}
-            output["categories"] = {}
-            success_status = 200
-            if categories_error_count !=0:
-                output["categories"]["error"]={"count": categories_error_count, "description": "Errors", "items": categories_error_items}
-            if categories_alert_count !=0:
-                output["categories"]["alert"]={"count": categories_alert_count, "description": "Alerts", "items": categories_alert_items}
-            output["statistics"] = {'allitemcount': all_item_count, 'totalvideos': total_videos, 'totalaudios': total_audios, 'pageurl': self.url, 'time': round(time.time() - self.start_time, 2), 'totalelements': total_elements}
-            output["status"] = {'httpstatuscode': success_status, 'success': 'True'}
-            return output, success_status
+            responses = dict(self.iter_results())
+            with timeline.span("merge"):
+                return merge_responses(
+                    self.url, [responses[name] for name in CHECKS], self.start_time
+                )
         except Exception as e:
             logging.exception("Exception in AllFuncCheck")
-            response={}
-            response['status']={'success':"False", 'error':"Failed with exception [%s]" % type(e).__name__}
-            return response, 400 
+            return failed_response(e)
+
+
+def failed_response(e):
+    response={}
+    response['status']={'success':"False", 'error':"Failed with exception [%s]" % type(e).__name__}
+    return response, 400
+
+
+def merge_responses(url, responses, start_time):
+    # Merge the (response, status code) of the checks into a single response.
+    categories_error_count =0
+    categories_error_items ={}
+    categories_alert_count =0
+    categories_alert_items ={}
+    all_item_count =0
+    total_elements =0
+    total_videos =0
+    total_audios =0
+    for response, _ in responses:
+        all_item_count += response['statistics']['allitemcount']
+        total_elements += response['statistics']['totalelements']
+        if 'totalvideos' in response['statistics'].keys():
+            total_videos += response['statistics']['totalvideos']
+
+        if 'totalaudios' in response['statistics'].keys():
+            total_audios += response['statistics']['totalaudios']
+
+        if 'error' in response['categories'].keys():
+            categories_error_count += response['categories']['error']['count']
+            categories_error_items.update(response['categories']['error']['items'])
+
+        if 'alert' in response['categories'].keys():
+            categories_alert_count += response['categories']['alert']['count']
+            categories_alert_items.update(response['categories']['alert']['items'])
+
+    output = {}
+    output["categories"] = {}
+    success_status = 200
+    if categories_error_count !=0:
+        output["categories"]["error"]={"count": categories_error_count, "description": "Errors", "items": categories_error_items}
+    if categories_alert_count !=0:
+        output["categories"]["alert"]={"count": categories_alert_count, "description": "Alerts", "items": categories_alert_items}
+    output["statistics"] = {'allitemcount': all_item_count, 'totalvideos': total_videos, 'totalaudios': total_audios, 'pageurl': url, 'time': round(time.time() - start_time, 2), 'totalelements': total_elements}
+    output["status"] = {'httpstatuscode': success_status, 'success': 'True'}
+    return output, success_status
@@ -0,0 +1,208 @@
+"""
+Module providing a page session shared by several Crest checks, and a small
+dependency graph runner to schedule the checks on top of it.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+from concurrent import futures
+import contextlib
+from dataclasses import dataclass
+import logging
+import threading
+from typing import Any, Callable, Dict, Generator, Iterator, Optional, Tuple
+
+from selenium.webdriver.remote import webdriver
+
+from crest import utils
+from crest.utils import driver_pool
+from crest.utils import timeline
+
+
+class PageSession:
+    """
+    A web page loaded once in a pooled browser and shared by several checks.
+
+    The page is navigated to once, the locator helper scripts are injected,
+    and artifacts computed from the page (rendered DOM, base styles, ...) are
+    memoized so that each of them is computed only once. Checks that need to
+    interact with the page exclusively (keyboard traversal, media playback)
+    get a clone of the page, loaded in another pooled browser so that they run
+    in parallel, or in a new tab of the same browser if the pool is busy.
+
+    WebDriver commands of a browser are processed one at a time by
+    chromedriver, so access to the browser of the session is serialized by a
+    lock: a check holds it for as long as it holds its tab.
+    """
+
+    def __init__(self, url: str):
+        self._logger = logging.getLogger(__name__).getChild(self.__class__.__name__)
+        self._url = url
+        self._driver: Optional[webdriver.WebDriver] = None
+        self._main_handle: Optional[str] = None
+        self._lock = threading.RLock()
+        self._artifacts: Dict[str, Any] = {}
+
+    @property
+    def url(self) -> str:
+        """
+        The URL of the page shared by this session.
+        """
+        return self._url
+
+    def open(self):
+        """
+        Acquire a browser from the pool and load the page in it.
+        """
+        with self._lock:
+            if self._driver is not None:
+                return
+            driver = driver_pool.get_pool().acquire()
+            try:
+                self._logger.info("Fetching URL %s", self._url)
+                driver.get(self._url)
+                self._inject_helpers(driver)
+                self._main_handle = driver.current_window_handle
+            except Exception:
+                driver_pool.get_pool().release(driver)
+                raise
+            self._driver = driver
+
+    def close(self):
+        """
+        Give the browser back to the pool. The pool closes the cloned tabs
+        that are still open.
+        """
+        with self._lock:
+            driver, self._driver = self._driver, None
+            self._artifacts.clear()
+        if driver is not None:
+            driver_pool.get_pool().release(driver)
+
+    @contextlib.contextmanager
+    def tab(self, clone: bool = False) -> Iterator[webdriver.WebDriver]:
+        """
+        Context manager giving exclusive access to the page.
+
+        :param clone: If True, the page is loaded again in another browser of
+            the pool, given back when the context exits, or if none is
+            available without waiting, in a new tab of the same browser, closed
+            when the context exits. Otherwise the main tab of the session is
+            used.
+        :yield: The WebDriver instance, switched to the requested tab.
+        """
+        if self._driver is None:
+            raise RuntimeError("Page session is not open")
+        if clone:
+            driver = driver_pool.get_pool().try_acquire()
+            if driver is not None:
+                try:
+                    driver.get(self._url)
+                    self._inject_helpers(driver)
+                    yield driver
+                finally:
+                    driver_pool.get_pool().release(driver)
+                return
+            self._logger.debug("No idle browser, cloning the page in a tab")
+        with self._lock:
+            if self._driver is None:
+                raise RuntimeError("Page session is not open")
+            driver = self._driver
+            if not clone:
+                driver.switch_to.window(self._main_handle)
+                yield driver
+                return
+            driver.switch_to.new_window("tab")
+            try:
+                driver.get(self._url)
+                self._inject_helpers(driver)
+                yield driver
+            finally:
+                try:
+                    driver.close()
+                finally:
+                    driver.switch_to.window(self._main_handle)
+
+    def artifact(self, name: str, factory: Callable[[webdriver.WebDriver], Any]) -> Any:
+        """
+        Get an artifact computed from the page in the main tab, computing it on
+        first use.
+
+        :param name: The unique name of the artifact.
+        :param factory: Function computing the artifact from the WebDriver.
+        :return: The artifact.
+        """
+        with self._lock:
+            if name not in self._artifacts:
+                with self.tab() as driver:
+                    self._artifacts[name] = factory(driver)
+            return self._artifacts[name]
+
+    def page_source(self) -> str:
+        """
+        Get the rendered DOM of the page, serialized as HTML.
+        """
+        return self.artifact("page_source", lambda driver: driver.page_source)
+
+    @staticmethod
+    def _inject_helpers(driver: webdriver.WebDriver):
+        """
+        Define the locator helper functions in the current tab.
+        """
+        utils.define_absolute_xpath_fn(driver)
+        utils.define_css_path_fn(driver)
+
+
+@dataclass
+class Task:
+    """
+    A node of a dependency graph: a function to run once all the tasks it
+    depends on are complete.
+    """
+
+    fn: Callable[[], Any]
+    deps: Tuple[str, ...] = ()
+
+
+def _in_span(name: str, fn: Callable[[], Any]) -> Callable[[], Any]:
+    def run():
+        with timeline.span(name):
+            return fn()
+
+    return run
+
+
+def iter_graph(
+    tasks: Dict[str, Task], max_workers: Optional[int] = None
+) -> Generator[Tuple[str, futures.Future], None, None]:
+    """
+    Run a dependency graph of tasks on a thread pool, starting every task as
+    soon as its dependencies are complete, whether they succeeded or not.
+    Tasks run in the context of the caller, each in a span of its timeline
+    named after the task.
+
+    :param tasks: The tasks by name.
+    :param max_workers: Maximum number of tasks running concurrently.
+    :yield: The name and Future of each task, in order of completion.
+    """
+    for name, task in tasks.items():
+        for dep in task.deps:
+            if dep not in tasks:
+                raise ValueError(f"Task {name} depends on unknown task {dep}")
+    done = set()
+    running: Dict[futures.Future, str] = {}
+    with futures.ThreadPoolExecutor(max_workers=max_workers or len(tasks)) as executor:
+        while len(done) < len(tasks):
+            started = set(running.values())
+            for name, task in tasks.items():
+                if name not in done and name not in started:
+                    if all(dep in done for dep in task.deps):
+                        fn = utils.propagate_context(_in_span(name, task.fn))
+                        running[executor.submit(fn)] = name
+            if not running:
+                raise ValueError("Dependency cycle between tasks")
+            completed, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+            for future in completed:
+                name = running.pop(future)
+                done.add(name)
+                yield name, future
@@ -0,0 +1,146 @@
+"""
+Module running checks on batches of pages, from URL lists and sitemaps.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import collections
+from concurrent import futures
+import gzip
+import logging
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+import urllib.parse
+
+from lxml import etree
+
+from crest import checks
+from crest import utils
+from crest import config
+from crest.utils import get_common_function
+
+_SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+
+# A page of a batch, its JSON response and HTTP status code.
+PageResult = Tuple[str, Dict[str, Any], int]
+
+
+class UnsafeSitemapError(ValueError):
+    """
+    A sitemap is a local file, while only http(s) URLs may be fetched.
+    """
+
+
+def parse_sitemap(xml: bytes, max_depth: int = 3, local: bool = False) -> List[str]:
+    """
+    Get the page URLs of a sitemap, fetching the sitemaps listed by a sitemap
+    index. Listed sitemaps that may not be fetched are skipped.
+
+    :param xml: The sitemap, or sitemap index, XML document, possibly
+        gzipped.
+    :param max_depth: The maximum number of nested sitemap indexes to follow.
+    :param local: Whether the listed sitemaps may be local files, see
+        load_sitemap.
+    :return: The page URLs, in order.
+    """
+    if xml[:2] == b"\x1f\x8b":
+        xml = gzip.decompress(xml)
+    root = etree.fromstring(xml, etree.XMLParser(resolve_entities=False, no_network=True))
+    namespace = _SITEMAP_NS if root.tag.startswith(_SITEMAP_NS) else ""
+    locations = [
+        loc.text.strip()
+        for loc in root.iter(f"{namespace}loc")
+        if loc.text and loc.text.strip()
+    ]
+    if root.tag != f"{namespace}sitemapindex":
+        return locations
+    urls = []
+    for location in locations:
+        if max_depth <= 0:
+            logging.warning("Sitemap index nested too deep, skipping %s", location)
+            continue
+        try:
+            urls += load_sitemap(location, max_depth - 1, local)
+        except UnsafeSitemapError:
+            logging.warning("Sitemap index lists a local file, skipping %s", location)
+    return urls
+
+
+def load_sitemap(url: str, max_depth: int = 3, local: bool = False) -> List[str]:
+    """
+    Fetch a sitemap and get its page URLs, see parse_sitemap.
+
+    :param url: The URL of the sitemap, http(s) if no scheme is given.
+    :param local: Whether the sitemap, and the sitemaps it lists, may be local
+        files or file URLs, e.g. given on the command line. Otherwise, e.g.
+        for sitemaps submitted to the API, only http(s) URLs are fetched.
+    :raise UnsafeSitemapError: The sitemap is a local file, and local is
+        False.
+    """
+    if not local:
+        url = get_common_function.to_valid_url(url)
+        if urllib.parse.urlsplit(url).scheme.lower() not in ("http", "https"):
+            raise UnsafeSitemapError(f"Only http(s) sitemaps are fetched, not {url}")
+    return parse_sitemap(get_common_function.load_html(url), max_depth, local)
+
+
+def get_origin(url: str) -> str:
+    """
+    Get the origin of a URL, e.g. "https://example.com:8443".
+    """
+    parsed_url = urllib.parse.urlsplit(get_common_function.to_valid_url(url))
+    return f"{parsed_url.scheme}://{parsed_url.netloc}".lower()
+
+
+def iter_batch(
+    urls: Iterable[str],
+    check: str = "all",
+    options: Optional[Dict[str, Any]] = None,
+    workers: Optional[int] = None,
+    per_origin: Optional[int] = None,
+) -> Iterator[PageResult]:
+    """
+    Run a check on a batch of pages, with at most `workers` pages scanned at
+    once, and at most `per_origin` of them from the same origin. Pages are
+    started in order, skipping the ones whose origin is at its limit, and the
+    process-wide driver pool, models and Clarity rules are shared by the whole
+    batch. Duplicate URLs are scanned once.
+
+    :param urls: The URLs of the pages.
+    :param check: The name of the check, see checks.CHECKS.
+    :param options: The check options, as in the body of a check request.
+    :param workers: The maximum number of pages scanned at once.
+    :param per_origin: The maximum number of pages of a single origin scanned
+        at once.
+    :yield: The URL, JSON response and HTTP status code of each page, in order
+        of completion.
+    :raise KeyError: If the check is unknown.
+    """
+    if check not in checks.CHECKS:
+        raise KeyError(check)
+    params = config.global_args["batch"]
+    workers = max(1, workers or params["workers"])
+    per_origin = max(1, per_origin or params["per_origin"])
+    pending: Deque[str] = collections.deque(dict.fromkeys(urls))
+    running: Dict[futures.Future, str] = {}
+    active: Dict[str, int] = collections.Counter()
+    # The checks run in the context of the caller, e.g. its metrics endpoint.
+    run_check = utils.propagate_context(checks.run_check)
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            skipped: Deque[str] = collections.deque()
+            while pending and len(running) < workers:
+                url = pending.popleft()
+                origin = get_origin(url)
+                if active[origin] >= per_origin:
+                    skipped.append(url)
+                    continue
+                active[origin] += 1
+                data = dict(options or {}, url=url)
+                running[executor.submit(run_check, check, data)] = url
+            pending.extendleft(reversed(skipped))
+            completed, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+            for future in completed:
+                url = running.pop(future)
+                active[get_origin(url)] -= 1
+                response, status_code = future.result()
+                yield url, response, status_code
@@ -0,0 +1,275 @@
+"""
+Module providing the registry of the checks exposed by the API, each run from
+the JSON body of a request.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import contextlib
+import logging
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from crest.all_in_one.crest_init import AllFuncCheck, failed_response
+from crest.composition import clarity
+from crest.config import global_args
+from crest.operable import heading_analysis
+from crest.perceivable import cc_transcript
+from crest.perceivable import keyboard_focus_indicator
+from crest.utils import get_common_function
+from crest.utils import instrumented_driver
+from crest.utils import result_cache
+from crest.utils import single_flight
+from crest.utils import timeline
+
+# The JSON response of a check and its HTTP status code.
+CheckResult = Tuple[Dict[str, Any], int]
+
+
+class InvalidRequestError(ValueError):
+    """
+    The body of a check request is not a JSON object.
+    """
+
+
+def check_request(data: Any) -> Dict[str, Any]:
+    """
+    Check that the body of a check request, as parsed by Flask, is a JSON
+    object.
+
+    :param data: The parsed body, None if it is not JSON.
+    :raise InvalidRequestError: The body is not a JSON object.
+    :return: The body.
+    """
+    if not isinstance(data, dict):
+        raise InvalidRequestError("JSON object expected")
+    return data
+
+
+def _get_locator(data: Dict[str, Any]) -> int:
+    return data["reporttype"] if "reporttype" in data else global_args["reporttype"]
+
+
+def run_all(data: Dict[str, Any]) -> CheckResult:
+    return AllFuncCheck(data["url"], _get_locator(data), data.get("focus_mode")).main()
+
+
+def stream_all(data: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any], int]]:
+    """
+    Run all the checks, yielding the result of each check as soon as it
+    completes, then the merged result, named "all". If the request sets
+    "timings" or "driver_stats", the merged result gets them for all the
+    checks, see run_check().
+
+    :param data: The JSON body of the request.
+    :yield: The name of the check, its JSON response and HTTP status code.
+    """
+    with _record("all", data) as annotate:
+        for name, response, status_code in _stream_all(data):
+            if name == "all":
+                response = annotate(dict(response))
+            yield name, response, status_code
+
+
+def _stream_all(data: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any], int]]:
+    try:
+        all_func_check = AllFuncCheck(data["url"], _get_locator(data), data.get("focus_mode"))
+    except Exception as e:
+        logging.exception("Exception in check all")
+        yield ("all",) + failed_response(e)
+        return
+    yield from all_func_check.stream()
+
+
+def run_cc(data: Dict[str, Any]) -> CheckResult:
+    html = data.get("html")
+    engine = data.get(
+        "engine", "static" if html is not None else global_args["clarity_engine"]
+    )
+    clarity_composition = clarity.ClarityComposition(
+        data.get("url", ""), _get_locator(data), engine=engine, html=html
+    )
+    response = clarity_composition.main()
+    with timeline.span("serialize"):
+        response_dict = response.asdict()
+    response_dict["status"]["success"] = str(response_dict["status"]["success"])
+    return response_dict, 200 if response.status.success else 400
+
+
+def run_kfi(data: Dict[str, Any]) -> CheckResult:
+    return keyboard_focus_indicator.FocusIndicator(
+        data["url"], _get_locator(data), mode=data.get("focus_mode")
+    ).main()
+
+
+def run_ht(data: Dict[str, Any]) -> CheckResult:
+    return heading_analysis.HeadingContent(data["url"], _get_locator(data)).main()
+
+
+def run_ct(data: Dict[str, Any]) -> CheckResult:
+    return cc_transcript.AudioVideo(data["url"], _get_locator(data)).main()
+
+
+CHECKS: Dict[str, Callable[[Dict[str, Any]], CheckResult]] = {
+    "all": run_all,
+    "cc": run_cc,
+    "kfi": run_kfi,
+    "ht": run_ht,
+    "ct": run_ct,
+}
+
+# Version of each check, part of the result cache keys: bump it whenever a
+# change to the check changes its results.
+CHECK_VERSIONS: Dict[str, int] = {
+    "all": 1,
+    "cc": 1,
+    "kfi": 1,
+    "ht": 1,
+    "ct": 1,
+}
+
+# Request fields that do not change the result of a check.
+_UNCACHED_FIELDS = frozenset(
+    ("url", "html", "cache", "stream", "check", "webhook", "timings", "driver_stats")
+)
+# Request fields that do not prevent identical requests from being merged.
+_UNCOALESCED_FIELDS = frozenset(("check", "webhook"))
+
+_flights = single_flight.SingleFlight()
+
+
+def get_cache_key(name: str, data: Dict[str, Any]) -> Optional[str]:
+    """
+    Compute the result cache key of a check request, from the URL, the check
+    options, the check version and the fingerprint of the document, fetched
+    without rendering unless posted in the request.
+
+    :param name: The name of the check, a key of CHECKS.
+    :param data: The JSON body of the request.
+    :return: The cache key, None if the document could not be fetched.
+    """
+    document = data.get("html")
+    if document is None:
+        try:
+            document = get_common_function.load_html(data["url"])
+        except Exception:
+            logging.warning("Cannot fingerprint %s, not caching", data.get("url"))
+            return None
+    elif isinstance(document, str):
+        document = document.encode()
+    options = {k: v for k, v in data.items() if k not in _UNCACHED_FIELDS}
+    options.setdefault("reporttype", global_args["reporttype"])
+    if name == "cc":
+        options.setdefault("engine", global_args["clarity_engine"])
+    if name in ("kfi", "all"):
+        options.setdefault("focus_mode", global_args["focus_indicator"]["mode"])
+    return result_cache.make_key(
+        name,
+        CHECK_VERSIONS[name],
+        data.get("url", ""),
+        options,
+        result_cache.fingerprint(document),
+    )
+
+
+def _run_cached(name: str, data: Dict[str, Any]) -> CheckResult:
+    """
+    Run a check, serving its response from the result cache when possible.
+    """
+    cache = result_cache.get_cache()
+    with timeline.span("fingerprint"):
+        key = get_cache_key(name, data) if cache is not None else None
+    lookup = key is not None and data.get("cache", True)
+    if lookup:
+        entry = cache.get(key)
+        if entry is not None:
+            response, status_code, stored = entry
+            response["cache"] = {"status": "hit", "age": round(time.time() - stored, 2)}
+            return response, status_code
+    response, status_code = CHECKS[name](data)
+    if key is not None and status_code == 200:
+        cache.set(key, response, status_code)
+    response["cache"] = {"status": "miss" if lookup else "bypass", "age": 0}
+    return response, status_code
+
+
+@contextlib.contextmanager
+def _record(name: str, data: Dict[str, Any]) -> Iterator[Callable[[Dict[str, Any]], Dict[str, Any]]]:
+    """
+    Record the timeline and the WebDriver round trips of a check if the
+    request or the config asks for them, and log the round trips.
+
+    :param name: The name of the check, a key of CHECKS.
+    :param data: The JSON body of the request.
+    :yield: A function adding the recordings asked by the request to one of
+        its responses, in place.
+    """
+    with contextlib.ExitStack() as stack:
+        recorded = stack.enter_context(timeline.record(name)) if data.get("timings") else None
+        stats = None
+        if data.get("driver_stats") or global_args["driver_stats"]:
+            stats = stack.enter_context(instrumented_driver.record_commands())
+
+        def annotate(response: Dict[str, Any]) -> Dict[str, Any]:
+            if recorded is not None:
+                response["timings"] = recorded.asdict()
+            if stats is not None and data.get("driver_stats"):
+                response["driver_stats"] = stats.asdict()
+            return response
+
+        try:
+            yield annotate
+        finally:
+            if stats is not None and stats.total.calls:
+                logging.info(
+                    "WebDriver round trips of check %s on %s: %s",
+                    name,
+                    data.get("url", "posted HTML"),
+                    stats.summary(),
+                )
+
+
+def run_check(name: str, data: Dict[str, Any]) -> CheckResult:
+    """
+    Run a check, turning any exception into a failed response.
+
+    Successful responses are cached, and served from the cache unless the
+    request sets "cache" to false. The "cache" field of the response tells
+    whether it was a cache "hit", "miss" or "bypass".
+
+    Identical requests received while the check runs wait for it and get its
+    response, instead of running the check again. The "coalesced" field of the
+    response gives the number of requests that got it, and whether this one
+    was merged into another.
+
+    If the request sets "timings", the "timings" field of the response gives
+    the timeline of the check: its nested phases, with their start offset and
+    duration in milliseconds and their number of WebDriver round trips. A
+    response served from the cache or merged into another request only has
+    the phases of this request.
+
+    If the request sets "driver_stats", the "driver_stats" field of the
+    response gives the number of calls, time and serialized bytes of the
+    WebDriver round trips of the check, by command and by check method. They
+    are also logged, for every check if "driver_stats" is set in the config.
+
+    :param name: The name of the check, a key of CHECKS.
+    :param data: The JSON body of the request, answered with a failed
+        response if it is not a JSON object.
+    :return: The JSON response and the HTTP status code.
+    """
+    try:
+        check_request(data)
+        flight_key = result_cache.make_key(
+            name, {k: v for k, v in data.items() if k not in _UNCOALESCED_FIELDS}
+        )
+        with _record(name, data) as annotate:
+            (response, status_code), shared, waiters = _flights.do(
+                flight_key, lambda: _run_cached(name, data)
+            )
+            # Each request gets its own copy of the shared response.
+            response = dict(response, coalesced={"requests": waiters + 1, "shared": shared})
+            return annotate(response), status_code
+    except Exception as e:
+        logging.exception("Exception in check %s", name)
+        return failed_response(e)
@@ -0,0 +1,112 @@
+"""
+Command line interface scanning batches of pages, writing one JSON line per
+page.
+
+Usage: crest-scan [--sitemap URL] [--file FILE] [--check CHECK] [URL ...]
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import argparse
+import json
+import logging
+import sys
+from typing import List, Optional
+
+from crest import batch
+from crest import checks
+from crest import config
+from crest.utils import driver_pool
+from crest.utils import startup_util
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="crest-scan", description="Scan web pages for accessibility issues."
+    )
+    parser.add_argument("urls", nargs="*", metavar="URL", help="URL of a page to scan")
+    parser.add_argument(
+        "--sitemap", action="append", default=[], help="URL or path of a sitemap of pages to scan"
+    )
+    parser.add_argument(
+        "--file", action="append", default=[], help="File with one URL per line, - for stdin"
+    )
+    parser.add_argument(
+        "--check", choices=sorted(checks.CHECKS), default="all", help="Check to run"
+    )
+    parser.add_argument(
+        "--reporttype",
+        type=int,
+        choices=(3, 4),
+        default=config.global_args["reporttype"],
+        help="Report xpaths (3) or CSS selectors (4)",
+    )
+    parser.add_argument("--workers", type=int, help="Number of pages scanned at once")
+    parser.add_argument(
+        "--per-origin", type=int, help="Number of pages of the same origin scanned at once"
+    )
+    parser.add_argument("--no-cache", action="store_true", help="Do not use cached results")
+    parser.add_argument(
+        "--timings", action="store_true", help="Add the timeline of the checks to the results"
+    )
+    parser.add_argument(
+        "--driver-stats",
+        action="store_true",
+        help="Add the WebDriver round trips of the checks to the results",
+    )
+    parser.add_argument(
+        "--output", type=argparse.FileType("w"), default=sys.stdout, help="Output JSONL file"
+    )
+    return parser.parse_args(argv)
+
+
+def read_urls(args: argparse.Namespace) -> List[str]:
+    """
+    Get the URLs to scan from the arguments, files and sitemaps.
+    """
+    urls = list(args.urls)
+    for path in args.file:
+        with (sys.stdin if path == "-" else open(path, encoding="utf-8")) as url_file:
+            urls += [line.strip() for line in url_file if line.strip() and not line.startswith("#")]
+    for sitemap in args.sitemap:
+        urls += batch.load_sitemap(sitemap, local=True)
+    return urls
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=config.global_args["log_level"],
+        format="%(asctime)s:%(levelname)s:%(message)s",
+        stream=sys.stderr,
+    )
+    urls = read_urls(args)
+    if not urls:
+        logging.error("No URL to scan")
+        return 2
+    if args.check in ("all", "ht"):
+        startup_util.crest_init()
+    options = {"reporttype": args.reporttype}
+    if args.no_cache:
+        options["cache"] = False
+    if args.timings:
+        options["timings"] = True
+    if args.driver_stats:
+        options["driver_stats"] = True
+    failures = 0
+    try:
+        for url, response, status_code in batch.iter_batch(
+            urls, args.check, options, args.workers, args.per_origin
+        ):
+            failures += status_code != 200
+            line = dict(url=url, check=args.check, statuscode=status_code, **response)
+            args.output.write(json.dumps(line) + "\n")
+            args.output.flush()
+    finally:
+        driver_pool.close_pool()
+    logging.info("Scanned %d pages, %d failed", len(set(urls)), failures)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
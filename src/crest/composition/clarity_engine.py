@@ -0,0 +1,271 @@
+"""
+Module implementing the engines evaluating the disallowed Clarity component
+compositions on a web page.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import bisect
+import enum
+import functools
+import logging
+from typing import Dict, List, Tuple, Union
+
+import cssselect
+from lxml import etree
+from selenium.webdriver.remote import webdriver
+
+from crest.composition import clarity_components
+from crest.composition import clarity_rules
+from crest import utils
+from crest.utils import operation
+from crest.utils import snapshot
+
+class EngineType(enum.Enum):
+    """
+    Enumeration of the engines evaluating the disallowed compositions.
+    """
+
+    # Evaluate the rules in the page loaded in a browser.
+    BROWSER = "browser"
+    # Evaluate the rules on the static HTML, with no browser.
+    STATIC = "static"
+    # Use the static engine, falling back to the browser for pages rendered by
+    # JavaScript.
+    AUTO = "auto"
+    # Evaluate the rules in Python, on a snapshot of the page loaded in a
+    # browser.
+    SNAPSHOT = "snapshot"
+
+
+# A disallowed composition found in the page: the outer component, the
+# disallowed inner component and the locators of the disallowed inner elements.
+Match = Tuple[clarity_components.Component, clarity_components.Component, List[str]]
+
+_TRANSLATOR = cssselect.HTMLTranslator()
+
+# Evaluates all the rules in a single pass. The presence of every component
+# type in the page is checked first with its joined selector, so that rules
+# whose outer component is absent, and inner components absent from the page,
+# are skipped. Outer elements are visited in the same order as separate
+# find_elements calls would return them: by rule, then by outer selector, then
+# in document order.
+EVALUATE_RULES_JS = """
+var selectors = arguments[0];
+var rules = arguments[1];
+var locate = window[arguments[2]];
+var total = 0;
+var matches = [];
+var present = selectors.map(function (s) { return document.querySelector(s) !== null; });
+for (var r = 0; r < rules.length; r++) {
+    var outer = rules[r][0];
+    if (!present[outer]) {
+        continue;
+    }
+    var outerSelectors = rules[r][1];
+    var inners = rules[r][2].filter(function (i) { return present[i]; });
+    for (var s = 0; s < outerSelectors.length; s++) {
+        var outers = document.querySelectorAll(outerSelectors[s]);
+        total += outers.length;
+        for (var o = 0; o < outers.length && inners.length; o++) {
+            for (var k = 0; k < inners.length; k++) {
+                var found = outers[o].querySelectorAll(selectors[inners[k]]);
+                if (found.length) {
+                    matches.push([
+                        outer,
+                        inners[k],
+                        Array.prototype.map.call(found, function (e) { return locate(e); })
+                    ]);
+                }
+            }
+        }
+    }
+}
+return [total, matches];
+"""
+
+
+class BrowserEngine:
+    """
+    Engine evaluating the disallowed compositions in the browser, with a single
+    script shipping all the rules to the page and returning the locators of
+    all the disallowed elements.
+    """
+
+    def __init__(self, driver: webdriver.WebDriver, locator: int):
+        """
+        :param driver: The WebDriver showing the page, with the locator helper
+            of `locator` defined.
+        :param locator: The locator type to report, see operation.Locator.
+        """
+        self._logger = logging.getLogger(__name__).getChild(self.__class__.__name__)
+        self._driver = driver
+        self._locator_fn = (
+            "absoluteXPath"
+            if locator == operation.Locator.XPATH.value
+            else "cssPath"
+        )
+
+    def evaluate(self, index: clarity_rules.RuleIndex) -> Tuple[int, List[Match]]:
+        """
+        Find all the disallowed compositions in the page.
+
+        :param index: The compiled disallowed compositions.
+        :return: The number of outer elements found, and the list of disallowed
+            compositions found, in the order of the rules.
+        """
+        rules = [
+            [
+                outer,
+                list(clarity_rules.COMPONENTS[outer].css_selectors),
+                index.inners(outer),
+            ]
+            for outer in index.outers
+        ]
+        self._logger.debug("Evaluating %d composition rules in the page", len(rules))
+        total, raw_matches = self._driver.execute_script(
+            EVALUATE_RULES_JS,
+            list(clarity_rules.JOINED_SELECTORS),
+            rules,
+            self._locator_fn,
+        )
+        matches = [
+            (clarity_rules.COMPONENTS[outer], clarity_rules.COMPONENTS[inner], locators)
+            for outer, inner, locators in raw_matches
+        ]
+        return total, matches
+
+
+class StaticEngine:
+    """
+    Engine evaluating the disallowed compositions on an lxml tree, with no
+    browser involved. Component selectors are compiled once to XPath, and
+    locators are computed the same way as the helpers injected in the browser.
+
+    The tree is either parsed from static HTML, in which case only the
+    server-rendered document is seen and pages rendered by JavaScript need the
+    BrowserEngine, or built from a snapshot of a page rendered in a browser.
+    """
+
+    def __init__(self, root: etree._Element, locator: int):
+        """
+        :param root: The root element of the parsed document.
+        :param locator: The locator type to report, see operation.Locator.
+        """
+        self._logger = logging.getLogger(__name__).getChild(self.__class__.__name__)
+        self._root = root
+        # Elements in document order, and for each of them the index of the
+        # last element of its subtree, so that descendants of the element at
+        # index i are exactly the elements at indices in (i, end[i]].
+        self._elements = list(root.iter(etree.Element))
+        self._indices = {e: i for i, e in enumerate(self._elements)}
+        self._end = self._subtree_ends()
+        self._locator = utils.TreeLocator(locator)
+
+    @classmethod
+    def from_html(cls, html: Union[str, bytes], locator: int) -> "StaticEngine":
+        """
+        Create an engine from an HTML document.
+
+        :param html: The HTML document.
+        :param locator: The locator type to report, see operation.Locator.
+        :return: The engine.
+        """
+        root = etree.HTML(html)
+        if root is None:
+            root = etree.HTML("<html></html>")
+        return cls(root, locator)
+
+    @classmethod
+    def from_snapshot(
+        cls, dom_snapshot: snapshot.DomSnapshot, locator: int
+    ) -> "StaticEngine":
+        """
+        Create an engine from a snapshot of a page rendered in a browser.
+
+        :param dom_snapshot: The snapshot of the page.
+        :param locator: The locator type to report, see operation.Locator.
+        :return: The engine.
+        """
+        return cls(dom_snapshot.tree, locator)
+
+    def evaluate(self, index: clarity_rules.RuleIndex) -> Tuple[int, List[Match]]:
+        """
+        Find all the disallowed compositions in the document.
+
+        :param index: The compiled disallowed compositions.
+        :return: The number of outer elements found, and the list of disallowed
+            compositions found, in the order of the rules.
+        """
+        found: Dict[int, List[int]] = {}
+        present = 0
+        for component, selector in enumerate(clarity_rules.JOINED_SELECTORS):
+            found[component] = self._select(selector)
+            if found[component]:
+                present |= 1 << component
+        pruned = dict(index.prune(present))
+        total = 0
+        matches: List[Match] = []
+        for outer in index.outers:
+            if not present >> outer & 1:
+                continue
+            inners = pruned.get(outer, [])
+            for outer_selector in clarity_rules.COMPONENTS[outer].css_selectors:
+                outer_indices = self._select(outer_selector)
+                total += len(outer_indices)
+                for outer_index in outer_indices if inners else ():
+                    for inner in inners:
+                        descendants = self._descendants(outer_index, found[inner])
+                        if descendants:
+                            matches.append(
+                                (
+                                    clarity_rules.COMPONENTS[outer],
+                                    clarity_rules.COMPONENTS[inner],
+                                    [self._locator.locate(self._elements[i]) for i in descendants],
+                                )
+                            )
+        return total, matches
+
+    def has_scripts(self) -> bool:
+        """
+        Whether the document contains scripts, and may therefore render more
+        content in a browser.
+        """
+        return any(e.tag == "script" for e in self._elements)
+
+    def _subtree_ends(self) -> List[int]:
+        """
+        Compute the index of the last element of the subtree of each element.
+        """
+        end = list(range(len(self._elements)))
+        for i in range(len(self._elements) - 1, -1, -1):
+            for child in reversed(self._elements[i]):
+                if isinstance(child.tag, str):
+                    end[i] = end[self._indices[child]]
+                    break
+        return end
+
+    def _select(self, selector: str) -> List[int]:
+        """
+        Get the indices of the elements matching a CSS selector list, in
+        document order.
+        """
+        return sorted(self._indices[e] for e in _compile_selector(selector)(self._root))
+
+    def _descendants(self, ancestor: int, indices: List[int]) -> List[int]:
+        """
+        Filter a sorted list of element indices, keeping the descendants of an
+        element.
+        """
+        start = bisect.bisect_right(indices, ancestor)
+        stop = bisect.bisect_right(indices, self._end[ancestor])
+        return indices[start:stop]
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_selector(selector: str) -> etree.XPath:
+    """
+    Compile a CSS selector list into an XPath expression selecting the matching
+    elements in the whole document.
+    """
+    return etree.XPath(_TRANSLATOR.css_to_xpath(selector, prefix="descendant-or-self::"))
@@ -0,0 +1,218 @@
+"""
+Module providing the compiled index of disallowed Clarity component
+compositions.
+
+The disallowed compositions CSV is parsed once, at import, into a compact
+RuleIndex: components are identified by small integers (their position in
+clarity_components.Components), the disallowed inner components of each outer
+component are stored as a bitset, and a reverse index gives, for each inner
+component, the bitset of the outer components that disallow it. The index is
+rebuilt transparently when the CSV file changes, and a different CSV file can
+be swapped in with `load_index()`, without restarting the process.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import csv
+from dataclasses import dataclass
+import logging
+import os.path
+import re
+import threading
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from crest.composition import clarity_components
+
+DISALLOWED_COMPOSITIONS_CSV_FILENAME = "clarity_disallowed_composition.csv"
+DEFAULT_CSV_PATH = os.path.join(
+    os.path.dirname(__file__), DISALLOWED_COMPOSITIONS_CSV_FILENAME
+)
+
+_COMPONENT_NAME_SPLIT_RE = re.compile("[-/(]")
+
+# All the known components, indexed by their ID.
+COMPONENTS: Tuple[clarity_components.Component, ...] = tuple(
+    c.value for c in clarity_components.Components
+)
+COMPONENT_IDS: Dict[clarity_components.Component, int] = {
+    c: i for i, c in enumerate(COMPONENTS)
+}
+# The CSS selectors of each component, joined in a single selector list.
+JOINED_SELECTORS: Tuple[str, ...] = tuple(",".join(c.css_selectors) for c in COMPONENTS)
+
+
+def iter_bits(bitset: int) -> Iterator[int]:
+    """
+    Iterate over the positions of the bits set in a bitset, in increasing
+    order.
+
+    :param bitset: The bitset.
+    :yield: The position of each bit set.
+    """
+    while bitset:
+        low_bit = bitset & -bitset
+        yield low_bit.bit_length() - 1
+        bitset ^= low_bit
+
+
+@dataclass(frozen=True)
+class RuleIndex:
+    """
+    Compiled rules of disallowed Clarity component compositions.
+    """
+
+    # The ID of the outer components, in the order of the CSV columns.
+    outers: Tuple[int, ...]
+    # For each component ID, the bitset of inner component IDs it must not
+    # contain.
+    disallowed: Tuple[int, ...]
+    # For each component ID, the bitset of outer component IDs that must not
+    # contain it.
+    disallowed_by: Tuple[int, ...]
+    # The path of the CSV file the rules were compiled from, and its
+    # modification time.
+    source: str
+    mtime: float
+
+    def inners(self, outer: int) -> List[int]:
+        """
+        Get the IDs of the inner components disallowed in an outer component.
+
+        :param outer: The ID of the outer component.
+        :return: The IDs of the disallowed inner components, in increasing
+            order.
+        """
+        return list(iter_bits(self.disallowed[outer]))
+
+    def prune(self, present: int) -> List[Tuple[int, List[int]]]:
+        """
+        Restrict the rules to the components present in a page.
+
+        :param present: The bitset of the component IDs present in the page.
+        :return: For each outer component present in the page and that
+            disallows at least one component present in the page, in the order
+            of the CSV columns, the outer ID and the list of the disallowed
+            inner component IDs present in the page.
+        """
+        candidates = 0
+        for inner in iter_bits(present):
+            candidates |= self.disallowed_by[inner]
+        candidates &= present
+        return [
+            (outer, list(iter_bits(self.disallowed[outer] & present)))
+            for outer in self.outers
+            if candidates >> outer & 1
+        ]
+
+    def as_dict(
+        self,
+    ) -> Dict[clarity_components.Component, Set[clarity_components.Component]]:
+        """
+        Get the rules as a table of Component objects.
+
+        :return: For each outer component, the set of disallowed inner
+            components.
+        """
+        return {
+            COMPONENTS[outer]: {COMPONENTS[i] for i in self.inners(outer)}
+            for outer in self.outers
+        }
+
+
+def _clean_component_name(name: str) -> str:
+    """
+    Converts the name of a component from the disallowed compositions CSV
+    into the name in the name supposed to match a component defined in
+    clarity_components.py.
+
+    :param name: The component name from the CSV file.
+    :return: The component name with no spaces, all uppercase.
+    """
+    return _COMPONENT_NAME_SPLIT_RE.split(name, 1)[0].strip().upper().replace(" ", "_")
+
+
+def _component_id(name: str) -> int:
+    """
+    Get the ID of a component from its name in the CSV file.
+    """
+    return COMPONENT_IDS[clarity_components.Components[_clean_component_name(name)].value]
+
+
+def compile_index(csv_filename: str = DEFAULT_CSV_PATH) -> RuleIndex:
+    """
+    Parse a CSV file containing the disallowed Clarity component compositions
+    and compile it into a RuleIndex.
+    The columns are the outer/container components, while the rows are the
+    inner/contained components. A specific composition is disallowed if "n"
+    is in the corresponding cell.
+
+    :param csv_filename: The path of the CSV file.
+    :return: The compiled rules.
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Parsing disallowed Clarity compositions from %s", csv_filename)
+    mtime = os.path.getmtime(csv_filename)
+    disallowed = [0] * len(COMPONENTS)
+    disallowed_by = [0] * len(COMPONENTS)
+    with open(csv_filename, newline="", encoding="ascii") as csvfile:
+        csv_reader = csv.reader(csvfile, delimiter=",")
+        headers = next(csv_reader)
+        outers = [_component_id(i) for i in headers[1:]]
+        for row in csv_reader:
+            inner = _component_id(row[0])
+            for outer, decision in zip(outers, row[1:]):
+                if decision.lower().startswith("n"):
+                    disallowed[outer] |= 1 << inner
+                    disallowed_by[inner] |= 1 << outer
+    index = RuleIndex(
+        outers=tuple(dict.fromkeys(outers)),
+        disallowed=tuple(disallowed),
+        disallowed_by=tuple(disallowed_by),
+        source=csv_filename,
+        mtime=mtime,
+    )
+    logger.info("Loaded %d outer components", len(index.outers))
+    return index
+
+
+_index_lock = threading.Lock()
+_index: Optional[RuleIndex] = None
+
+
+def load_index(csv_filename: str = DEFAULT_CSV_PATH) -> RuleIndex:
+    """
+    Compile a CSV file of disallowed compositions and make it the index used by
+    subsequent checks.
+
+    :param csv_filename: The path of the CSV file.
+    :return: The new index.
+    """
+    global _index  # pylint: disable=global-statement
+    index = compile_index(csv_filename)
+    with _index_lock:
+        _index = index
+    return index
+
+
+def get_index() -> RuleIndex:
+    """
+    Get the current index, recompiling it first if its CSV file was modified.
+
+    :return: The current index.
+    """
+    global _index  # pylint: disable=global-statement
+    index = _index
+    try:
+        modified = os.path.getmtime(index.source) != index.mtime
+    except OSError:
+        modified = False
+    if modified:
+        new_index = compile_index(index.source)
+        with _index_lock:
+            if _index is index:
+                _index = new_index
+            index = _index
+    return index
+
+
+load_index()
@@ -1,7 +1,9 @@
 # Copyright 2020-2021 VMware, Inc.
 # SPDX-License-Identifier: MIT
 from os.path import dirname, abspath
+import os
 import logging
+import tempfile
 
 dir_path = dirname(abspath(__file__))
 parent_dir_path = dirname(dir_path)
@@ -14,6 +16,57 @@ global_args = {
     "log_path": dir_path + "/test.log", # Log file path
     "log_level": logging.INFO, # Logging level
     "reporttype": 3, # reporttype is either xpath(value: 3) or css selector(value: 4)
+    "warmup": False, # Whether the server loads the heading analysis model and NLTK corpora at start-up rather than on the first request needing them
+    "driver_stats": False, # Whether to log the WebDriver round trips of every check, not only of the requests setting "driver_stats"
+    "clarity_engine": "browser", # Clarity composition engine: "browser", "static" (no browser, server-rendered HTML only), "auto" or "snapshot" (rendered in a browser, checked on a snapshot)
+    "focus_indicator": {
+        "mode": "batch", # Keyboard traversal: "batch" walks the focus order in the page, a batch of elements per script call; "keyboard" presses TAB for real, element by element, to verify the batch mode; "pseudo" forces :focus and :focus-visible through the DevTools protocol, without traversal, for pages with thousands of focusable elements
+        "batch_size": 50, # Number of elements focused per script call in batch mode
+        "pseudo_batch_size": 250, # Number of elements whose focused styles are read per script call in pseudo mode
+    },
+    "driver_pool": {
+        "size": 4, # Max. number of Chrome instances kept alive and shared by the checks
+        "prelaunch": 1, # Number of Chrome instances launched ahead of the first scan
+        "max_uses": 25, # Number of scans after which a Chrome instance is recycled
+        "acquire_timeout": 120, # Seconds a check waits for a free Chrome instance
+    },
+    "jobs": {
+        "workers": 4, # Number of asynchronous scan jobs run at once, at most the driver pool size
+        "max_queued": 16, # Number of jobs waiting for a worker above which submissions are rejected with 429
+        "retention": 3600, # Seconds a finished job and its result can be polled
+        "webhook_timeout": 10, # Seconds to wait for the completion webhook to respond
+    },
+    "batch": {
+        "workers": 4, # Number of pages of a batch scanned at once
+        "per_origin": 2, # Number of pages of the same origin scanned at once
+        "max_urls": 1000, # Max. number of pages of a batch submitted to the API
+    },
+    "contrast": {
+        "max_colors": 1000, # Max. number of colors of each list of a contrast matrix request
+    },
+    "serve": {
+        "workers": 2, # Number of worker processes of the production server, each with its own driver pool
+        "threads": 8, # Number of requests handled at once by each worker process
+        "torch_threads": 0, # Number of torch intra-op threads of each worker, 0 to share the CPU cores between workers
+    },
+    "provisioning": {
+        "artifact_dir": os.environ.get("CREST_ARTIFACT_DIR"), # Directory of the offline NLTK data, model and chromedriver, with their checksums in manifest.json; None to download them
+        "nltk_data": "nltk_data", # NLTK data directory, relative to the artifact directory
+        "model": "model", # Heading analysis model directory, relative to the artifact directory
+        "chromedriver": "chromedriver/chromedriver", # chromedriver executable, relative to the artifact directory
+        "model_name": "gargam/roberta-base-crest", # Heading analysis model on the Hugging Face hub, without artifact directory
+    },
+    "profiling": {
+        "directory": os.environ.get("CREST_PROFILE_DIR"), # Directory of the profiles of the requests with the X-Crest-Profile header or ?profile=1, None to disable profiling
+        "interval": 0.005, # Seconds between two samples of the profiled threads
+    },
+    "result_cache": {
+        "enabled": os.environ.get("CREST_RESULT_CACHE") == "1", # Whether check results are cached, by URL, options, check version and fingerprint of the unrendered document: only for pages rendered by the server, as the pages rendered by scripts may change without their HTML changing
+        "ttl": 3600, # Seconds a cached result is served
+        "memory_entries": 128, # Number of results kept in memory
+        "disk_entries": 10000, # Number of results kept on disk
+        "path": os.path.join(os.environ.get("CREST_CACHE_DIR") or tempfile.gettempdir(), "crest", "result_cache.sqlite3"), # On-disk cache file, None to keep results in memory only
+    },
     "model_params": {
         "training_data_input_file_name": dir_path + "/input/dataset.csv", # Path to training data file
         "num_train_epochs": 1, # num. of epochs to train the model
@@ -0,0 +1,231 @@
+"""
+Module providing the asynchronous scan jobs: checks submitted to a bounded
+queue and run by a fixed number of worker threads, with their status and
+result kept for polling, and an optional webhook called on completion.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import contextvars
+from dataclasses import dataclass, field
+import enum
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+import uuid
+
+import requests
+
+from crest import checks
+from crest import config
+from crest.utils import metrics
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a job is submitted while the queue is full.
+    """
+
+
+class JobStatus(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+@dataclass
+class Job:
+    """
+    A check submitted to a JobQueue.
+    """
+
+    check: str
+    data: Dict[str, Any]
+    webhook: Optional[str] = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: JobStatus = JobStatus.QUEUED
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    # The JSON response of the check and its HTTP status code, once finished.
+    result: Optional[Dict[str, Any]] = None
+    status_code: Optional[int] = None
+    # The context of the submitter, e.g. its metrics endpoint, the check runs in.
+    context: contextvars.Context = field(
+        default_factory=contextvars.copy_context, repr=False, compare=False
+    )
+
+    def asdict(self) -> Dict[str, Any]:
+        """
+        Get the public view of the job, as returned by the API.
+        """
+        output = {
+            "id": self.id,
+            "check": self.check,
+            "url": self.data.get("url"),
+            "status": self.status.value,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+        if self.result is not None:
+            output["statuscode"] = self.status_code
+            output["result"] = self.result
+        return output
+
+
+class JobQueue:
+    """
+    Bounded queue of jobs run by worker threads.
+
+    At most `workers` checks run at once, so that no more Chrome instances are
+    requested than the driver pool holds, and at most `max_queued` jobs wait
+    for a worker: further submissions are rejected with QueueFullError rather
+    than piling up. Finished jobs are kept for `retention` seconds.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        max_queued: int,
+        retention: float,
+        webhook_timeout: float = 10,
+        runner: Callable[[str, Dict[str, Any]], checks.CheckResult] = checks.run_check,
+    ):
+        self._logger = logging.getLogger(__name__).getChild(self.__class__.__name__)
+        self._queue: "queue.Queue[Job]" = queue.Queue(maxsize=max(1, max_queued))
+        self._retention = retention
+        self._webhook_timeout = webhook_timeout
+        self._runner = runner
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        for i in range(max(1, workers)):
+            threading.Thread(
+                target=self._work, name=f"crest-job-worker-{i}", daemon=True
+            ).start()
+
+    def submit(self, check: str, data: Dict[str, Any], webhook: Optional[str] = None) -> Job:
+        """
+        Submit a check to run.
+
+        :param check: The name of the check, see checks.CHECKS.
+        :param data: The JSON body of the check request.
+        :param webhook: Optional URL to POST the finished job to.
+        :return: The queued job.
+        :raise KeyError: If the check is unknown.
+        :raise QueueFullError: If the queue is full.
+        """
+        if check not in checks.CHECKS:
+            raise KeyError(check)
+        job = Job(check=check, data=data, webhook=webhook)
+        with self._lock:
+            self._expire()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError(
+                    f"{self._queue.maxsize} jobs already queued"
+                ) from None
+            self._jobs[job.id] = job
+        self._logger.info("Queued job %s: %s %s", job.id, check, data.get("url"))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Get a job by ID, None if it is unknown or expired.
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queued(self) -> int:
+        """
+        Get the number of jobs waiting for a worker.
+        """
+        return self._queue.qsize()
+
+    def _expire(self):
+        """
+        Forget the jobs finished more than `retention` seconds ago. Must be
+        called with the lock held.
+        """
+        limit = time.time() - self._retention
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.finished is not None and job.finished < limit
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: Job):
+        job.started = time.time()
+        job.status = JobStatus.RUNNING
+        try:
+            result, status_code = job.context.run(self._runner, job.check, job.data)
+        except Exception as e:
+            self._logger.exception("Exception in job %s", job.id)
+            result = {
+                "status": {
+                    "success": "False",
+                    "error": "Failed with exception [%s]" % type(e).__name__,
+                }
+            }
+            status_code = 400
+        job.result, job.status_code = result, status_code
+        job.finished = time.time()
+        job.status = JobStatus.DONE if status_code < 400 else JobStatus.FAILED
+        self._logger.info(
+            "Job %s %s in %.2fs", job.id, job.status.value, job.finished - job.started
+        )
+        if job.webhook:
+            self._notify(job)
+
+    def _notify(self, job: Job):
+        """
+        POST a finished job to its webhook, logging failures.
+        """
+        try:
+            requests.post(
+                job.webhook, json=job.asdict(), timeout=self._webhook_timeout
+            ).raise_for_status()
+        except requests.RequestException:
+            self._logger.warning("Webhook of job %s failed", job.id, exc_info=True)
+
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_queue() -> JobQueue:
+    """
+    Get the process-wide JobQueue, creating it from the "jobs" entry of the
+    configuration on first use.
+
+    :return: The shared JobQueue instance.
+    """
+    global _queue  # pylint: disable=global-statement
+    with _queue_lock:
+        if _queue is None:
+            params = config.global_args["jobs"]
+            _queue = JobQueue(
+                workers=params["workers"],
+                max_queued=params["max_queued"],
+                retention=params["retention"],
+                webhook_timeout=params["webhook_timeout"],
+            )
+        return _queue
+
+
+JOB_QUEUE_DEPTH = metrics.Gauge("crest_job_queue_depth", "Number of jobs waiting for a worker")
+JOB_QUEUE_DEPTH.set_function(lambda: {} if _queue is None else {(): _queue.queued()})
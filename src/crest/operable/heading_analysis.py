@@ -7,43 +7,33 @@ import re
 import traceback
 import logging
 from bs4 import BeautifulSoup, Comment
-from nltk.corpus import stopwords
-from nltk.stem import PorterStemmer
-from nltk.tokenize import word_tokenize
 from bs4 import NavigableString
 from crest.config import *
-import pandas as pd
-import numpy as np
 from lxml import etree
 import urllib.parse
 from urllib.request import urlopen
 from crest.utils.get_common_function import *
+from crest.utils import metrics
+from crest.utils import startup_util
+from crest.utils import timeline
 import os
-from transformers import RobertaTokenizer, RobertaForSequenceClassification
-import torch
-import nltk
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-nltk.download('stopwords')
-nltk.download('punkt')
+# nltk, pandas, numpy and the model are imported and loaded on the first
+# heading analysis, so that the API starts without them.
 
 class HeadingContent:
-    def __init__(self, url, locator= global_args["reporttype"]):
+    def __init__(self, url, locator= global_args["reporttype"], page_source=None):
+        # page_source: optional HTML of the page (e.g. the rendered DOM of a
+        # page session), used instead of fetching the URL.
         self.url = to_valid_url(url)
+        self.page_source = page_source
         self.list_of_failed_headings = []
         self.total_headings = 0
         self.stop_words = None
         self.locator = locator
-        args = global_args["model_params"]
-        if 'tokenizer' not in global_args['model_params'].keys():
-            self.roberta_tokenizer = RobertaTokenizer.from_pretrained('gargam/roberta-base-crest')
-        else:
-            self.roberta_tokenizer = global_args['model_params']['tokenizer']
-        
-        if 'transfomer_model' not in global_args['model_params'].keys():
-            self.model = RobertaForSequenceClassification.from_pretrained('gargam/roberta-base-crest')
-        else:
-            self.model = global_args['model_params']['transfomer_model']
+        with timeline.span("model"):
+            self.roberta_tokenizer, self.model = startup_util.get_transformer_model()
 
  
     def declarative_check(self, heading, content):
@@ -81,6 +71,11 @@ class HeadingContent:
             return False
 
     def tokenizer(self, sentence):
+        from nltk.corpus import stopwords
+        from nltk.stem import PorterStemmer
+        from nltk.tokenize import word_tokenize
+
+        startup_util.load_nltk_data()
         if self.stop_words == None:
             self.stop_words = set(stopwords.words("english"))
         ps = PorterStemmer()
@@ -210,19 +205,25 @@ class HeadingContent:
             return cnt + " " + img_video_txt
 
     def entailment_task(self, dataset):
+        import numpy as np
+
         dataset["heading_text"] = dataset["heading_text"].apply(
             lambda x: str(x).lower().strip()
         )
         dataset["content"] = dataset["content"].apply(lambda x: str(x).lower().strip())
-        inputs = self.roberta_tokenizer(dataset[["heading_text", "content"]].values.tolist(), return_tensors="pt", padding=True, truncation=True)
-        outputs = self.model(**inputs)
+        with metrics.timer("tokenizer"):
+            inputs = self.roberta_tokenizer(dataset[["heading_text", "content"]].values.tolist(), return_tensors="pt", padding=True, truncation=True)
+        with metrics.timer("inference"):
+            outputs = self.model(**inputs)
         logits = outputs.logits
         predictions = np.argmax(logits.detach().numpy(), axis=1)
         return dataset[np.array(predictions) == 0]
 
     def get_heading_elems(self):
         parsed_url = urllib.parse.urlparse(self.url)
-        if parsed_url.scheme == "file":
+        if self.page_source is not None:
+            text = self.page_source
+        elif parsed_url.scheme == "file":
             with open(parsed_url.path, "rt") as f:
                 text = f.read()
         else:
@@ -278,11 +279,14 @@ class HeadingContent:
         return " > ".join(components)
 
     def main(self):
+        import pandas as pd
+
         self.start_time = time.time()
         response = {}
         response["status"] = {}
         try:
-            headings = self.get_heading_elems()
+            with timeline.span("headings"):
+                headings = self.get_heading_elems()
             self.total_headings = len(headings)
             logging.debug(
                 "Total Number of headings are {}".format(self.total_headings)
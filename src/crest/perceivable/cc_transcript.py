@@ -17,24 +17,41 @@ from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as cond
 from selenium.webdriver.common.by import By
-from PIL import Image
-from pytesseract import image_to_string
 from io import BytesIO
 from difflib import SequenceMatcher
 from crest import utils
 from crest.utils.get_common_function import *
+from crest.utils import driver_pool
+from crest.utils import metrics
+from crest.utils import timeline
 
 class AudioVideo:
-    def __init__(self, url, locator= global_args["reporttype"]):
+    def __init__(self, url, locator= global_args["reporttype"], driver=None):
+        # driver: optional WebDriver already showing the page (e.g. a page
+        # session tab), not released by this check.
         self.list_of_video_elems = set()
         self.list_of_cc_elems = set()
         self.list_of_audio_elems = set()
         self.list_of_transcript_elems = set()
         self.url = to_valid_url(url)
         self.locator = locator
-        self.driver = get_driver()
-        self.driver.get(self.url)
-    
+        self.owns_driver = driver is None
+        if driver is not None:
+            self.driver = driver
+            return
+        self.driver = driver_pool.get_pool().acquire()
+        try:
+            with timeline.span("page"):
+                self.driver.get(self.url)
+        except Exception:
+            self.release_driver()
+            raise
+
+    def release_driver(self):
+        if self.driver is not None:
+            if self.owns_driver:
+                driver_pool.get_pool().release(self.driver)
+            self.driver = None
     
     def check_webpage(self, iframe_status, iframe_elem=None):
         vStatus, vElements = self.check_video_player( iframe_status, iframe_elem)
@@ -107,11 +124,8 @@ class AudioVideo:
                 return False, None
             else:
                 vElem = []
-                for element in elements:
-                    is_visible = self.driver.execute_script(
-                        "if(window.isVisible(arguments[0])){return true;}; return false;",
-                        element,
-                    )
+                visibility = self.get_visibility(elements)
+                for element, is_visible in zip(elements, visibility):
                     if (
                         self.is_advertisement(self.driver, element) is not True
                         and is_visible
@@ -161,18 +175,35 @@ class AudioVideo:
             logging.debug("It's not ad.")
             return False
 
+    def is_visible(self, element):
+        return self.driver.execute_script(
+            "if(window.isVisible(arguments[0])){return true;}; return false;",
+            element,
+        )
+
+    def get_visibility(self, elements):
+        # Visibility of elements of the current document, with the isVisible
+        # helper, in one call. If one of them is stale, they are checked one by
+        # one.
+        if not elements:
+            return []
+        try:
+            return self.driver.execute_script(
+                "return arguments[0].map(function (elem) { return !!window.isVisible(elem); });",
+                elements,
+            )
+        except:
+            logging.debug("Exception while checking the visibility of the elements at once")
+            return [self.is_visible(element) for element in elements]
+
     def get_all_frames(self, driver):
         iframes_without_ads = []
         try:
             iframes = driver.find_elements(By.XPATH, "//iframe")
-            for iframe in iframes:
-                if self.is_advertisement(driver, iframe) is not True:
-                    is_visible = driver.execute_script(
-                        "if(window.isVisible(arguments[0])){return true;}; return false;",
-                        iframe,
-                    )
-                    if is_visible:
-                        iframes_without_ads.append(iframe)
+            visibility = self.get_visibility(iframes)
+            for iframe, is_visible in zip(iframes, visibility):
+                if self.is_advertisement(driver, iframe) is not True and is_visible:
+                    iframes_without_ads.append(iframe)
         except:
             logging.debug(
                 "Exception occured while checking iframe whether its a adver. or not."
@@ -210,12 +241,15 @@ class AudioVideo:
                 logging.debug("There is no track element found")
 
     def check_inbuilt_captions(self, driver, element):
+        # Imported on first use, so that the API starts without OCR.
+        from pytesseract import image_to_string
+
         first_text = ""
         time_count = 0
         while first_text == "" and time_count < 5:
-            first_text = image_to_string(
-                self.get_element_screenshot(driver, element), lang="eng"
-            )
+            screenshot = self.get_element_screenshot(driver, element)
+            with metrics.timer("ocr"):
+                first_text = image_to_string(screenshot, lang="eng")
             first_text = re.sub(" +", " ", first_text.replace("\n", " ")).strip()
             if len(first_text.split(" ")) < 3:
                 first_text = ""
@@ -230,9 +264,9 @@ class AudioVideo:
         ratio = 1
         comp_text = ""
         while (ratio > 0.5 or comp_text == "") and time_count < 5:
-            comp_text = image_to_string(
-                self.get_element_screenshot(driver, element), lang="eng"
-            )
+            screenshot = self.get_element_screenshot(driver, element)
+            with metrics.timer("ocr"):
+                comp_text = image_to_string(screenshot, lang="eng")
             comp_text = re.sub(" +", " ", comp_text.replace("\n", " ")).strip()
             ratio = SequenceMatcher(None, first_text, comp_text).ratio()
             time.sleep(1)
@@ -246,6 +280,8 @@ class AudioVideo:
             return False
 
     def get_element_screenshot(self, driver, element):
+        from PIL import Image
+
         location = element.location
         size = element.size
         png = driver.get_screenshot_as_png()
@@ -299,8 +335,9 @@ class AudioVideo:
         response = {}
         response["status"] = {}
         try:
-            self.init_script()
-            self.check_webpage(False)
+            with timeline.span("media"):
+                self.init_script()
+                self.check_webpage(False)
             success_status = 200
             if self.driver is not None:
                 logging.debug("Object Successfully created")
@@ -391,4 +428,4 @@ class AudioVideo:
             response['status']={'success':"False", 'error':"Failed with exception [%s]" % type(e).__name__}
             return response, 400
         finally:
-            self.driver.quit()
+            self.release_driver()
@@ -10,36 +10,477 @@ import webbrowser
 import requests
 import re
 import traceback
+import json
 import logging
 import os
 from concurrent.futures import ThreadPoolExecutor
 import multiprocessing
 from crest.utils.get_common_function import *
+from crest.utils import cdp
+from crest.utils import contrast
+from crest.utils import driver_pool
+from crest.utils import metrics
+from crest.utils import snapshot
+from crest.utils import timeline
+from lxml.cssselect import CSSSelector
+import numpy as np
  
 
+# Keyboard focusable elements, whose base styles are compared to their styles
+# when focused. They are the targets of all the traversal modes, counted in
+# "totalelements": the elements reached with the keyboard but not matched,
+# e.g. the elements of shadow trees or iframes, whose focus is reported on
+# their host or iframe, are left out in every mode.
+FOCUSABLE_SELECTOR = ", ".join(
+    (
+        "a",
+        "area[href]",
+        "button",
+        "input",
+        "textarea",
+        "select",
+        "details",
+        "summary",
+        "iframe",
+        "audio[controls]",
+        "video[controls]",
+        '[contenteditable]:not([contenteditable="false"])',
+        '[tabindex]:not([tabindex="-1"])',
+    )
+)
+TRANSPARENT = "rgba(0, 0, 0, 0)"
+# Modes of the keyboard traversal: "batch" walks the sequential focus order in
+# the page, focusing a batch of elements per script call; "keyboard" presses
+# TAB for real, one element per round trips, to verify the batch mode;
+# "pseudo" forces the focused pseudo-classes on the focusable elements through
+# the DevTools protocol, without focusing them.
+TRAVERSAL_MODES = ("batch", "keyboard", "pseudo")
+# Pseudo-classes forced on the elements in "pseudo" mode, and on their
+# ancestors, as when focused with the keyboard. The styles changed by focus
+# event handlers are only seen by the other modes.
+FORCED_PSEUDO_CLASSES = ["focus", "focus-visible", "focus-within"]
+FORCED_ANCESTOR_PSEUDO_CLASSES = ["focus-within"]
+
+# Computed style properties of the focus analysis, kept in compact style
+# records: colors as [r, g, b, a] integers from 0 to 255, widths as numbers of
+# pixels and the other properties as strings, plus the colors of the box
+# shadows as "box-shadow-colors".
+FOCUS_COLOR_STYLES = (
+    "background-color",
+    "text-decoration-color",
+    "outline-color",
+    "border-top-color",
+    "border-right-color",
+    "border-bottom-color",
+    "border-left-color",
+)
+FOCUS_WIDTH_STYLES = (
+    "outline-width",
+    "border-top-width",
+    "border-right-width",
+    "border-bottom-width",
+    "border-left-width",
+)
+FOCUS_KEYWORD_STYLES = (
+    "box-shadow",
+    "outline-style",
+    "border-top-style",
+    "border-right-style",
+    "border-bottom-style",
+    "border-left-style",
+)
+BLACK = (0, 0, 0, 255)
+# Minimum contrast ratio of a focus indicator, as for the non-text contrast.
+FOCUS_CONTRAST_RATIO = 3.0
+# Minimum alpha of a visible focus indicator color, on the 0-255 scale of the
+# parsed colors: alphas below 0.5 / 255 (about 0.002) round to 0, and are
+# transparent once painted with 8-bit channels.
+MIN_VISIBLE_ALPHA = 1
+# Colors in a box-shadow value, whatever their syntax.
+SHADOW_COLOR_RE = re.compile(r"(?:rgba?|hsla?|hwb|oklab|oklch|lab|lch|color)\([^)]*\)")
+
+# Helpers of the traversals in the page, defined once per page as
+# window.crestFocus. The focusable elements are listed in document order as
+# window.crestFocusTargets, and identified by their index in the list.
+FOCUS_HELPERS_JS = """
+if (!window.crestFocus) {
+    window.crestFocus = (function (properties) {
+        var helpers = {clicked: new WeakSet()};
+        var noTransitions = null, colors = new Map(), context = null;
+        var shadowColor = new RegExp(properties.shadowColor, "g");
+        helpers.listTargets = function (selector) {
+            window.crestFocusTargets = Array.prototype.slice.call(document.querySelectorAll(selector));
+            return window.crestFocusTargets;
+        };
+        // Identity of the targets, as in get_target_keys.
+        helpers.targetKeys = function (targets) {
+            return targets.map(function (elem) {
+                var attributes = Array.prototype.map.call(elem.attributes, function (attribute) {
+                    return [attribute.name, attribute.value];
+                });
+                attributes.sort(function (a, b) {
+                    return a[0] < b[0] ? -1 : (a[0] > b[0] ? 1 : 0);
+                });
+                return [elem.nodeName.toLowerCase(), attributes];
+            });
+        };
+        helpers.bgcolor = function (elem) {
+            var color = getComputedStyle(elem).getPropertyValue("background-color");
+            if (color !== "rgba(0, 0, 0, 0)" || elem == document.body || !elem.parentElement) {
+                return color;
+            }
+            return helpers.bgcolor(elem.parentElement);
+        };
+        helpers.isTabbable = function (elem) {
+            if (elem.disabled || elem.tabIndex < 0 || !elem.getClientRects().length || elem.closest("[inert]")) {
+                return false;
+            }
+            // Links without href are not focusable, unless given a tab index.
+            if (elem.localName === "a" && !elem.hasAttribute("href") && !elem.hasAttribute("tabindex")) {
+                return false;
+            }
+            return getComputedStyle(elem).visibility === "visible";
+        };
+        // [element, index] of the tabbable targets, in sequential focus
+        // order: positive tab indexes first, in increasing order, then the
+        // other elements in document order.
+        helpers.focusOrder = function (targets) {
+            var order = [];
+            targets.forEach(function (elem, i) {
+                if (helpers.isTabbable(elem)) {
+                    order.push([elem, i]);
+                }
+            });
+            return order.sort(function (a, b) {
+                var ta = a[0].tabIndex > 0 ? a[0].tabIndex : Infinity;
+                var tb = b[0].tabIndex > 0 ? b[0].tabIndex : Infinity;
+                return ta !== tb ? (ta < tb ? -1 : 1) : a[1] - b[1];
+            });
+        };
+        helpers.isBanner = function (elem) {
+            return !helpers.clicked.has(elem) && /close|quit|accept|thank/.test(String(elem.outerHTML).toLowerCase());
+        };
+        // [r, g, b, a] integers of a computed color, the colors of other
+        // syntaxes than rgb() being converted by a canvas.
+        helpers.parseColor = function (value) {
+            var color = colors.get(value);
+            if (color !== undefined) {
+                return color;
+            }
+            var match = /^rgba?\\(([^)]*)\\)$/.exec(value);
+            var parts = match ? match[1].trim().split(/[\\s,\\/]+/).map(Number) : [];
+            if (parts.length >= 3 && !parts.some(isNaN)) {
+                color = [
+                    Math.round(parts[0]), Math.round(parts[1]), Math.round(parts[2]),
+                    parts.length > 3 ? Math.round(parts[3] * 255) : 255
+                ];
+            } else {
+                if (!context) {
+                    var canvas = document.createElement("canvas");
+                    canvas.width = canvas.height = 1;
+                    context = canvas.getContext("2d", {willReadFrequently: true});
+                }
+                context.clearRect(0, 0, 1, 1);
+                context.fillStyle = "#000";
+                context.fillStyle = value;
+                context.fillRect(0, 0, 1, 1);
+                color = Array.prototype.slice.call(context.getImageData(0, 0, 1, 1).data);
+            }
+            colors.set(value, color);
+            return color;
+        };
+        // Compact style record of an element, with its index in the targets.
+        helpers.record = function (elem, id) {
+            var cmpsty = getComputedStyle(elem), styles = {};
+            properties.keywords.forEach(function (name) {
+                styles[name] = cmpsty.getPropertyValue(name);
+            });
+            properties.colors.forEach(function (name) {
+                styles[name] = helpers.parseColor(cmpsty.getPropertyValue(name));
+            });
+            properties.widths.forEach(function (name) {
+                styles[name] = parseFloat(cmpsty.getPropertyValue(name)) || 0;
+            });
+            styles["background-color"] = helpers.parseColor(helpers.bgcolor(elem));
+            styles["box-shadow-colors"] = (styles["box-shadow"].match(shadowColor) || []).map(helpers.parseColor);
+            return {id: id, styles: styles};
+        };
+        // Transitions and animations are disabled during a traversal, so that
+        // the styles read right after focusing an element are its final
+        // focused styles.
+        helpers.freezeStyles = function () {
+            if (!noTransitions) {
+                noTransitions = document.createElement("style");
+                noTransitions.textContent = "*, *::before, *::after { transition: none !important; animation: none !important; }";
+            }
+            (document.head || document.documentElement).appendChild(noTransitions);
+        };
+        helpers.unfreezeStyles = function () {
+            if (noTransitions && noTransitions.parentNode) {
+                noTransitions.parentNode.removeChild(noTransitions);
+            }
+        };
+        return helpers;
+    })(%s);
+}
+""" % json.dumps(
+    {
+        "colors": FOCUS_COLOR_STYLES,
+        "widths": FOCUS_WIDTH_STYLES,
+        "keywords": FOCUS_KEYWORD_STYLES,
+        "shadowColor": SHADOW_COLOR_RE.pattern,
+    }
+)
+# List the targets again, returning their keys.
+FOCUS_LIST_TARGETS_JS = "return window.crestFocus.targetKeys(window.crestFocus.listTargets(arguments[0]));"
+
+# Install a listener keeping the record of the element getting the focus as
+# window.items, for the traversal with the keyboard. arguments[0] is
+# FOCUSABLE_SELECTOR. Returns the keys of the targets.
+FOCUS_LISTENER_JS = FOCUS_HELPERS_JS + """
+var helpers = window.crestFocus;
+window.items = null;
+document.addEventListener("focus", function () {
+    var elem = document.activeElement;
+    window.items = helpers.record(elem, window.crestFocusTargets.indexOf(elem));
+}, true);
+return helpers.targetKeys(helpers.listTargets(arguments[0]));
+"""
+
+# Prepare the walk of the sequential focus order of the page, returning the
+# keys of the targets. arguments[0] is FOCUSABLE_SELECTOR. Each call of
+# window.crestFocusWalk.next(count) then focuses up to count elements, and
+# returns their records. The elements that look like cookie banner buttons
+# among the first ten are clicked once, interrupting the batch so that the
+# walk starts over on the page without the banner.
+FOCUS_WALK_JS = FOCUS_HELPERS_JS + """
+var helpers = window.crestFocus, targets = helpers.listTargets(arguments[0]);
+helpers.freezeStyles();
+var order = helpers.focusOrder(targets);
+var walk = {index: 0, seen: new Set()};
+walk.next = function (count) {
+    var records = [];
+    while (records.length < count && walk.index < order.length) {
+        var elem = order[walk.index][0], id = order[walk.index][1];
+        walk.index++;
+        if (!elem.isConnected) {
+            continue;
+        }
+        elem.focus({focusVisible: true});
+        var active = document.activeElement;
+        if (!active || active === document.body || walk.seen.has(active)) {
+            continue;
+        }
+        walk.seen.add(active);
+        if (walk.seen.size <= 10 && helpers.isBanner(active)) {
+            helpers.clicked.add(active);
+            active.click();
+            helpers.unfreezeStyles();
+            return {records: [], banner: true, done: false};
+        }
+        records.push(helpers.record(active, active === elem ? id : targets.indexOf(active)));
+    }
+    var done = walk.index >= order.length;
+    if (done) {
+        helpers.unfreezeStyles();
+    }
+    return {records: records, banner: false, done: done};
+};
+window.crestFocusWalk = walk;
+return helpers.targetKeys(targets);
+"""
+FOCUS_WALK_NEXT_JS = "return window.crestFocusWalk.next(arguments[0]);"
+
+# List the targets matching arguments[0], FOCUSABLE_SELECTOR, returning their
+# number, their keys, the indexes of the tabbable ones in sequential focus order, and for
+# each of them the indexes of its ancestors among the elements of the page.
+# The targets and the elements are the nodes of DOM.querySelectorAll with the
+# same selector and "*", in the same order. As in the walk, the first of the
+# ten first tabbable elements that looks like a cookie banner button is
+# clicked instead, returning banner: true.
+FOCUS_TARGETS_JS = FOCUS_HELPERS_JS + """
+var helpers = window.crestFocus, targets = helpers.listTargets(arguments[0]);
+var order = helpers.focusOrder(targets);
+for (var i = 0; i < Math.min(order.length, 10); i++) {
+    if (helpers.isBanner(order[i][0])) {
+        helpers.clicked.add(order[i][0]);
+        order[i][0].click();
+        return {banner: true};
+    }
+}
+helpers.freezeStyles();
+var elements = document.querySelectorAll("*"), positions = new Map();
+for (var j = 0; j < elements.length; j++) {
+    positions.set(elements[j], j);
+}
+return {
+    banner: false,
+    count: targets.length,
+    keys: helpers.targetKeys(targets),
+    elements: elements.length,
+    tabbable: order.map(function (entry) { return entry[1]; }),
+    ancestors: order.map(function (entry) {
+        var ancestors = [];
+        for (var elem = entry[0].parentElement; elem; elem = elem.parentElement) {
+            ancestors.push(positions.get(elem));
+        }
+        return ancestors;
+    })
+};
+"""
+# Records of the targets of indexes arguments[0].
+FOCUS_TARGET_RECORDS_JS = """
+var targets = window.crestFocusTargets;
+return arguments[0].map(function (i) {
+    return window.crestFocus.record(targets[i], i);
+});
+"""
+# Locators of the targets of indexes arguments[0], CSS selector paths if
+# arguments[1] is true, xpaths otherwise.
+FOCUS_TARGET_LOCATORS_JS = """
+var targets = window.crestFocusTargets, cssLocators = arguments[1];
+return arguments[0].map(function (i) {
+    return cssLocators ? window.cssPath(targets[i]) : window.absoluteXPath(targets[i]);
+});
+"""
+
+
+def parse_width(value):
+    # Number of pixels of a computed width, e.g. "1.5px".
+    try:
+        return float(value[:-2]) if value and value.endswith("px") else 0
+    except ValueError:
+        return 0
+
+
+def compact_styles(styles):
+    # Compact style record of computed styles, given as strings by property.
+    record = {name: styles.get(name) for name in FOCUS_KEYWORD_STYLES}
+    record.update((name, contrast.parse_color(styles.get(name))) for name in FOCUS_COLOR_STYLES)
+    record.update((name, parse_width(styles.get(name))) for name in FOCUS_WIDTH_STYLES)
+    shadow_colors = map(contrast.parse_color, SHADOW_COLOR_RE.findall(record["box-shadow"] or ""))
+    record["box-shadow-colors"] = [color for color in shadow_colors if color is not None]
+    return record
+
+
+def load_styles(styles):
+    # Convert the colors of a compact style record sent by the page, JSON
+    # arrays, to tuples as in the records of compact_styles.
+    for name in FOCUS_COLOR_STYLES:
+        styles[name] = tuple(styles[name])
+    styles["box-shadow-colors"] = [tuple(color) for color in styles["box-shadow-colors"]]
+    return styles
+
+
+def get_base_css(dom_snapshot):
+    # Base styles of the keyboard focusable elements, as compact style records,
+    # in the order of the targets in the page: None for the elements disabled
+    # or not rendered. They are computed from a snapshot of the page instead
+    # of one script call per element.
+    output = []
+    for element in CSSSelector(FOCUSABLE_SELECTOR, translator="html")(dom_snapshot.tree):
+        node = dom_snapshot.index(element)
+        styles = None if element.get("disabled") is not None else dom_snapshot.styles(node)
+        if styles:
+            styles["background-color"] = get_background_color(dom_snapshot, node)
+            output.append(compact_styles(styles))
+        else:
+            output.append(None)
+    return output
+
+def get_target_keys(dom_snapshot):
+    # Identity of the keyboard focusable elements, matching their base styles
+    # with the targets of the page: their name and sorted attributes.
+    output = []
+    for element in CSSSelector(FOCUSABLE_SELECTOR, translator="html")(dom_snapshot.tree):
+        node = dom_snapshot.index(element)
+        attributes = sorted([name, value] for name, value in dom_snapshot.attributes(node).items())
+        output.append([dom_snapshot.node_name(node), attributes])
+    return output
+
+
+def get_color_array(colors):
+    # RGB channels, validity and luminance of colors of compact style records,
+    # as arrays.
+    rgb, valid = contrast.to_rgb(colors)
+    return rgb, valid, np.where(valid, contrast.luminance(rgb), np.nan)
+
+
+def is_color_change(colors1, colors2):
+    # Whether the known RGB channels of two arrays of colors differ.
+    rgb1, valid1, _ = colors1
+    rgb2, valid2, _ = colors2
+    return valid1 & valid2 & (rgb1 != rgb2).any(axis=1)
+
+
+def is_visible_contrast(luminance1, luminance2):
+    return contrast.passes(contrast.contrast_ratio(luminance1, luminance2), FOCUS_CONTRAST_RATIO)
+
+
+def get_background_color(dom_snapshot, node):
+    # Background color of the closest ancestor with one, up to the body.
+    while node >= 0:
+        color = dom_snapshot.style(node, "background-color")
+        if dom_snapshot.node_name(node) == "body":
+            return "rgba(255,255,255,0)" if color in (None, TRANSPARENT) else color
+        if color not in (None, TRANSPARENT):
+            return color
+        node = dom_snapshot.parent(node)
+    return "rgba(255,255,255,0)"
+
+
 class FocusIndicator:
-    def __init__(self, url, locator= global_args["reporttype"]):
+    def __init__(self, url, locator= global_args["reporttype"], driver=None, base_css=None, mode=None, target_keys=None):
+        # driver: optional WebDriver already showing the page with the locator
+        # helpers defined (e.g. a page session tab), not released by this check.
+        # base_css: optional base styles of the page, as returned by get_base_css,
+        # captured again if the focusable elements of the page differ from
+        # target_keys, their keys as returned by get_target_keys.
+        # mode: traversal mode, one of TRAVERSAL_MODES, from the config by default.
+        self.mode = mode or global_args["focus_indicator"]["mode"]
+        if self.mode not in TRAVERSAL_MODES:
+            raise ValueError("Unknown focus traversal mode [%s]" % self.mode)
         self.image_diff = set()
-        self.base_css = {}
+        self.base_css = []
+        self.target_keys = None
         self.focus_missing_elems = []
         self.focus_low_elems = []
         self.total_elems = 0
         self.failed_elems_count = 0
         self.url = to_valid_url(url)
         self.locator = locator
-        self.driver = get_driver()
-        self.driver.get(self.url)
-        utils.define_css_path_fn(self.driver)
-        utils.define_absolute_xpath_fn(self.driver)
-        self.save_complete_base_css()
-        required_width = self.driver.execute_script(
-            "return document.body.parentNode.scrollWidth"
-        )
-        required_height = self.driver.execute_script(
-            "return document.body.parentNode.scrollHeight"
-        )
-        self.driver.set_window_size(required_width, required_height)
-        self.focus_event_listener_fn()
+        self.owns_driver = driver is None
+        self.driver = driver_pool.get_pool().acquire() if driver is None else driver
+        try:
+            if self.owns_driver:
+                with timeline.span("page"):
+                    self.driver.get(self.url)
+                    utils.define_css_path_fn(self.driver)
+                    utils.define_absolute_xpath_fn(self.driver)
+            if base_css is None:
+                with timeline.span("base_css"):
+                    self.save_complete_base_css()
+            else:
+                self.base_css = base_css
+                self.target_keys = target_keys
+            required_width = self.driver.execute_script(
+                "return document.body.parentNode.scrollWidth"
+            )
+            required_height = self.driver.execute_script(
+                "return document.body.parentNode.scrollHeight"
+            )
+            self.driver.set_window_size(required_width, required_height)
+            if self.mode == "keyboard":
+                self.refresh_base_css(self.focus_event_listener_fn())
+        except Exception:
+            self.release_driver()
+            raise
+
+    def release_driver(self):
+        if self.driver is not None:
+            if self.owns_driver:
+                driver_pool.get_pool().release(self.driver)
+            self.driver = None
 
     def get_locator(self, element):
         logging.debug("Inside get locator")
@@ -48,15 +489,52 @@ class FocusIndicator:
         else:
             return self.css_selector_fn(element)
 
+    def get_locators(self, elements):
+        logging.debug("Inside get locators")
+        try:
+            if self.locator == 3:
+                return utils.get_xpaths(self.driver, elements)
+            else:
+                return utils.get_css_paths(self.driver, elements)
+        except:
+            # One of the elements is probably stale: fall back to one call per
+            # element, skipping the ones that fail.
+            logging.debug("Batch locator call failed, retrying element by element")
+            locators = []
+            for element in elements:
+                try:
+                    locators.append(self.get_locator(element))
+                except:
+                    logging.error("Exception occured while updating error list")
+                    traceback.print_exc()
+            return locators
+
+    def get_target_locators(self, ids):
+        # Locators of the targets of the page, by index, in one script call.
+        if not ids:
+            return []
+        return self.driver.execute_script(FOCUS_TARGET_LOCATORS_JS, ids, self.locator != 3)
+
+    def refresh_base_css(self, keys, force=False):
+        # The base styles are matched with the targets by index: capture them
+        # again if the targets changed since, e.g. in a tab loaded separately,
+        # or if forced, e.g. once a cookie banner is closed, as their styles
+        # may change without the targets changing.
+        if force or keys != self.target_keys:
+            logging.debug("Focusable elements changed, capturing the base styles again")
+            self.driver.execute_script("if (document.activeElement) document.activeElement.blur();")
+            self.save_complete_base_css()
+
     def check_website(self):
+        records = []
         try:
             same_elem_count_allowed = 0
             while True:
-                actions = ActionChains(self.driver)
-                actions = actions.send_keys(Keys.TAB)
-                actions.perform()
-                active_elem = self.driver.switch_to.active_element
-                active_elem_xpath = self.driver.execute_script("return window.absoluteXPath(document.activeElement)")
+                with metrics.timer("focus_step"):
+                    actions = ActionChains(self.driver)
+                    actions = actions.send_keys(Keys.TAB)
+                    actions.perform()
+                    active_elem = self.driver.switch_to.active_element
                 if self.total_elems<10 and active_elem is not None:
                     cookie_banner = self.driver.execute_script(
                         'var buttonText = String(arguments[0].outerHTML).toLowerCase(); if (buttonText.indexOf("close")!=-1 || buttonText.indexOf("quit")!=-1 || buttonText.indexOf("accept")!=-1 || buttonText.indexOf("thank")!=-1){arguments[0].click(); return true;} else {return false;};',
@@ -70,6 +548,11 @@ class FocusIndicator:
                         self.focus_low_elems = []
                         self.focus_missing_elems = []
                         self.image_diff = set()
+                        records = []
+                        self.refresh_base_css(
+                            self.driver.execute_script(FOCUS_LIST_TARGETS_JS, FOCUSABLE_SELECTOR),
+                            force=True,
+                        )
                         continue
                 if active_elem in self.image_diff:
                     same_elem_count_allowed += 1
@@ -91,157 +574,187 @@ class FocusIndicator:
                 else:
                     same_elem_count_allowed = 0
                     self.image_diff.add(active_elem)
-                new_style_props = self.driver.execute_script("return window.items")
-                self.total_elems += 1
-                if active_elem_xpath in self.base_css.keys():
-                    logging.debug("Active element is present in base_css")
-                    base_style_props = self.base_css[active_elem_xpath]
-                    fg_color_change = self.is_fg_color_change(
-                        base_style_props, new_style_props
-                    )
-                    bg_color_change = self.is_bg_color_change(
-                        base_style_props, new_style_props
-                    )
-                    is_border_present, border_color_change = self.is_border_change(
-                        base_style_props, new_style_props
-                    )
-                    is_box_present, box_shadow_change = self.check_box_shadow(
-                        base_style_props, new_style_props
-                    )
-                    logging.debug(
-                        "{}, {}, {}, {}".format(
-                            bg_color_change,
-                            fg_color_change,
-                            border_color_change,
-                            box_shadow_change,
-                        )
-                    )
-                    if (
-                        fg_color_change
-                        or bg_color_change
-                        or border_color_change
-                        or box_shadow_change
-                    ):
-                        pass
-                    else:
-                        try:
-                            if is_border_present or is_box_present:
-                                self.focus_low_elems.append(
-                                    self.get_locator(active_elem)
-                                )
-                            else:
-                                self.focus_missing_elems.append(
-                                    self.get_locator(active_elem)
-                                )
-                            self.failed_elems_count += 1
-                        except:
-                            logging.error("Exception occured while updating error list")
-                            traceback.print_exc()
-                            continue
+                record = self.driver.execute_script("return window.items")
+                # Locators are computed in one batch once the traversal is over.
+                if record is not None and record["id"] >= 0:
+                    self.total_elems += 1
+                    records.append((record["id"], active_elem, record["styles"]))
+                else:
+                    logging.debug("Focused element not among the focusable elements, skipped")
         except Exception as e:
             traceback.print_exc()
+        self.analyse_focus(records)
 
-    def check_box_shadow(self, old, new):
-        try:
-            logging.debug("Inside check box shadow")
-            param = "box-shadow"
-            text = new[param]
-            pattern = r"\((.*?)\)"
-            if self.is_diff(old, new, [param]) and text is not None and text != "":
-                bg_color = new["background-color"]
-                bg_tuple, _ = self.extract_color(bg_color, bg_color)
-                color_arr = re.findall(pattern, text)
-                logging.debug(color_arr)
-                if len(color_arr) != 0:
-                    for color in color_arr:
-                        color_arr = color.split(",")
-                        color = [int(i) for i in color_arr[:3]]
-                        logging.debug(
-                            "Shadow color: {} and Background color: {}".format(
-                                color, bg_tuple
-                            )
-                        )
-                        if self.luminosity_ratio_check(color, bg_tuple):
-                            return True, True
-                    return True, False
-            return False, False
-        except:
-            logging.debug("Exception in check box shadow")
-            return False, False
-
-    def is_fg_color_change(self, old, new):
+    def check_website_in_page(self):
+        # Walk the sequential focus order in the page, focusing a batch of
+        # elements per round trip, so that only the analysis of their styles
+        # is left to Python. The failed elements are kept by index.
+        batch_size = global_args["focus_indicator"]["batch_size"]
+        records = []
         try:
-            logging.debug("Inside is_fg_color_change")
-            fg_tag = "text-decoration-color"
-            bg_tag = "background-color"
-            fg_old, fg_new = self.extract_color(old[fg_tag], new[fg_tag])
-            logging.debug("Foreground color: old :{}, new : {}".format(fg_old, fg_new))
-            if fg_old != fg_new:
-                bg_old, bg_new = self.extract_color(old[bg_tag], new[bg_tag])
-                return (
-                    self.luminosity_ratio_check(fg_old, fg_new)
-                    or self.luminosity_ratio_check(bg_old, fg_new)
-                    or self.luminosity_ratio_check(bg_new, fg_new)
-                )
-            else:
-                return False
-        except:
-            logging.debug("Tag not found")
-            return False
+            self.refresh_base_css(self.driver.execute_script(FOCUS_WALK_JS, FOCUSABLE_SELECTOR))
+            # A real TAB key press, so that the elements focused by script
+            # match :focus-visible as if focused with the keyboard.
+            ActionChains(self.driver).send_keys(Keys.TAB).perform()
+            while True:
+                with metrics.timer("focus_batch"):
+                    batch = self.driver.execute_script(FOCUS_WALK_NEXT_JS, batch_size)
+                if batch["banner"]:
+                    logging.debug("Cookie banner closed, starting the traversal over")
+                    time.sleep(2)
+                    self.total_elems = 0
+                    self.focus_low_elems = []
+                    self.focus_missing_elems = []
+                    records = []
+                    self.refresh_base_css(
+                        self.driver.execute_script(FOCUS_WALK_JS, FOCUSABLE_SELECTOR), force=True
+                    )
+                    continue
+                for record in batch["records"]:
+                    # The focus may move to an element not listed.
+                    if record["id"] >= 0:
+                        self.total_elems += 1
+                        records.append((record["id"], record["id"], record["styles"]))
+                if batch["done"]:
+                    break
+        except Exception:
+            logging.exception("Exception in the focus traversal of %s", self.url)
+        self.analyse_focus(records)
 
-    def is_bg_color_change(self, old, new):
-        logging.debug("Inside is_bg_color_change")
+    def check_website_with_pseudo_state(self):
+        # Force the focused pseudo-classes on the focusable elements through the
+        # DevTools protocol, a batch of elements at a time, and read their
+        # styles without any keyboard event or actual focus change. The failed
+        # elements are kept by index.
+        batch_size = global_args["focus_indicator"]["pseudo_batch_size"]
+        records = []
         try:
-            fg_tag = "text-decoration-color"
-            bg_tag = "background-color"
-            bg_old, bg_new = self.extract_color(old[bg_tag], new[bg_tag])
-            logging.debug("Background color: old :{}, new : {}".format(bg_old, bg_new))
-            if bg_old != bg_new:
-                fg_old, fg_new = self.extract_color(old[fg_tag], new[fg_tag])
-                return (
-                    self.luminosity_ratio_check(bg_old, bg_new)
-                    or self.luminosity_ratio_check(fg_old, bg_new)
-                    or self.luminosity_ratio_check(fg_new, bg_new)
+            targets = self.driver.execute_script(FOCUS_TARGETS_JS, FOCUSABLE_SELECTOR)
+            banner = targets["banner"]
+            while targets["banner"]:
+                logging.debug("Cookie banner closed, listing the focusable elements again")
+                time.sleep(2)
+                targets = self.driver.execute_script(FOCUS_TARGETS_JS, FOCUSABLE_SELECTOR)
+            with cdp.Session(self.driver) as session:
+                session.send_all([("DOM.enable", {}), ("CSS.enable", {})])
+                root = session.send("DOM.getDocument", {"depth": 0})["root"]["nodeId"]
+                node_ids, element_ids = (
+                    result["nodeIds"]
+                    for result in session.send_all([
+                        ("DOM.querySelectorAll", {"nodeId": root, "selector": FOCUSABLE_SELECTOR}),
+                        ("DOM.querySelectorAll", {"nodeId": root, "selector": "*"}),
+                    ])
                 )
-            else:
-                return False
-        except:
-            logging.debug("Tag not found")
-            return False
+                if targets["count"] != len(node_ids) or targets["elements"] != len(element_ids):
+                    raise RuntimeError("The focusable elements changed while being listed")
+                self.refresh_base_css(targets["keys"], force=banner)
+                tabbable = targets["tabbable"]
+                ancestors = dict(zip(tabbable, targets["ancestors"]))
+                try:
+                    for start in range(0, len(tabbable), batch_size):
+                        indexes = tabbable[start:start + batch_size]
+                        # The targets may be ancestors of one another: theirs
+                        # override the pseudo-classes of the ancestors.
+                        forced = {
+                            element_ids[j]: FORCED_ANCESTOR_PSEUDO_CLASSES
+                            for i in indexes for j in ancestors[i]
+                        }
+                        forced.update((node_ids[i], FORCED_PSEUDO_CLASSES) for i in indexes)
+                        with metrics.timer("focus_batch"):
+                            session.send_all([
+                                ("CSS.forcePseudoState", {"nodeId": node_id, "forcedPseudoClasses": classes})
+                                for node_id, classes in forced.items()
+                            ])
+                            batch = self.driver.execute_script(FOCUS_TARGET_RECORDS_JS, indexes)
+                            session.send_all([
+                                ("CSS.forcePseudoState", {"nodeId": node_id, "forcedPseudoClasses": []})
+                                for node_id in forced
+                            ])
+                        for record in batch:
+                            self.total_elems += 1
+                            records.append((record["id"], record["id"], record["styles"]))
+                finally:
+                    self.driver.execute_script("window.crestFocus.unfreezeStyles();")
+        except Exception:
+            logging.exception("Exception in the focus pseudo-state check of %s", self.url)
+        self.analyse_focus(records)
 
-    def is_border_change(self, old, new):
-        logging.debug("Inside is_border_change")
+    def analyse_focus(self, records):
+        # Compare the focused styles of elements, given as (index in the
+        # targets, element, compact style record sent by the page), with their
+        # base styles, and record the elements as failed if their focus is not
+        # visible or has low contrast. The contrast ratios of all the elements
+        # are computed at once.
+        compared = [
+            (element, self.base_css[node_id], load_styles(new_style_props))
+            for node_id, element, new_style_props in records
+            if 0 <= node_id < len(self.base_css) and self.base_css[node_id] is not None
+        ]
+        if not compared:
+            return
+        elements, old, new = zip(*compared)
+        fg_tag = "text-decoration-color"
         bg_tag = "background-color"
-        border_status, border_color = self.check_border(old, new)
-        logging.debug(
-            "After checking border: {} , {}".format(border_status, border_color)
+        fg_old = get_color_array([styles[fg_tag] for styles in old])
+        fg_new = get_color_array([styles[fg_tag] for styles in new])
+        bg_old = get_color_array([styles[bg_tag] for styles in old])
+        bg_new = get_color_array([styles[bg_tag] for styles in new])
+        fg_old_lum, fg_new_lum = fg_old[2], fg_new[2]
+        bg_old_lum, bg_new_lum = bg_old[2], bg_new[2]
+        fg_color_change = is_color_change(fg_old, fg_new) & (
+            is_visible_contrast(fg_old_lum, fg_new_lum)
+            | is_visible_contrast(bg_old_lum, fg_new_lum)
+            | is_visible_contrast(bg_new_lum, fg_new_lum)
         )
-        outline_status, outline_color = self.check_outline(old, new)
+        bg_color_change = is_color_change(bg_old, bg_new) & (
+            is_visible_contrast(bg_old_lum, bg_new_lum)
+            | is_visible_contrast(fg_old_lum, bg_new_lum)
+            | is_visible_contrast(fg_new_lum, bg_new_lum)
+        )
+        # Border and outline: enough contrast with the background for either.
+        borders = [self.check_border(o, n) for o, n in zip(old, new)]
+        outlines = [self.check_outline(o, n) for o, n in zip(old, new)]
+        border_status = np.array([status for status, _ in borders], dtype=bool)
+        outline_status = np.array([status for status, _ in outlines], dtype=bool)
+        is_border_present = border_status | outline_status
+        border_lum = contrast.luminance([color for _, color in borders])
+        outline_lum = contrast.luminance([color for _, color in outlines])
+        border_color_change = (border_status & is_visible_contrast(border_lum, bg_new_lum)) | (
+            outline_status & is_visible_contrast(outline_lum, bg_new_lum)
+        )
+        # Box shadow: enough contrast with the background for any of its colors.
+        is_box_present = np.array(
+            [
+                bool(n["box-shadow-colors"]) and self.is_diff(o, n, ["box-shadow"])
+                for o, n in zip(old, new)
+            ],
+            dtype=bool,
+        )
+        shadows = [
+            (i, color) for i in np.flatnonzero(is_box_present) for color in new[i]["box-shadow-colors"]
+        ]
+        box_shadow_change = np.zeros(len(compared), dtype=bool)
+        if shadows:
+            owners = np.array([i for i, _ in shadows])
+            shadow_lum = contrast.luminance([color for _, color in shadows])
+            np.logical_or.at(
+                box_shadow_change, owners, is_visible_contrast(shadow_lum, bg_new_lum[owners])
+            )
+        focus_change = fg_color_change | bg_color_change | border_color_change | box_shadow_change
         logging.debug(
-            "After checking outline: {} , {}".format(outline_status, outline_color)
+            "%d of %d focused elements without visible focus change",
+            np.count_nonzero(~focus_change),
+            len(compared),
         )
-        if outline_status and border_status:
-            color1, color2 = self.extract_color(outline_color, new[bg_tag])
-            logging.debug("Outline Color: {}, bg Color: {}".format(color1, color2))
-            if self.luminosity_ratio_check(color1, color2) is not True:
-                color1, color2 = self.extract_color(border_color, new[bg_tag])
-                logging.debug("Border Color: {}, bg Color: {}".format(color1, color2))
-                return True, self.luminosity_ratio_check(color1, color2)
+        for i in np.flatnonzero(~focus_change):
+            if is_border_present[i] or is_box_present[i]:
+                self.focus_low_elems.append(elements[i])
             else:
-                return True, True
-        elif outline_status or border_status:
-            color = border_color if border_status else outline_color
-            color1, color2 = self.extract_color(color, new[bg_tag])
-            logging.debug("Color: {}, bg Color: {}".format(color1, color2))
-            return True, self.luminosity_ratio_check(color1, color2)
-        return False, False
+                self.focus_missing_elems.append(elements[i])
 
     def is_color_visible(self, color):
-        color = re.search(r"\((.*?)\)", color).group(1).split(",")
-        if len(color) == 4 and float(color[3].strip()) == 0.0:
-            return False
-        else:
-            return True
+        # Colors not parsed are assumed visible.
+        return color is None or color[3] >= MIN_VISIBLE_ALPHA
 
     def check_color(self, elem_css, params):
         logging.debug(elem_css)
@@ -249,25 +762,25 @@ class FocusIndicator:
             "none",
             "hidden",
         ]:
-            width = "".join(filter(str.isdigit, elem_css[params[2]]))
-            if (( width is not None and int(width) > 0 ) or elem_css[params[1]]=="dotted") and self.is_color_visible(elem_css[params[0]]):
+            width = elem_css[params[2]]
+            if (width > 0 or elem_css[params[1]]=="dotted") and self.is_color_visible(elem_css[params[0]]):
                 if params[0] in elem_css.keys():
                     return True, elem_css[params[0]]
                 else:
-                    return True, "rgb(0, 0, 0)"
-        return False, "rgb(0, 0, 0)"
+                    return True, BLACK
+        return False, BLACK
 
     def check_outline(self, old_css, elem_css):
         outline_params = ["outline-color", "outline-style", "outline-width"]
         if self.is_diff(old_css, elem_css, outline_params):
             return self.check_color(elem_css, outline_params)
         else:
-            return False, "rgb(0, 0, 0)"
+            return False, BLACK
 
     def is_diff(self, old, new, param):
         for item in param:
             if item in old.keys() and item in new.keys():
-                logging.debug("{} : {}".format(old[item], new[item]))
+                logging.debug("%s : %s", old[item], new[item])
                 if old[item] != new[item]:
                     return True
         return False
@@ -302,27 +815,13 @@ class FocusIndicator:
                 and self.check_color(elem_css, left_border_params)[0]
             ):
                 return self.check_color(elem_css, bottom_border_params)
-        return False, "rgb(0, 0, 0)"
-
-    def extract_color(self, color1, color2):
-        logging.debug("Inside extract_color")
-        color1 = re.search(r"\((.*?)\)", color1).group(1).split(",")
-        color2 = re.search(r"\((.*?)\)", color2).group(1).split(",")
-        color1 = [int(i) for i in color1[:3]]
-        color2 = [int(i) for i in color2[:3]]
-
-        return color1, color2
+        return False, BLACK
 
     def save_complete_base_css(self):
         logging.debug("Inside saveCompletebase_css")
-        self.base_css = self.driver.execute_script("""
-        function getKeyboardFocusableElements (element = document) { return [...element.querySelectorAll( 'a, button, input, textarea, select, details,[tabindex]:not([tabindex="-1"])' )] .filter(el => !el.hasAttribute('disabled')) }
-        function bgcolor(elem){ var cmpsty = getComputedStyle(elem); var color = cmpsty.getPropertyValue("background-color"); if (color !== "rgba(0, 0, 0, 0)" || elem == document.body) { if(color == "rgba(0, 0, 0, 0)"){return "rgba(255,255,255,0)";}else{return color;}} return bgcolor(elem.parentElement);};
-        function getElementCss(element){ var items = {};var compsty = getComputedStyle(element);var len = compsty.length;for (index = 0; index < len; index++){items [compsty[index]] = compsty.getPropertyValue(compsty[index])}; items['background-color']= bgcolor(element); return items;}
-        var elements = getKeyboardFocusableElements()
-        var output = {}; for(i=0;i<elements.length;i++){output[absoluteXPath(elements[i])] = getElementCss(elements[i]);}
-        return output;
-        """)
+        dom_snapshot = snapshot.capture(self.driver)
+        self.base_css = get_base_css(dom_snapshot)
+        self.target_keys = get_target_keys(dom_snapshot)
 
     def save_failed_screenshot(self):
         try:
@@ -332,47 +831,11 @@ class FocusIndicator:
             traceback.print_exc()
             return False
 
-    def luminosity_ratio_check(self, color1, color2):
-        l1 = self.get_luminance(color1)
-        l2 = self.get_luminance(color2)
-        ratio = (l1 + 0.05) / (l2 + 0.05)
-        logging.debug("Counter: {}, Ratio: {}".format(self.total_elems, ratio))
-        if ratio <= 1 / 3.0 or ratio >= 3.0:
-            return True
-        else:
-            return False
-
-    def get_luminance(self, color):
-        R = 0
-        G = 0
-        B = 0
-        RsRGB = color[0] / 255
-        GsRGB = color[1] / 255
-        BsRGB = color[2] / 255
-        if RsRGB <= 0.03928:
-            R = RsRGB / 12.92
-        else:
-            R = ((RsRGB + 0.055) / 1.055) ** 2.4
-
-        if GsRGB <= 0.03928:
-            G = GsRGB / 12.92
-        else:
-            G = ((GsRGB + 0.055) / 1.055) ** 2.4
-
-        if BsRGB <= 0.03928:
-            B = BsRGB / 12.92
-        else:
-            B = ((BsRGB + 0.055) / 1.055) ** 2.4
-
-        l = 0.2126 * R + 0.7152 * G + 0.0722 * B
-        return l
-
     def css_selector_fn(self, element):
         return self.driver.execute_script('return window.cssPath(arguments[0])', element)
     def focus_event_listener_fn(self):
-        self.driver.execute_script(
-            'function bgcolor(elem){ var cmpsty = getComputedStyle(elem); var color = cmpsty.getPropertyValue("background-color"); if (color !== "rgba(0, 0, 0, 0)" || elem == document.body) { return color;} return bgcolor(elem.parentElement);}; window.items = {}; function onElementFocused(e){var elem = document.activeElement;var cmpsty = getComputedStyle(elem);for(var i =0;i<cmpsty.length;i++){window.items[cmpsty[i]]=cmpsty.getPropertyValue(cmpsty[i]);} items["background-color"] = bgcolor(elem);} if (document.addEventListener) document.addEventListener("focus", onElementFocused, true);'
-        )
+        # Returns the keys of the targets.
+        return self.driver.execute_script(FOCUS_LISTENER_JS, FOCUSABLE_SELECTOR)
 
     def xpath_fn(self, element):
         return self.driver.execute_script('return window.absoluteXPath(arguments[0])', element)
@@ -382,7 +845,22 @@ class FocusIndicator:
         response = {}
         response["status"] = {}
         try:
-            self.check_website()
+            if self.mode == "keyboard":
+                with timeline.span("traversal"):
+                    self.check_website()
+                self.focus_low_elems = self.get_locators(self.focus_low_elems)
+                self.focus_missing_elems = self.get_locators(self.focus_missing_elems)
+            else:
+                if self.mode == "pseudo":
+                    with timeline.span("pseudo_state"):
+                        self.check_website_with_pseudo_state()
+                else:
+                    with timeline.span("traversal"):
+                        self.check_website_in_page()
+                # Only the locators of the failed elements are sent by the page.
+                self.focus_low_elems = self.get_target_locators(self.focus_low_elems)
+                self.focus_missing_elems = self.get_target_locators(self.focus_missing_elems)
+            self.failed_elems_count = len(self.focus_low_elems) + len(self.focus_missing_elems)
             logging.info(
                 "{} : Total Elements : {} : Failed Elements : {}".format(
                     self.url, self.total_elems, self.failed_elems_count
@@ -432,5 +910,5 @@ class FocusIndicator:
             response['status']={'success':"False", 'error':"Failed with exception [%s]" % type(e).__name__}
             return response, 400
         finally:
-            self.driver.quit()
+            self.release_driver()
 
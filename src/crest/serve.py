@@ -0,0 +1,238 @@
+"""
+Production server: a master process loading the heading model and NLTK data
+once, then forking worker processes that serve the API on a shared listening
+socket. The model weights are inherited by the workers and shared
+copy-on-write instead of being loaded by each of them.
+
+Usage: crest-serve [--host HOST] [--port PORT] [--workers N] [--threads N]
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import argparse
+from concurrent import futures
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional
+
+from werkzeug import serving
+
+from crest import config
+from crest.utils import startup_util
+
+# Seconds to wait for workers to exit before killing them.
+_SHUTDOWN_TIMEOUT = 30
+# Minimum number of seconds between two respawns of the same worker slot.
+_RESPAWN_DELAY = 1
+
+
+class RequestHandler(serving.WSGIRequestHandler):
+    """
+    Request handler closing connections after each response, so that idle
+    keep-alive connections do not hold on to the request threads.
+    """
+
+    protocol_version = "HTTP/1.0"
+
+
+class PooledWSGIServer(serving.BaseWSGIServer):
+    """
+    WSGI server handling requests on a fixed-size thread pool, instead of one
+    new thread per request.
+    """
+
+    multithread = True
+
+    def __init__(self, host: str, port: int, app, fd: int, threads: int):
+        self._executor = None
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="crest-http"
+        )
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:  # pylint: disable=broad-except
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        # Also called by the base class constructor, before the pool exists.
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        super().server_close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    params = config.global_args["serve"]
+    parser = argparse.ArgumentParser(
+        prog="crest-serve", description="Serve the Crest API with preforked workers."
+    )
+    parser.add_argument("--host", default=config.global_args["server-ip"])
+    parser.add_argument("--port", type=int, default=config.global_args["port"])
+    parser.add_argument(
+        "--workers", type=int, default=params["workers"], help="Number of worker processes"
+    )
+    parser.add_argument(
+        "--threads", type=int, default=params["threads"], help="Number of request threads per worker"
+    )
+    parser.add_argument(
+        "--torch-threads",
+        type=int,
+        default=params["torch_threads"],
+        help="Number of torch intra-op threads per worker, 0 to share the CPU cores between workers",
+    )
+    return parser.parse_args(argv)
+
+
+def get_torch_threads(args: argparse.Namespace) -> int:
+    """
+    Get the number of torch intra-op threads of each worker, so that the
+    workers together do not use more threads than CPU cores.
+    """
+    if args.torch_threads > 0:
+        return args.torch_threads
+    return max(1, (os.cpu_count() or 1) // max(1, args.workers))
+
+
+def run_worker(listener: socket.socket, args: argparse.Namespace):
+    """
+    Serve requests in a forked worker process, until it receives SIGTERM.
+    """
+    # Imported after the fork, so that the driver pool, its Chrome instances
+    # and its threads belong to the worker.
+    import torch  # pylint: disable=import-outside-toplevel
+    startup_util.reset()
+    from crest import server  # pylint: disable=import-outside-toplevel
+    from crest.utils import driver_pool  # pylint: disable=import-outside-toplevel
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    torch.set_num_threads(get_torch_threads(args))
+    httpd = PooledWSGIServer(
+        args.host, args.port, server.app, listener.fileno(), args.threads
+    )
+    logging.info("Worker %d serving with %d threads", os.getpid(), args.threads)
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        driver_pool.close_pool()
+
+
+def spawn_worker(listener: socket.socket, args: argparse.Namespace) -> int:
+    """
+    Fork a worker process.
+
+    :return: The PID of the worker.
+    """
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(listener, args)
+        except SystemExit as e:
+            code = e.code or 0
+        except BaseException:  # pylint: disable=broad-except
+            logging.exception("Worker %d failed", os.getpid())
+            code = 1
+        finally:
+            logging.shutdown()
+            os._exit(code)  # pylint: disable=protected-access
+    return pid
+
+
+def stop_workers(workers: Dict[int, float]):
+    """
+    Stop worker processes, killing the ones still running after the shutdown
+    timeout.
+    """
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    deadline = time.time() + _SHUTDOWN_TIMEOUT
+    while workers and time.time() < deadline:
+        pid, _ = os.waitpid(-1, os.WNOHANG)
+        if pid:
+            workers.pop(pid, None)
+        else:
+            time.sleep(0.1)
+    for pid in workers:
+        logging.warning("Killing worker %d", pid)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(
+        filename=config.global_args["log_path"],
+        level=config.global_args["log_level"],
+        format="%(asctime)s:%(process)d:%(levelname)s:%(message)s",
+    )
+    # Warmed up in any case, so that the workers share the model.
+    startup_util.crest_init()
+    startup_util.log_startup_report()
+    # socket.create_server is only available from Python 3.8.
+    family = socket.AF_INET6 if ":" in args.host else socket.AF_INET
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((args.host, args.port))
+    listener.listen(128)
+    listener.set_inheritable(True)
+    # Objects allocated so far, including the model, are moved out of the
+    # garbage collector's reach, so that collections in the workers do not
+    # write to their memory pages and defeat copy-on-write sharing. Only
+    # available from Python 3.7.
+    if hasattr(gc, "freeze"):
+        gc.freeze()
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    workers: Dict[int, float] = {}
+    for _ in range(max(1, args.workers)):
+        workers[spawn_worker(listener, args)] = time.time()
+    logging.info("Serving on %s:%d with %d workers", args.host, args.port, len(workers))
+    try:
+        while not stopping:
+            # Polled, since a blocking wait is resumed after the signal
+            # handlers run.
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if not pid:
+                time.sleep(0.5)
+                continue
+            started = workers.pop(pid, None)
+            if started is None:
+                continue
+            logging.warning("Worker %d exited with status %d, respawning", pid, status)
+            time.sleep(max(0, started + _RESPAWN_DELAY - time.time()))
+            workers[spawn_worker(listener, args)] = time.time()
+    finally:
+        stop_workers(workers)
+        listener.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,31 @@
 # Copyright 2020-2021 VMware, Inc.
 # SPDX-License-Identifier: MIT
+# Imported first, so that the start-up timings cover the other imports.
+from crest.utils import startup_util
 from flask import Flask
 from flask import request
+from flask import g
 from flask import render_template
+from flask import url_for
+from flask import Response
+from flask import send_file
+from flask import stream_with_context
 import os
+import json
 import logging
 import traceback
 import requests
 import time
-from crest.composition import clarity
+from crest import batch
+from crest import checks
+from crest import jobs
+from crest import utils
 from crest.config import *
-from crest.perceivable import keyboard_focus_indicator
-from crest.perceivable import cc_transcript
-from crest.operable import heading_analysis
-from crest.all_in_one.crest_init import AllFuncCheck
 from flask_cors import CORS, cross_origin
-from crest.utils.startup_util import *
+from crest.utils import contrast
+from crest.utils import driver_pool
+from crest.utils import metrics
+from crest.utils import profiling
 
 app = Flask(__name__)
 
@@ -28,106 +38,279 @@ logging.basicConfig(
 )
 
 
+@app.before_request
+def start_request_metrics():
+    # Label the metrics of the request, and of the threads working on it, with
+    # its endpoint.
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    g.metrics_token = metrics.set_endpoint(endpoint)
+    g.metrics_start = time.perf_counter()
+
+
+@app.after_request
+def count_request(response):
+    metrics.REQUESTS.inc(status=str(response.status_code))
+    # Observed once the response is sent, streamed responses included.
+    endpoint, start = metrics.get_endpoint(), g.metrics_start
+    response.call_on_close(
+        lambda: metrics.REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+    )
+    return response
+
+
+@app.teardown_request
+def end_request_metrics(exc):
+    # Streamed responses keep the endpoint in their own copy of the context,
+    # see utils.iter_in_context().
+    token = g.pop("metrics_token", None)
+    if token is not None:
+        metrics.reset_endpoint(token)
+
+
+# Request header, or query parameter "profile", asking to profile a request.
+PROFILE_HEADER = "X-Crest-Profile"
+
+
+@app.before_request
+def start_profile():
+    # Profile the request, and the threads working on it, if it asks for it
+    # and a profile directory is configured.
+    value = request.headers.get(PROFILE_HEADER, request.args.get("profile", ""))
+    if value.lower() not in ("1", "true", "yes"):
+        return
+    if profiling.get_directory() is None:
+        logging.warning("Profiling of %s requested, but no profile directory is configured", request.path)
+        return
+    g.profile, g.profile_token = profiling.start(metrics.get_endpoint())
+
+
+@app.after_request
+def finish_profile(response):
+    # The profile covers streamed responses until they are sent, and can be
+    # downloaded from /crest/api/profiles/<id> once written.
+    profile = g.pop("profile", None)
+    if profile is not None:
+        response.headers[PROFILE_HEADER + "-Id"] = profile.id
+        response.call_on_close(lambda: profiling.finish(profile))
+    return response
+
+
+@app.teardown_request
+def end_profile(exc):
+    token = g.pop("profile_token", None)
+    if token is not None:
+        profiling.reset(token)
+    # Requests failing with an exception skip finish_profile().
+    profile = g.pop("profile", None)
+    if profile is not None:
+        profiling.finish(profile)
+
+
+@app.route("/crest/api/profiles/<profile_id>", methods=["GET"])
+def get_profile(profile_id):
+    path = profiling.get_path(profile_id)
+    if path is None or not os.path.exists(path):
+        response = {"status": {"success": "False", "error": "Unknown profile [%s]" % profile_id}}
+        return response, 404
+    return send_file(path, mimetype="application/json")
+
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
+# Streaming formats of /crest/api/all, by name and MIME type.
+STREAM_FORMATS = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+def get_stream_format(data):
+    # Streaming format requested with the "stream" field of the body or the
+    # Accept header, None for a single JSON response.
+    if data.get("stream") in STREAM_FORMATS:
+        return data["stream"]
+    best = request.accept_mimetypes.best_match(
+        ["application/json"] + list(STREAM_FORMATS.values())
+    )
+    for stream_format, mimetype in STREAM_FORMATS.items():
+        if best == mimetype:
+            return stream_format
+    return None
+
+
+def format_event(stream_format, name, response, status_code):
+    payload = json.dumps(dict(check=name, statuscode=status_code, **response))
+    if stream_format == "sse":
+        return f"event: {name}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+
 @app.route("/crest/api/all", methods=["POST"])
 def run():
+    data = request.get_json(silent=True)
     try:
-        logging.debug("Inside run")
-        data = request.get_json()
-        locator = (
-            data["reporttype"] if "reporttype" in data else global_args["reporttype"]
-        )
-        all_func_check = AllFuncCheck(data["url"], locator)
-        response, status_code = all_func_check.main()
-        return response, status_code
+        checks.check_request(data)
+    except checks.InvalidRequestError as e:
+        return checks.failed_response(e)
+    stream_format = get_stream_format(data)
+    if stream_format is None:
+        return checks.run_check("all", data)
+    # Each check is sent as soon as it completes, followed by the merged
+    # result, named "all".
+    events = (
+        format_event(stream_format, *event) for event in checks.stream_all(data)
+    )
+    return Response(
+        stream_with_context(utils.iter_in_context(events)),
+        mimetype=STREAM_FORMATS[stream_format],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Fields of a batch request that are not check options.
+BATCH_FIELDS = ("urls", "sitemaps", "check", "workers", "per_origin", "stream")
+
+
+@app.route("/crest/api/batch", methods=["POST"])
+def run_batch():
+    # Body: "urls" and/or "sitemaps" to scan, "check" to run ("all" by
+    # default), optional "workers" and "per_origin" limits, and the options of
+    # the check request. One JSON line is streamed per page.
+    data = request.get_json(silent=True) or {}
+    try:
+        urls = list(data.get("urls", []))
+        for sitemap in data.get("sitemaps", []):
+            urls += batch.load_sitemap(sitemap)
     except Exception as e:
-        logging.error(e)
-        response={}
-        response['status']={'success':"False", 'error':"Failed with exception [%s]" % type(e).__name__}
+        logging.exception("Exception in run_batch")
+        response = {"status": {"success": "False", "error": "Invalid sitemap [%s]" % type(e).__name__}}
+        return response, 400
+    check = data.get("check", "all")
+    if check not in checks.CHECKS:
+        response = {"status": {"success": "False", "error": "Unknown check [%s]" % check}}
         return response, 400
+    if not urls or len(urls) > global_args["batch"]["max_urls"]:
+        response = {"status": {"success": "False", "error": "Between 1 and %d URLs expected" % global_args["batch"]["max_urls"]}}
+        return response, 400
+    for name in ("workers", "per_origin"):
+        value = data.get(name)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 1):
+            response = {"status": {"success": "False", "error": "Positive integer %s expected" % name}}
+            return response, 400
+    options = {k: v for k, v in data.items() if k not in BATCH_FIELDS}
+    workers = min(data.get("workers") or global_args["batch"]["workers"], global_args["batch"]["workers"])
+    # More pages of an origin than pages at once would not limit anything.
+    per_origin = min(data.get("per_origin") or global_args["batch"]["per_origin"], workers)
+    results = batch.iter_batch(urls, check, options, workers, per_origin)
+    lines = (
+        json.dumps(dict(url=url, check=check, statuscode=status_code, **response)) + "\n"
+        for url, response, status_code in results
+    )
+    return Response(
+        stream_with_context(utils.iter_in_context(lines)),
+        mimetype=STREAM_FORMATS["ndjson"],
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.route("/crest/api/contrast", methods=["POST"])
+def get_contrast():
+    # Body: "colors", a list of CSS colors, optional "against", the colors to
+    # pair them with (the colors themselves by default), optional
+    # "thresholds", the minimum ratios by name (the WCAG ones by default), and
+    # optional "ratios", false to leave the ratios out of the response. Returns
+    # the matrix of the contrast ratios, rounded to 2 decimals, and a pass/fail
+    # matrix per threshold.
+    data = request.get_json(silent=True) or {}
+    colors = data.get("colors")
+    against = data.get("against", colors)
+    max_colors = global_args["contrast"]["max_colors"]
+    for name, value in (("colors", colors), ("against", against)):
+        if not isinstance(value, list) or not 0 < len(value) <= max_colors:
+            response = {"status": {"success": "False", "error": "Between 1 and %d %s expected" % (max_colors, name)}}
+            return response, 400
+    invalid = []
+    for color in colors + against:
+        if (not isinstance(color, str) or contrast.parse_color(color) is None) and color not in invalid:
+            invalid.append(color)
+    if invalid:
+        response = {"status": {"success": "False", "error": "Invalid colors [%s]" % ", ".join(map(str, invalid[:10]))}}
+        return response, 400
+    thresholds = data.get("thresholds", contrast.WCAG_THRESHOLDS)
+    if not isinstance(thresholds, dict) or not all(
+        isinstance(t, (int, float)) and not isinstance(t, bool) for t in thresholds.values()
+    ):
+        response = {"status": {"success": "False", "error": "Invalid thresholds"}}
+        return response, 400
+    ratios = contrast.contrast_matrix(colors, against)
+    response = {"status": {"success": "True", "httpstatuscode": 200}}
+    if data.get("ratios", True):
+        response["ratios"] = ratios.round(2).tolist()
+    response["passes"] = {
+        name: mask.tolist() for name, mask in contrast.contrast_masks(ratios, thresholds).items()
+    }
+    return response, 200
 
 
 @app.route("/crest/api/composition/clarity", methods=["POST"])
 def run_cc():
-    try:
-        data = request.get_json()
-        logging.debug("Request body data: ", data)
-        locator = (
-            data["reporttype"] if "reporttype" in data else global_args["reporttype"]
-        )
-        clarity_composition = clarity.ClarityComposition(data["url"], locator)
-        response = clarity_composition.main()
-        status_code = 200 if response.status.success else 400
-        response_dict = response.asdict()
-        response_dict["status"]["success"] = str(response_dict["status"]["success"])
-        return response_dict, status_code
-    except Exception as e:
-        logging.exception("Exception in run_clarity_composition")
-        response = {
-            'status': {'success': "False", 'error': "Failed with exception [%s]" % type(e).__name__}
-        }
-        return response, 400
+    return checks.run_check("cc", request.get_json(silent=True))
 
 
 @app.route("/crest/api/perceivable/keyboard-focus-indicator", methods=["POST"])
 def run_kb():
-    try:
-        logging.debug("Inside run")
-        data = request.get_json()
-        locator = (
-            data["reporttype"] if "reporttype" in data else global_args["reporttype"]
-        )
-        indicator = keyboard_focus_indicator.FocusIndicator(data["url"], locator)
-        response, status_code  = indicator.main()    
-        return response, status_code 
-    except Exception as e:
-        logging.error(e)
-        response={}
-        response['status']={'success':"False", 'error':"Failed with exception [%s]" % type(e).__name__}
-        return response, 400
+    return checks.run_check("kfi", request.get_json(silent=True))
+
 
- 
 @app.route("/crest/api/operable/heading-analysis", methods=["POST"])
 def run_ha():
-    try:
-        data = request.get_json()
-        logging.debug("Request body data: ", data)
-        locator = (
-            data["reporttype"] if "reporttype" in data else global_args["reporttype"]
-        )
-        heading_content = heading_analysis.HeadingContent(data["url"], locator)
-        response, status_code = heading_content.main()
-        return response, status_code
-    except Exception as e:
-        logging.error(e)
-        response={}
-        response['status']={'success':"False", 'error':"Failed with exception [%s]" % type(e).__name__}
-        return response, 400
+    return checks.run_check("ht", request.get_json(silent=True))
 
 
 @app.route("/crest/api/perceivable/cc-transcript", methods=["POST"])
 def run_av():
+    return checks.run_check("ct", request.get_json(silent=True))
+
+
+@app.route("/crest/api/jobs", methods=["POST"])
+def submit_job():
+    # Body: the body of the check request, plus "check" (one of checks.CHECKS,
+    # "all" by default) and an optional "webhook" URL called on completion.
+    data = request.get_json(silent=True) or {}
     try:
-        logging.debug("Inside run")
-        data = request.get_json()
-        locator = (
-            data["reporttype"] if "reporttype" in data else global_args["reporttype"]
+        job = jobs.get_queue().submit(
+            data.get("check", "all"), data, data.get("webhook")
         )
-        audio_video = cc_transcript.AudioVideo(data["url"], locator)
-        response, status_code = audio_video.main()
-        return response, status_code
-    except Exception as e:
-        logging.error(e)
-        response={}
-        response['status']={'success':"False", 'error':"Failed with exception [%s]" % type(e).__name__}
+    except KeyError:
+        response = {"status": {"success": "False", "error": "Unknown check [%s]" % data.get("check")}}
         return response, 400
+    except jobs.QueueFullError:
+        response = {"status": {"success": "False", "error": "Too many queued jobs, retry later"}}
+        return response, 429, {"Retry-After": "30"}
+    response = job.asdict()
+    return response, 202, {"Location": url_for("get_job", job_id=job.id)}
+
 
+@app.route("/crest/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = jobs.get_queue().get(job_id)
+    if job is None:
+        response = {"status": {"success": "False", "error": "Unknown job [%s]" % job_id}}
+        return response, 404
+    return job.asdict(), 200
 
 
 @app.route("/crest/testMePage")
 def testMePage():
     return render_template("testMePage.html")
 
-crest_init()
+# The heading analysis model and NLTK corpora are otherwise loaded by the first
+# request needing them.
+if global_args["warmup"]:
+    startup_util.crest_init()
+with startup_util.timed("driver_pool"):
+    driver_pool.get_pool()
+startup_util.log_startup_report()
 
 if __name__ == "__main__":
     app.run(host=global_args["server-ip"], port=global_args["port"], debug=True)
@@ -1,84 +1,283 @@
+import contextvars
+import functools
+from typing import Callable, Dict, Iterable, Iterator, List, TypeVar
+
+from lxml import etree
 from selenium.webdriver.remote import webdriver
+from selenium.webdriver.remote import webelement
 
+from crest.utils import profiling
+from crest.utils import timeline
 
-def define_absolute_xpath_fn(driver: webdriver.WebDriver):
-    return driver.execute_script(
-        """
-window.absoluteXPath = function(element) {
-    var comp, comps = [];
-    var parent = null;
-    var xpath = '';
-    var getPos = function(element) {
-        var position = 1, curNode;
-        if (element.nodeType == Node.ATTRIBUTE_NODE) {
-            return null;
-        }
-        for (curNode = element.previousSibling; curNode; curNode = curNode.previousSibling) {
-            if (curNode.nodeName == element.nodeName) {
-                ++position;
+
+# Shared cache of the locator helpers. The position of a node among its
+# siblings of the same name is computed for all the children of its parent in
+# a single walk, and the locator of every node is memoized so that the
+# locators of its descendants only append to it. The caches are dropped
+# whenever the DOM structure or an id changes.
+LOCATOR_CACHE_JS = """
+if (!window.crestLocatorCache) {
+    window.crestLocatorCache = (function () {
+        var cache = {};
+        var observer = null;
+        cache.clear = function () {
+            cache.positions = new WeakMap();
+            cache.xpaths = new WeakMap();
+            cache.cssPaths = new WeakMap();
+        };
+        cache.sync = function () {
+            if (observer && observer.takeRecords().length) {
+                cache.clear();
             }
+        };
+        cache.position = function (node) {
+            var position = cache.positions.get(node);
+            if (position === undefined) {
+                var parent = node.parentNode;
+                if (!parent) {
+                    return 1;
+                }
+                var counts = new Map();
+                for (var child = parent.firstChild; child; child = child.nextSibling) {
+                    var count = (counts.get(child.nodeName) || 0) + 1;
+                    counts.set(child.nodeName, count);
+                    cache.positions.set(child, count);
+                }
+                position = cache.positions.get(node);
+            }
+            return position;
+        };
+        cache.clear();
+        if (window.MutationObserver) {
+            observer = new MutationObserver(cache.clear);
+            observer.observe(document, {
+                childList: true, subtree: true, attributes: true, attributeFilter: ['id']
+            });
         }
-        return position;
-    }
+        return cache;
+    })();
+}
+"""
+
+ABSOLUTE_XPATH_JS = LOCATOR_CACHE_JS + """
+window.absoluteXPath = function(element) {
+    var cache = window.crestLocatorCache;
+    var chain = [];
+    var xpath = '';
+    var node, name;
+    cache.sync();
     if (element instanceof Document) {
         return '/';
     }
     for (
-        ;
-        element && !(element instanceof Document);
-        element = element.nodeType == Node.ATTRIBUTE_NODE ? element.ownerElement : element.parentNode
+        node = element;
+        node && !(node instanceof Document);
+        node = node.nodeType == Node.ATTRIBUTE_NODE ? node.ownerElement : node.parentNode
     ) {
-        comp = comps[comps.length] = {};
-        switch (element.nodeType) {
+        var cached = cache.xpaths.get(node);
+        if (cached !== undefined) {
+            xpath = cached;
+            break;
+        }
+        chain.push(node);
+    }
+    for (var i = chain.length - 1; i >= 0; i--) {
+        node = chain[i];
+        switch (node.nodeType) {
         case Node.TEXT_NODE:
-            comp.name = 'text()';
+            name = 'text()';
             break;
         case Node.ATTRIBUTE_NODE:
-            comp.name = '@' + element.nodeName;
+            name = '@' + node.nodeName;
             break;
         case Node.PROCESSING_INSTRUCTION_NODE:
-            comp.name = 'processing-instruction()';
+            name = 'processing-instruction()';
             break;
         case Node.COMMENT_NODE:
-            comp.name = 'comment()';
-            break;
-        case Node.ELEMENT_NODE:
-            comp.name = element.nodeName;
+            name = 'comment()';
             break;
+        default:
+            name = node.nodeName;
         }
-        comp.position = getPos(element);
-    }
-    for (var i = comps.length - 1; i >= 0; i--) {
-        comp = comps[i];
-        xpath += '/' + comp.name.toLowerCase();
-        if (comp.position !== null) {
-            xpath += '[' + comp.position + ']';
+        xpath += '/' + name.toLowerCase();
+        if (node.nodeType != Node.ATTRIBUTE_NODE) {
+            xpath += '[' + cache.position(node) + ']';
         }
+        cache.xpaths.set(node, xpath);
     }
     return xpath;
-};""")
-
+};"""
 
-def define_css_path_fn(driver: webdriver.WebDriver):
-    return driver.execute_script("""
+CSS_PATH_JS = LOCATOR_CACHE_JS + """
 window.cssPath = function (el) {
     if (!(el instanceof Element)) return;
-    var path = [];
-    while (el.nodeType === Node.ELEMENT_NODE) {
+    var cache = window.crestLocatorCache;
+    var chain = [];
+    var path = null;
+    cache.sync();
+    for (; el && el.nodeType === Node.ELEMENT_NODE; el = el.parentNode) {
+        var cached = cache.cssPaths.get(el);
+        if (cached !== undefined) {
+            path = cached;
+            break;
+        }
+        chain.push(el);
+        if (el.id) break;
+    }
+    for (var i = chain.length - 1; i >= 0; i--) {
+        el = chain[i];
         var selector = el.nodeName.toLowerCase();
         if (el.id) {
-            selector += "#" + el.id;
-            path.unshift(selector);
-            break;
+            path = selector + "#" + el.id;
         } else {
-            var sib = el, nth = 1;
-            while (sib = sib.previousElementSibling) {
-                if (sib.nodeName.toLowerCase() == selector) nth++;
-            }
-            if (nth != 1) selector += ":nth-of-type("+nth+")";
+            var nth = cache.position(el);
+            if (nth != 1) selector += ":nth-of-type(" + nth + ")";
+            path = path === null ? selector : path + " > " + selector;
         }
-        path.unshift(selector);
-        el = el.parentNode;
+        cache.cssPaths.set(el, path);
     }
-    return path.join(" > ");
-}""")
+    return path;
+}"""
+
+
+def define_absolute_xpath_fn(driver: webdriver.WebDriver):
+    with timeline.span("inject_helpers"):
+        return driver.execute_script(ABSOLUTE_XPATH_JS)
+
+
+def define_css_path_fn(driver: webdriver.WebDriver):
+    with timeline.span("inject_helpers"):
+        return driver.execute_script(CSS_PATH_JS)
+
+
+def get_xpaths(driver: webdriver.WebDriver, elements: List[webelement.WebElement]) -> List[str]:
+    """
+    Get the xpaths of several elements in a single round trip to the browser.
+    `define_absolute_xpath_fn` must have been called on the page.
+    """
+    if not elements:
+        return []
+    with timeline.span("locators"):
+        return driver.execute_script(
+            "return arguments[0].map(function (e) { return window.absoluteXPath(e); });",
+            elements,
+        )
+
+
+def get_css_paths(driver: webdriver.WebDriver, elements: List[webelement.WebElement]) -> List[str]:
+    """
+    Get the CSS selector paths of several elements in a single round trip to
+    the browser. `define_css_path_fn` must have been called on the page.
+    """
+    if not elements:
+        return []
+    with timeline.span("locators"):
+        return driver.execute_script(
+            "return arguments[0].map(function (e) { return window.cssPath(e); });",
+            elements,
+        )
+
+
+T = TypeVar("T")
+
+
+def propagate_context(fn: Callable[..., T]) -> Callable[..., T]:
+    """
+    Wrap a function to run it in a copy of the current context variables, so
+    that the state of the current request (metrics endpoint, ...) follows it
+    in the thread pools it is submitted to, and the threads running it are
+    profiled with the request. Each call gets its own copy, so the wrapper can
+    run concurrently in several threads.
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.copy().run(profiling.call, fn, *args, **kwargs)
+
+    return wrapper
+
+
+def iter_in_context(iterable: Iterable[T]) -> Iterator[T]:
+    """
+    Iterate in a copy of the current context variables, e.g. over the
+    generator of a streamed response, consumed after its request handler
+    returned. Closing the iterator closes the generator in the same context.
+    """
+    context = contextvars.copy_context()
+    iterator = iter(iterable)
+
+    def iterate():
+        try:
+            while True:
+                try:
+                    yield context.run(next, iterator)
+                except StopIteration:
+                    return
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                context.run(close)
+
+    return iterate()
+
+
+class TreeLocator:
+    """
+    Python counterpart of the absoluteXPath and cssPath helpers, computing the
+    same locators for the elements of an lxml tree. The positions of siblings
+    and the locators of ancestors are memoized.
+    """
+
+    def __init__(self, locator: int):
+        """
+        :param locator: The locator type to compute, 3 for xpaths or 4 for CSS
+            selector paths, see operation.Locator.
+        """
+        self._xpath = locator == 3
+        self._positions: Dict[etree._Element, int] = {}
+        self._locators: Dict[etree._Element, str] = {}
+
+    def position(self, element: etree._Element) -> int:
+        """
+        Get the 1-based position of an element among its siblings of the same
+        tag, computing it for all the children of its parent at once.
+        """
+        if element not in self._positions:
+            parent = element.getparent()
+            if parent is None:
+                return 1
+            counts: Dict[str, int] = {}
+            for child in parent:
+                if isinstance(child.tag, str):
+                    counts[child.tag] = counts.get(child.tag, 0) + 1
+                    self._positions[child] = counts[child.tag]
+        return self._positions[element]
+
+    def locate(self, element: etree._Element) -> str:
+        """
+        Get the xpath or CSS selector path of an element.
+        """
+        chain = []
+        path = None
+        node = element
+        while node is not None:
+            if node in self._locators:
+                path = self._locators[node]
+                break
+            chain.append(node)
+            if not self._xpath and node.get("id"):
+                break
+            node = node.getparent()
+        for node in reversed(chain):
+            tag = node.tag.lower()
+            if self._xpath:
+                path = f"{path or ''}/{tag}[{self.position(node)}]"
+            elif node.get("id"):
+                path = f"{tag}#{node.get('id')}"
+            else:
+                position = self.position(node)
+                selector = tag if position == 1 else f"{tag}:nth-of-type({position})"
+                path = selector if path is None else f"{path} > {selector}"
+            self._locators[node] = path
+        return path
@@ -0,0 +1,123 @@
+"""
+Module providing a Chrome DevTools protocol session to the current tab of a
+WebDriver, sending commands in pipelined batches.
+
+chromedriver relays one DevTools command per HTTP round trip. When the
+DevTools address of the browser is known and websocket-client is installed,
+the session connects to the tab directly and sends a whole batch of commands
+before reading their responses, so that a batch costs about one round trip.
+Otherwise, the commands are relayed by chromedriver one at a time.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import json
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from selenium.webdriver.remote import webdriver
+
+from crest.utils import timeline
+
+# A DevTools command: its method and parameters.
+CdpCommand = Tuple[str, Dict[str, Any]]
+
+
+class CdpError(Exception):
+    """
+    A DevTools command failed.
+    """
+
+
+class Session:
+    """
+    DevTools session to the current tab of a Chrome WebDriver.
+    """
+
+    def __init__(self, driver: webdriver.WebDriver, timeout: float = 30):
+        """
+        :param driver: The Chrome WebDriver, showing the tab to connect to.
+        :param timeout: Seconds to wait for the responses of the commands.
+        """
+        self._logger = logging.getLogger(__name__).getChild(self.__class__.__name__)
+        self._driver = driver
+        self._socket = None
+        self._next_id = 0
+        address = (driver.capabilities.get("goog:chromeOptions") or {}).get("debuggerAddress")
+        if address is None:
+            return
+        try:
+            import websocket
+
+            target = driver.execute_cdp_cmd("Target.getTargetInfo", {})["targetInfo"]["targetId"]
+            # Without Origin header, Chrome accepts the connection without
+            # --remote-allow-origins.
+            self._socket = websocket.create_connection(
+                f"ws://{address}/devtools/page/{target}", timeout=timeout, suppress_origin=True
+            )
+        except Exception:  # pylint: disable=broad-exception-caught
+            self._logger.debug("Cannot connect to DevTools, relaying commands", exc_info=True)
+
+    @property
+    def pipelined(self) -> bool:
+        """
+        Whether the commands are pipelined, rather than relayed by chromedriver.
+        """
+        return self._socket is not None
+
+    def send(self, method: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Send a single command, and wait for its response.
+
+        :raise CdpError: The command failed.
+        :return: The result of the command.
+        """
+        return self.send_all([(method, params or {})])[0]
+
+    def send_all(self, commands: Sequence[CdpCommand]) -> List[Dict[str, Any]]:
+        """
+        Send a batch of commands, and wait for all of their responses.
+
+        :param commands: The method and parameters of each command.
+        :raise CdpError: One of the commands failed.
+        :return: The result of each command, in order.
+        """
+        if self._socket is None:
+            results = []
+            for method, params in commands:
+                try:
+                    results.append(self._driver.execute_cdp_cmd(method, params))
+                except Exception as e:
+                    raise CdpError(f"{method} failed: {e}") from e
+            return results
+        timeline.count_round_trip()
+        indexes = {}
+        for index, (method, params) in enumerate(commands):
+            self._next_id += 1
+            indexes[self._next_id] = index
+            self._socket.send(json.dumps({"id": self._next_id, "method": method, "params": params}))
+        results: List[Dict[str, Any]] = [{}] * len(commands)
+        error = None
+        while indexes:
+            message = json.loads(self._socket.recv())
+            # Events have no id.
+            index = indexes.pop(message.get("id"), None)
+            if index is None:
+                continue
+            if "error" in message and error is None:
+                error = CdpError(f"{commands[index][0]} failed: {message['error']}")
+            results[index] = message.get("result", {})
+        if error is not None:
+            raise error
+        return results
+
+    def close(self):
+        if self._socket is not None:
+            socket, self._socket = self._socket, None
+            socket.close()
+
+    def __enter__(self) -> "Session":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
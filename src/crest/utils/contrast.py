@@ -0,0 +1,401 @@
+"""
+Module computing the WCAG 2 relative luminance and contrast ratio of colors,
+for whole arrays of colors at once with NumPy, e.g. the contrast matrix of
+the colors of a theme.
+
+Colors are parsed once per distinct string, in any CSS color syntax, and
+converted to 8-bit sRGB channels, which are linearised with a lookup table of
+their 256 values instead of a power per channel. As in the keyboard focus
+indicator check, the alpha channel is ignored. Colors that cannot be parsed
+have a NaN luminance, so that the contrast ratios involving them are NaN and
+pass no threshold.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import functools
+import math
+import re
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+# (r, g, b, a) integers from 0 to 255.
+Color = Tuple[int, int, int, int]
+ColorLike = Union[str, Sequence[int], None]
+
+# Minimum contrast ratios of WCAG 2, for normal and large text at the AA and
+# AAA levels, and for user interface components and graphics.
+WCAG_THRESHOLDS = {"aa": 4.5, "aa_large": 3.0, "aaa": 7.0, "aaa_large": 4.5, "non_text": 3.0}
+
+_FUNCTION_RE = re.compile(r"([a-z-]+)\(([^()]*)\)")
+_HEX_RE = re.compile(r"#([0-9a-f]{3,4}|[0-9a-f]{6}|[0-9a-f]{8})")
+_SEPARATOR_RE = re.compile(r"[\s,]+")
+# Hue units, in degrees. "grad" is tested before "rad".
+_HUE_UNITS = (("deg", 1.0), ("grad", 0.9), ("rad", 180 / math.pi), ("turn", 360.0))
+
+# Linear value of each 8-bit sRGB channel value, as defined for the relative
+# luminance in WCAG 2.
+_SRGB = np.arange(256) / 255
+LINEAR_RGB = np.where(_SRGB <= 0.03928, _SRGB / 12.92, ((_SRGB + 0.055) / 1.055) ** 2.4)
+LUMINANCE_WEIGHTS = np.array([0.2126, 0.7152, 0.0722])
+
+# Conversion matrices of CSS Color 4, to XYZ D65 unless stated otherwise.
+_D50_TO_D65 = (
+    (0.955473421488075, -0.02309845494876471, 0.06325924320057072),
+    (-0.0283697093338637, 1.0099953980813041, 0.021041441191917323),
+    (0.012314014864481998, -0.020507649298898964, 1.330365926242124),
+)
+_XYZ_TO_LINEAR_SRGB = (
+    (3.2409699419045226, -1.537383177570094, -0.4986107602930034),
+    (-0.9692436362808796, 1.8759675015077202, 0.04155505740717559),
+    (0.05563007969699366, -0.20397695888897652, 1.0569715142428786),
+)
+_DISPLAY_P3_TO_XYZ = (
+    (0.4865709486482162, 0.26566769316909306, 0.1982172852343625),
+    (0.2289745640697488, 0.6917385218365064, 0.079286914093745),
+    (0.0, 0.04511338185890264, 1.043944368900976),
+)
+_A98_RGB_TO_XYZ = (
+    (0.5766690429101305, 0.1855582379065463, 0.1882286462349947),
+    (0.29734497525053605, 0.6273635662554661, 0.07529145849399788),
+    (0.02703136138641234, 0.07068885253582723, 0.9913375368376388),
+)
+_REC2020_TO_XYZ = (
+    (0.6369580483012914, 0.14461690358620832, 0.1688809751641721),
+    (0.2627002120112671, 0.6779980715188708, 0.05930171646986196),
+    (0.0, 0.028072693049087428, 1.060985057710791),
+)
+# To XYZ D50.
+_PROPHOTO_RGB_TO_XYZ_D50 = (
+    (0.7977604896723027, 0.13518583717574031, 0.0313493495815248),
+    (0.2880711282292934, 0.7118432178101014, 0.00008565396060525902),
+    (0.0, 0.0, 0.8251046025104601),
+)
+_D50_WHITE = (0.3457 / 0.3585, 1.0, (1.0 - 0.3457 - 0.3585) / 0.3585)
+
+
+def _multiply(matrix, vector):
+    return [sum(m * v for m, v in zip(row, vector)) for row in matrix]
+
+
+def _srgb_to_linear(c: float) -> float:
+    sign = -1 if c < 0 else 1
+    c = abs(c)
+    return sign * (c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(c: float) -> float:
+    sign = -1 if c < 0 else 1
+    c = abs(c)
+    return sign * (12.92 * c if c <= 0.0031308 else 1.055 * c ** (1 / 2.4) - 0.055)
+
+
+def _xyz_to_srgb(xyz, d50: bool = False):
+    if d50:
+        xyz = _multiply(_D50_TO_D65, xyz)
+    return [_linear_to_srgb(c) for c in _multiply(_XYZ_TO_LINEAR_SRGB, xyz)]
+
+
+def _number(token: str, percent: float = 1.0) -> float:
+    """
+    Value of a component: a number, a percentage of `percent`, or none.
+    """
+    if token == "none":
+        return 0.0
+    value = float(token[:-1]) / 100 * percent if token.endswith("%") else float(token)
+    if not math.isfinite(value):
+        raise ValueError(token)
+    return value
+
+
+def _hue(token: str) -> float:
+    for unit, degrees in _HUE_UNITS:
+        if token.endswith(unit):
+            return _number(token[: -len(unit)]) * degrees
+    return _number(token)
+
+
+def _components(args: str, count: int) -> Tuple[List[str], float]:
+    """
+    Split the arguments of a color function, in the modern "c1 c2 c3 / alpha"
+    or legacy "c1, c2, c3, alpha" syntax.
+
+    :return: The components, and the alpha from 0 to 1.
+    """
+    alpha = None
+    if "/" in args:
+        args, alpha = args.split("/")
+        alpha = alpha.strip()
+    components = [token for token in _SEPARATOR_RE.split(args.strip()) if token]
+    if alpha is None and "," in args and len(components) == count + 1:
+        alpha = components.pop()
+    if len(components) != count:
+        raise ValueError(args)
+    return components, 1.0 if alpha is None else min(max(_number(alpha), 0.0), 1.0)
+
+
+def _hsl_to_srgb(hue: float, saturation: float, lightness: float):
+    def channel(n):
+        k = (n + hue / 30) % 12
+        a = saturation * min(lightness, 1 - lightness)
+        return lightness - a * max(-1, min(k - 3, 9 - k, 1))
+
+    return [channel(0), channel(8), channel(4)]
+
+
+def _lab_to_srgb(lightness: float, a: float, b: float):
+    kappa, epsilon = 24389 / 27, 216 / 24389
+    f1 = (lightness + 16) / 116
+    f0 = a / 500 + f1
+    f2 = f1 - b / 200
+    xyz = [
+        f0 ** 3 if f0 ** 3 > epsilon else (116 * f0 - 16) / kappa,
+        f1 ** 3 if lightness > kappa * epsilon else lightness / kappa,
+        f2 ** 3 if f2 ** 3 > epsilon else (116 * f2 - 16) / kappa,
+    ]
+    return _xyz_to_srgb([c * w for c, w in zip(xyz, _D50_WHITE)], d50=True)
+
+
+def _oklab_to_srgb(lightness: float, a: float, b: float):
+    lms = [
+        (lightness + 0.3963377774 * a + 0.2158037573 * b) ** 3,
+        (lightness - 0.1055613458 * a - 0.0638541728 * b) ** 3,
+        (lightness - 0.0894841775 * a - 1.2914855480 * b) ** 3,
+    ]
+    linear = _multiply(
+        (
+            (4.0767416621, -3.3077115913, 0.2309699292),
+            (-1.2684380046, 2.6097574011, -0.3413193965),
+            (-0.0041960863, -0.7034186147, 1.7076147010),
+        ),
+        lms,
+    )
+    return [_linear_to_srgb(c) for c in linear]
+
+
+def _polar(chroma: float, hue: float) -> Tuple[float, float]:
+    return chroma * math.cos(math.radians(hue)), chroma * math.sin(math.radians(hue))
+
+
+def _rgb(args: str):
+    (r, g, b), alpha = _components(args, 3)
+    return [_number(c, 255) / 255 for c in (r, g, b)], alpha
+
+
+def _hsl(args: str):
+    (h, s, l), alpha = _components(args, 3)
+    return _hsl_to_srgb(_hue(h), _number(s, 100) / 100, _number(l, 100) / 100), alpha
+
+
+def _hwb(args: str):
+    (h, w, b), alpha = _components(args, 3)
+    white, black = _number(w, 100) / 100, _number(b, 100) / 100
+    if white + black >= 1:
+        return [white / (white + black)] * 3, alpha
+    rgb = _hsl_to_srgb(_hue(h), 1, 0.5)
+    return [c * (1 - white - black) + white for c in rgb], alpha
+
+
+def _lab(args: str):
+    (l, a, b), alpha = _components(args, 3)
+    return _lab_to_srgb(_number(l, 100), _number(a, 125), _number(b, 125)), alpha
+
+
+def _lch(args: str):
+    (l, c, h), alpha = _components(args, 3)
+    return _lab_to_srgb(_number(l, 100), *_polar(_number(c, 150), _hue(h))), alpha
+
+
+def _oklab(args: str):
+    (l, a, b), alpha = _components(args, 3)
+    return _oklab_to_srgb(_number(l), _number(a, 0.4), _number(b, 0.4)), alpha
+
+
+def _oklch(args: str):
+    (l, c, h), alpha = _components(args, 3)
+    return _oklab_to_srgb(_number(l), *_polar(_number(c, 0.4), _hue(h))), alpha
+
+
+def _color(args: str):
+    space, _, args = args.strip().partition(" ")
+    components, alpha = _components(args, 3)
+    values = [_number(c) for c in components]
+    if space == "srgb":
+        return values, alpha
+    if space == "srgb-linear":
+        return [_linear_to_srgb(c) for c in values], alpha
+    if space == "display-p3":
+        xyz = _multiply(_DISPLAY_P3_TO_XYZ, [_srgb_to_linear(c) for c in values])
+        return _xyz_to_srgb(xyz), alpha
+    if space == "a98-rgb":
+        linear = [math.copysign(abs(c) ** (563 / 256), c) for c in values]
+        return _xyz_to_srgb(_multiply(_A98_RGB_TO_XYZ, linear)), alpha
+    if space == "prophoto-rgb":
+        linear = [c / 16 if abs(c) <= 16 / 512 else math.copysign(abs(c) ** 1.8, c) for c in values]
+        return _xyz_to_srgb(_multiply(_PROPHOTO_RGB_TO_XYZ_D50, linear), d50=True), alpha
+    if space == "rec2020":
+        a, b = 1.09929682680944, 0.018053968510807
+        linear = [
+            c / 4.5 if abs(c) < b * 4.5 else math.copysign(((abs(c) + a - 1) / a) ** (1 / 0.45), c)
+            for c in values
+        ]
+        return _xyz_to_srgb(_multiply(_REC2020_TO_XYZ, linear)), alpha
+    if space in ("xyz", "xyz-d65", "xyz-d50"):
+        return _xyz_to_srgb(values, d50=space == "xyz-d50"), alpha
+    raise ValueError(space)
+
+
+# Parsers of the color functions, returning the sRGB channels from 0 to 1,
+# out of gamut values included, and the alpha.
+_FUNCTIONS = {
+    "rgb": _rgb,
+    "rgba": _rgb,
+    "hsl": _hsl,
+    "hsla": _hsl,
+    "hwb": _hwb,
+    "lab": _lab,
+    "lch": _lch,
+    "oklab": _oklab,
+    "oklch": _oklch,
+    "color": _color,
+}
+
+
+def _parse_hex(digits: str) -> Color:
+    if len(digits) <= 4:
+        digits = "".join(digit * 2 for digit in digits)
+    channels = [int(digits[i:i + 2], 16) for i in range(0, len(digits), 2)]
+    return tuple(channels) + (255,) * (4 - len(channels))
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_color(value: Optional[str]) -> Optional[Color]:
+    """
+    Parse a CSS color: a named color, a hex color, or one of the rgb(),
+    hsl(), hwb(), lab(), lch(), oklab(), oklch() and color() functions,
+    without calc() or relative colors. Colors out of the sRGB gamut are
+    clipped to it.
+
+    :return: The (r, g, b, a) integers of the color, None if it is not a
+        color, or one depending on its context such as currentcolor.
+    """
+    if not value:
+        return None
+    value = value.strip().lower()
+    if value.startswith("#"):
+        match = _HEX_RE.fullmatch(value)
+        return None if match is None else _parse_hex(match.group(1))
+    if value == "transparent":
+        return (0, 0, 0, 0)
+    match = _FUNCTION_RE.fullmatch(value)
+    if match is None:
+        # Imported on first use, as PIL is slow to import.
+        from PIL import ImageColor  # pylint: disable=import-outside-toplevel
+
+        color = ImageColor.colormap.get(value)
+        return None if color is None else _parse_hex(color[1:])
+    parser = _FUNCTIONS.get(match.group(1))
+    if parser is None:
+        return None
+    try:
+        rgb, alpha = parser(match.group(2))
+    except (ValueError, ZeroDivisionError):
+        return None
+    channels = tuple(round(min(max(c, 0.0), 1.0) * 255) for c in rgb)
+    return channels + (round(alpha * 255),)
+
+
+def to_rgb(colors: Sequence[ColorLike]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convert colors to an array of their RGB channels.
+
+    :param colors: Color strings, parsed with parse_color(), or sequences of
+        at least 3 channels. None for unknown colors.
+    :return: The (N, 3) uint8 array of the channels, black for the unknown
+        colors, and the boolean array telling which colors are known.
+    """
+    # Pages use few distinct colors: each one is converted once.
+    codes: Dict[Any, int] = {}
+    indexes = np.fromiter(
+        (
+            codes.setdefault(tuple(color) if isinstance(color, list) else color, len(codes))
+            for color in colors
+        ),
+        dtype=np.intp,
+        count=len(colors),
+    )
+    parsed = [parse_color(color) if isinstance(color, str) else color for color in codes]
+    valid = np.array([color is not None for color in parsed], dtype=bool)
+    rgb = np.array(
+        [(0, 0, 0) if color is None else color[:3] for color in parsed], dtype=np.uint8
+    ).reshape(len(parsed), 3)
+    return rgb[indexes], valid[indexes]
+
+
+def luminance(colors: Union[Sequence[ColorLike], np.ndarray]) -> np.ndarray:
+    """
+    Get the relative luminance of colors.
+
+    :param colors: Colors as accepted by to_rgb(), or an (N, 3) uint8 array of
+        RGB channels.
+    :return: The array of the luminances, from 0 to 1, NaN for the unknown
+        colors.
+    """
+    if isinstance(colors, np.ndarray):
+        return LINEAR_RGB[colors] @ LUMINANCE_WEIGHTS
+    rgb, valid = to_rgb(colors)
+    return np.where(valid, LINEAR_RGB[rgb] @ LUMINANCE_WEIGHTS, np.nan)
+
+
+def contrast_ratio(luminance1: np.ndarray, luminance2: np.ndarray) -> np.ndarray:
+    """
+    Get the contrast ratios of pairs of colors, from 1 to 21, whatever the
+    order of the colors in the pairs.
+
+    :param luminance1: The luminances of the first colors of the pairs.
+    :param luminance2: The luminances of the second colors, broadcast with
+        the first ones.
+    """
+    ratios = (luminance1 + 0.05) / (luminance2 + 0.05)
+    return np.maximum(ratios, 1 / ratios)
+
+
+def passes(ratios: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Whether contrast ratios reach a threshold, False for the NaN ratios.
+    """
+    with np.errstate(invalid="ignore"):
+        return ratios >= threshold
+
+
+def contrast_matrix(
+    colors: Sequence[ColorLike], others: Optional[Sequence[ColorLike]] = None
+) -> np.ndarray:
+    """
+    Get the contrast ratios of every pair of colors of two lists, e.g. the
+    text and background colors of a theme.
+
+    :param colors: The N colors, as accepted by to_rgb().
+    :param others: The M colors to pair them with, the colors themselves by
+        default.
+    :return: The (N, M) array of the ratios, NaN for the unknown colors.
+    """
+    luminances = luminance(colors)
+    other_luminances = luminances if others is None else luminance(others)
+    return contrast_ratio(luminances[:, np.newaxis], other_luminances[np.newaxis, :])
+
+
+def contrast_masks(
+    ratios: np.ndarray, thresholds: Optional[Mapping[str, float]] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Tell which contrast ratios reach each of a set of thresholds.
+
+    :param ratios: The contrast ratios, e.g. from contrast_matrix().
+    :param thresholds: The minimum ratios by name, WCAG_THRESHOLDS by default.
+    :return: The boolean arrays of the ratios passing each threshold, by name.
+    """
+    if thresholds is None:
+        thresholds = WCAG_THRESHOLDS
+    return {name: passes(ratios, threshold) for name, threshold in thresholds.items()}
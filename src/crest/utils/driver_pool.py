@@ -0,0 +1,371 @@
+"""
+Module providing a bounded pool of warm, reusable Chrome WebDriver instances.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+from dataclasses import dataclass
+import collections
+import logging
+import threading
+import time
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from selenium.webdriver.remote import webdriver
+
+from crest import config
+from crest.utils import get_common_function
+from crest.utils import metrics
+from crest.utils import timeline
+
+
+class PoolTimeoutError(Exception):
+    """
+    Raised when no WebDriver instance becomes available within the configured
+    acquire timeout.
+    """
+
+
+@dataclass
+class PoolStats:
+    """
+    Snapshot of the state and counters of a DriverPool.
+    """
+
+    size: int
+    idle: int
+    in_use: int
+    launched: int = 0
+    acquired: int = 0
+    waits: int = 0
+    wait_time: float = 0.0
+    max_wait_time: float = 0.0
+    recycled: int = 0
+    discarded: int = 0
+
+
+class DriverPool:
+    """
+    Bounded pool of pre-launched, health-checked WebDriver instances.
+
+    Checks borrow a driver with `acquire()` and give it back with `release()`.
+    Returned drivers are reset (cookies, storage, extra tabs, window size) so
+    that no state leaks from one scan to the next, and are recycled once they
+    have served `max_uses` scans.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        max_uses: int,
+        prelaunch: int = 0,
+        acquire_timeout: Optional[float] = None,
+        factory: Callable[[], webdriver.WebDriver] = get_common_function.get_driver,
+    ):
+        self._logger = logging.getLogger(__name__).getChild(self.__class__.__name__)
+        self._size = max(1, size)
+        self._max_uses = max_uses
+        self._prelaunch = min(prelaunch, self._size)
+        self._acquire_timeout = acquire_timeout
+        self._factory = factory
+        self._cond = threading.Condition()
+        self._idle: Deque[webdriver.WebDriver] = collections.deque()
+        self._uses: Dict[int, int] = {}
+        self._window_sizes: Dict[int, Dict[str, int]] = {}
+        # Number of live drivers, idle, in use or being launched.
+        self._total = 0
+        self._closed = False
+        self._stats = PoolStats(size=self._size, idle=0, in_use=0)
+        if self._prelaunch:
+            self._warm_in_background()
+
+    def acquire(self) -> webdriver.WebDriver:
+        """
+        Borrow a healthy WebDriver instance from the pool, launching a new one
+        if the pool is not full yet, or waiting for one to be released.
+
+        :return: A WebDriver instance that must be given back with `release()`.
+        :raises PoolTimeoutError: If no driver is available before the acquire
+            timeout expires.
+        """
+        with timeline.span("driver_acquire"):
+            return self._acquire()
+
+    def try_acquire(self) -> Optional[webdriver.WebDriver]:
+        """
+        Borrow a healthy WebDriver instance from the pool if one is idle or the
+        pool is not full yet, without waiting for one to be released.
+
+        :return: A WebDriver instance that must be given back with `release()`,
+            None if all of them are in use.
+        """
+        with timeline.span("driver_acquire"):
+            return self._acquire(block=False)
+
+    def _acquire(self, block: bool = True) -> Optional[webdriver.WebDriver]:
+        start_time = time.time()
+        waited = False
+        while True:
+            launch = False
+            with self._cond:
+                while not self._idle and self._total >= self._size:
+                    if not block:
+                        return None
+                    waited = True
+                    remaining = None
+                    if self._acquire_timeout is not None:
+                        remaining = self._acquire_timeout - (time.time() - start_time)
+                        if remaining <= 0:
+                            raise PoolTimeoutError(
+                                f"No WebDriver available after {self._acquire_timeout}s"
+                            )
+                    self._cond.wait(remaining)
+                if self._idle:
+                    driver = self._idle.popleft()
+                else:
+                    self._total += 1
+                    launch = True
+            if launch:
+                driver = self._launch()
+            elif not self._is_healthy(driver):
+                self._discard(driver)
+                continue
+            break
+        wait_time = time.time() - start_time
+        with self._cond:
+            self._stats.acquired += 1
+            if waited:
+                self._stats.waits += 1
+            self._stats.wait_time += wait_time
+            self._stats.max_wait_time = max(self._stats.max_wait_time, wait_time)
+        metrics.PHASE_SECONDS.observe(wait_time, phase="driver_acquire")
+        self._logger.debug("Acquired WebDriver after %.3fs", wait_time)
+        return driver
+
+    def release(self, driver: webdriver.WebDriver, discard: bool = False):
+        """
+        Give a WebDriver instance back to the pool.
+
+        The driver is reset before being made available again, or quit if it
+        reached the maximum number of uses, if resetting it failed or if
+        `discard` is True.
+
+        :param driver: The driver obtained from `acquire()`.
+        :param discard: Whether the driver must be quit instead of reused.
+        """
+        with self._cond:
+            uses = self._uses.get(id(driver), 0) + 1
+            self._uses[id(driver)] = uses
+            closed = self._closed
+        if discard or closed:
+            self._discard(driver)
+            return
+        if self._max_uses and uses >= self._max_uses:
+            self._logger.info("Recycling WebDriver after %d scans", uses)
+            with self._cond:
+                self._stats.recycled += 1
+            self._discard(driver, count=False)
+            if self._prelaunch:
+                self._warm_in_background()
+            return
+        if not self._reset(driver):
+            self._discard(driver)
+            return
+        with self._cond:
+            self._idle.append(driver)
+            self._cond.notify()
+
+    def warm(self):
+        """
+        Launch drivers until at least `prelaunch` of them are idle, without
+        exceeding the pool size.
+        """
+        while True:
+            with self._cond:
+                if self._closed or len(self._idle) >= self._prelaunch:
+                    return
+                if self._total >= self._size:
+                    return
+                self._total += 1
+            driver = self._launch()
+            with self._cond:
+                self._idle.append(driver)
+                self._cond.notify()
+
+    def stats(self) -> PoolStats:
+        """
+        Get the current size, utilisation and counters of the pool.
+
+        :return: A copy of the pool statistics.
+        """
+        with self._cond:
+            idle = len(self._idle)
+            return PoolStats(
+                **{
+                    **self._stats.__dict__,
+                    "idle": idle,
+                    "in_use": self._total - idle,
+                }
+            )
+
+    def close(self):
+        """
+        Quit all the idle drivers. Drivers currently in use are quit when they
+        are released.
+        """
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+        for driver in idle:
+            self._discard(driver, count=False)
+
+    def _warm_in_background(self):
+        threading.Thread(target=self._warm_logged, name="driver-pool-warm", daemon=True).start()
+
+    def _warm_logged(self):
+        """
+        Warm the pool, logging launch failures instead of raising them, as the
+        background thread has no caller to raise them to.
+        """
+        try:
+            self.warm()
+        except Exception:  # pylint: disable=broad-exception-caught
+            self._logger.exception("Cannot launch WebDriver in the background")
+
+    def _launch(self) -> webdriver.WebDriver:
+        """
+        Launch a new driver, whose slot in `_total` has already been reserved.
+        The slot is freed if the launch fails.
+
+        :raise Exception: The exception raised by the driver factory.
+        """
+        try:
+            with metrics.timer("browser_launch"):
+                driver = self._factory()
+            window_size = driver.get_window_size()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._uses[id(driver)] = 0
+            self._window_sizes[id(driver)] = window_size
+            self._stats.launched += 1
+        self._logger.info("Launched new WebDriver")
+        return driver
+
+    def _discard(self, driver: webdriver.WebDriver, count: bool = True):
+        """
+        Quit a driver and free its slot in the pool.
+        """
+        try:
+            driver.quit()
+        except Exception:  # pylint: disable=broad-exception-caught
+            self._logger.debug("Error quitting discarded WebDriver", exc_info=True)
+        with self._cond:
+            self._uses.pop(id(driver), None)
+            self._window_sizes.pop(id(driver), None)
+            self._total -= 1
+            if count:
+                self._stats.discarded += 1
+            self._cond.notify()
+
+    def _is_healthy(self, driver: webdriver.WebDriver) -> bool:
+        """
+        Check that the browser behind an idle driver still responds.
+        """
+        try:
+            return driver.execute_script("return 1;") == 1
+        except Exception:  # pylint: disable=broad-exception-caught
+            self._logger.warning("Idle WebDriver failed health check", exc_info=True)
+            return False
+
+    def _reset(self, driver: webdriver.WebDriver) -> bool:
+        """
+        Clear the session state left by a scan: extra tabs, cookies, storage of
+        the last visited origin and window size.
+
+        :return: True if the driver was reset successfully.
+        """
+        try:
+            handles = driver.window_handles
+            for handle in handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(handles[0])
+            origin = driver.execute_script(
+                "try { localStorage.clear(); sessionStorage.clear(); } catch (e) {}"
+                "return window.location.origin;"
+            )
+            if origin and origin != "null":
+                driver.execute_cdp_cmd(
+                    "Storage.clearDataForOrigin",
+                    {"origin": origin, "storageTypes": "all"},
+                )
+            driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            driver.get("about:blank")
+            window_size = self._window_sizes.get(id(driver))
+            if window_size:
+                driver.set_window_size(window_size["width"], window_size["height"])
+            return True
+        except Exception:  # pylint: disable=broad-exception-caught
+            self._logger.warning("Failed to reset WebDriver", exc_info=True)
+            return False
+
+
+_pool: Optional[DriverPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> DriverPool:
+    """
+    Get the process-wide DriverPool, creating it from the "driver_pool" entry of
+    the configuration on first use.
+
+    :return: The shared DriverPool instance.
+    """
+    global _pool  # pylint: disable=global-statement
+    with _pool_lock:
+        if _pool is None:
+            params = config.global_args["driver_pool"]
+            _pool = DriverPool(
+                size=params["size"],
+                max_uses=params["max_uses"],
+                prelaunch=params["prelaunch"],
+                acquire_timeout=params["acquire_timeout"],
+            )
+        return _pool
+
+
+def close_pool():
+    """
+    Close the process-wide DriverPool, if it was created, quitting all its
+    drivers.
+    """
+    global _pool  # pylint: disable=global-statement
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+def _get_pool_drivers() -> Dict[Tuple[str, ...], float]:
+    pool = _pool
+    if pool is None:
+        return {}
+    stats = pool.stats()
+    return {
+        ("idle",): stats.idle,
+        ("in_use",): stats.in_use,
+        ("free",): stats.size - stats.idle - stats.in_use,
+    }
+
+
+POOL_DRIVERS = metrics.Gauge(
+    "crest_driver_pool_drivers",
+    "Number of Chrome instances of the driver pool: idle, in use, and free slots",
+    ("state",),
+)
+POOL_DRIVERS.set_function(_get_pool_drivers)
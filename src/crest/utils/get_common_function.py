@@ -2,18 +2,44 @@
 # SPDX-License-Identifier: MIT
 import logging
 import traceback
+import os.path
 import requests
+import urllib.parse
+import urllib.request
 from selenium import webdriver
-from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
+from crest.utils import instrumented_driver
+from crest.utils import provisioning
 
+# HTTP session of load_html, keeping the connections to the scanned sites
+# open between requests.
+_http = requests.Session()
+_http.headers.update(
+    {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/114.0.0.0 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml",
+    }
+)
 
 def to_valid_url(url):
     if '://' not in url:
         url = 'http://'+url
     return url 
 
+def load_html(url):
+    # Get the raw HTML document at an http(s) or file URL, or in a local file,
+    # without rendering it.
+    parsed_url = urllib.parse.urlparse(url)
+    if parsed_url.scheme == "file" or (not parsed_url.scheme and os.path.isfile(url)):
+        path = urllib.request.url2pathname(parsed_url.path) if parsed_url.scheme else url
+        with open(path, "rb") as html_file:
+            return html_file.read()
+    response = _http.get(to_valid_url(url), timeout=30)
+    response.raise_for_status()
+    return response.content
+
 def remove_category_add_param(output):
     categories_without_zero_count ={}
     total_count = 0
@@ -54,8 +80,8 @@ def get_driver():
     # capabilities['acceptInsecureCerts'] = True
 
     chrome_options.add_experimental_option("prefs", prefs)
-    driver = webdriver.Chrome(
-        service=Service(ChromeDriverManager().install()), options=chrome_options
+    driver = instrumented_driver.InstrumentedChrome(
+        service=Service(provisioning.get_chromedriver_path()), options=chrome_options
     )
     # driver = webdriver.Chrome(options=chrome_options
     return driver
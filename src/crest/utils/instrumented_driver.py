@@ -0,0 +1,207 @@
+"""
+Module providing the Chrome WebDriver used by the checks, instrumented to
+measure the WebDriver commands it sends to chromedriver.
+
+On top of the metrics, the round trips of a request can be accounted in
+detail, see record_commands(): the number of calls, time and serialized bytes
+of each command, also by check method sending it. The accounting is kept in a
+context variable, like the timeline of the request.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import contextlib
+import contextvars
+from dataclasses import dataclass
+import json
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+
+from selenium import webdriver
+from selenium.webdriver.remote.command import Command
+
+from crest.utils import metrics
+from crest.utils import timeline
+
+# Scan phases of the WebDriver commands measured in the metrics, by command.
+COMMAND_PHASES = {
+    Command.GET: "navigation",
+    Command.W3C_EXECUTE_SCRIPT: "script",
+    Command.W3C_EXECUTE_SCRIPT_ASYNC: "script",
+}
+# Modules of the helpers sending commands on behalf of the checks: commands
+# are attributed to the check method calling them. Operation methods are
+# methods of the checks.
+HELPER_MODULES = ("selenium.", "crest.utils")
+CHECK_MODULES = ("crest.utils.operation",)
+
+
+@dataclass
+class CallStats:
+    """
+    Number of calls, time and serialized bytes of WebDriver round trips.
+    """
+
+    calls: int = 0
+    time: float = 0.0
+    sent: int = 0
+    received: int = 0
+
+    def add(self, duration: float, sent: int, received: int):
+        self.calls += 1
+        self.time += duration
+        self.sent += sent
+        self.received += received
+
+    def asdict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "time": round(self.time * 1000, 1),
+            "sent": self.sent,
+            "received": self.received,
+        }
+
+
+class CommandStats:
+    """
+    WebDriver round trips of a request, by command and by check method.
+    """
+
+    def __init__(self):
+        self.total = CallStats()
+        self.commands: Dict[str, CallStats] = {}
+        self.callers: Dict[str, CallStats] = {}
+        # Number of calls of each command, by check method.
+        self.caller_commands: Dict[str, Dict[str, int]] = {}
+        # Round trips are sent from the threads of the request.
+        self._lock = threading.Lock()
+
+    def add(self, command: str, caller: str, duration: float, sent: int, received: int):
+        with self._lock:
+            self.total.add(duration, sent, received)
+            self.commands.setdefault(command, CallStats()).add(duration, sent, received)
+            self.callers.setdefault(caller, CallStats()).add(duration, sent, received)
+            commands = self.caller_commands.setdefault(caller, {})
+            commands[command] = commands.get(command, 0) + 1
+
+    def asdict(self) -> Dict[str, Any]:
+        """
+        Convert the accounting to nested dicts, suitable for serialization as
+        JSON, the slowest commands and callers first. Times are in
+        milliseconds and sizes in bytes of JSON.
+        """
+        with self._lock:
+            result = self.total.asdict()
+            result["commands"] = {
+                name: stats.asdict() for name, stats in _by_time(self.commands)
+            }
+            result["callers"] = {
+                name: dict(stats.asdict(), commands=dict(self.caller_commands[name]))
+                for name, stats in _by_time(self.callers)
+            }
+            return result
+
+    def summary(self, callers: int = 3) -> str:
+        """
+        Summarize the accounting in a line of log, with the slowest callers.
+        """
+        with self._lock:
+            slowest = ", ".join(
+                "%s (%d calls, %.0f ms)" % (name, stats.calls, stats.time * 1000)
+                for name, stats in _by_time(self.callers)[:callers]
+            )
+            return "%d round trips, %.0f ms, %d bytes sent, %d bytes received%s" % (
+                self.total.calls,
+                self.total.time * 1000,
+                self.total.sent,
+                self.total.received,
+                "; slowest callers: " + slowest if slowest else "",
+            )
+
+
+def _by_time(stats: Dict[str, CallStats]):
+    return sorted(stats.items(), key=lambda item: item[1].time, reverse=True)
+
+
+_stats: "contextvars.ContextVar[Optional[CommandStats]]" = contextvars.ContextVar(
+    "command_stats", default=None
+)
+
+
+@contextlib.contextmanager
+def record_commands() -> Iterator[CommandStats]:
+    """
+    Context manager accounting the WebDriver round trips of its body, and of
+    the threads running in a copy of its context.
+    """
+    token = _stats.set(CommandStats())
+    try:
+        yield _stats.get()
+    finally:
+        _stats.reset(token)
+
+
+def get_caller(depth: int = 1) -> str:
+    """
+    Get the check method sending a WebDriver command: the innermost caller
+    outside of the helper modules, as "Class.method" or "module.function".
+
+    :param depth: Number of frames to skip, from the caller of this function.
+    """
+    frame = sys._getframe(depth + 1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("crest.") and (
+            not module.startswith(HELPER_MODULES) or module.startswith(CHECK_MODULES)
+        ):
+            owner = frame.f_locals.get("self")
+            prefix = type(owner).__name__ if owner is not None else module.rsplit(".", 1)[-1]
+            return f"{prefix}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "other"
+
+
+def _json_size(value: Any) -> int:
+    return len(json.dumps(value, default=str)) if value is not None else 0
+
+
+class InstrumentedChrome(webdriver.Chrome):
+    """
+    Chrome WebDriver observing the duration of its navigations and script
+    round trips, counting its round trips in the timeline of the request, and
+    accounting them when the request records them.
+    """
+
+    def execute(self, driver_command, params=None):
+        stats = _stats.get()
+        if stats is None:
+            return self._execute(driver_command, params)
+        command = driver_command if isinstance(driver_command, str) else "bidi"
+        caller = get_caller()
+        sent = _json_size(self._wrap_value(params))
+        start = time.perf_counter()
+        try:
+            response = self._execute(driver_command, params)
+        except Exception:
+            stats.add(command, caller, time.perf_counter() - start, sent, 0)
+            raise
+        duration = time.perf_counter() - start
+        received = _json_size(self._wrap_value(response.get("value"))) if response else 0
+        stats.add(command, caller, duration, sent, received)
+        return response
+
+    def _execute(self, driver_command, params):
+        phase = COMMAND_PHASES.get(driver_command) if isinstance(driver_command, str) else None
+        if phase is None:
+            timeline.count_round_trip()
+            return super().execute(driver_command, params)
+        # Navigations are also spans of the timeline, scripts are too many.
+        if phase == "navigation":
+            timer = metrics.timer(phase)
+        else:
+            timer = metrics.PHASE_SECONDS.time(phase=phase)
+        with timer:
+            timeline.count_round_trip()
+            return super().execute(driver_command, params)
@@ -0,0 +1,281 @@
+"""
+Module collecting counters, gauges and latency histograms of the API, and
+rendering them in the Prometheus text exposition format.
+
+Metrics with an "endpoint" label are labelled with the API endpoint of the
+current request, kept in a context variable: threads working on behalf of a
+request must run in a copy of its context, see utils.propagate_context().
+
+Metrics are kept per process: each worker of the preforked server exposes its
+own.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import bisect
+import contextlib
+import contextvars
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from crest.utils import timeline
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Upper bounds of the buckets of the latency histograms, in seconds.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_endpoint: "contextvars.ContextVar[str]" = contextvars.ContextVar("endpoint", default="none")
+
+LabelValues = Tuple[str, ...]
+
+
+def get_endpoint() -> str:
+    """
+    Get the API endpoint of the current request, "none" outside of requests.
+    """
+    return _endpoint.get()
+
+
+def set_endpoint(endpoint: str) -> contextvars.Token:
+    """
+    Set the API endpoint of the current request.
+
+    :return: The token to pass to reset_endpoint() once the request is over.
+    """
+    return _endpoint.set(endpoint)
+
+
+def reset_endpoint(token: contextvars.Token):
+    _endpoint.reset(token)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{%s}" % ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+
+
+class Metric:
+    """
+    Base class of the metrics, holding a value per combination of labels.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        """
+        Get the label values in the order of the label names, labelling the
+        "endpoint" label with the current endpoint unless given.
+        """
+        if "endpoint" in self.labelnames and "endpoint" not in labels:
+            labels = dict(labels, endpoint=get_endpoint())
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, Sequence[str], Sequence[str], float]]:
+        """
+        Get the samples of the metric.
+
+        :yield: The name, label names, label values and value of each sample.
+        """
+        raise NotImplementedError()
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {_escape(self.documentation)}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for name, labelnames, values, value in self.samples():
+            lines.append(f"{name}{_format_labels(labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    """
+    A value that only goes up, e.g. a number of requests.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._label_values(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, self.labelnames, key, value
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down, either set or read from a function when
+    the metrics are rendered.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], Dict[LabelValues, float]]] = None
+
+    def set(self, value: float, **labels: str):
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function: Callable[[], Dict[LabelValues, float]]):
+        """
+        Read the values of the gauge from a function when rendering it.
+
+        :param function: Function returning the values by label values.
+        """
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            values = sorted(self._function().items())
+        else:
+            with self._lock:
+                values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, self.labelnames, key, value
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values, e.g. durations, in cumulative buckets.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Count of the observations of each bucket and their sum, by label values.
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._label_values(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    @contextlib.contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """
+        Context manager observing the duration of its body, in seconds.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            counts, _ = self._values.get(self._label_values(labels), ([0], [0.0]))
+            return sum(counts)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        labelnames = self.labelnames + ("le",)
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield self.name + "_bucket", labelnames, key + (_format_value(bound),), cumulative
+            yield self.name + "_sum", self.labelnames, key, total
+            yield self.name + "_count", self.labelnames, key, cumulative
+
+
+class Registry:
+    """
+    Set of the metrics of the process.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def unregister(self, metric: Metric):
+        with self._lock:
+            self._metrics.pop(metric.name, None)
+
+    def render(self) -> str:
+        """
+        Render the metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        return "".join(line + "\n" for metric in metrics for line in metric.render())
+
+
+REGISTRY = Registry()
+
+REQUESTS = Counter("crest_requests_total", "Number of API requests", ("endpoint", "status"))
+REQUEST_SECONDS = Histogram(
+    "crest_request_seconds", "Duration of the API requests, in seconds", ("endpoint",)
+)
+PHASE_SECONDS = Histogram(
+    "crest_phase_seconds",
+    "Duration of the phases of the scans, in seconds: driver_acquire, browser_launch, "
+    "navigation, script, clarity_rules, focus_step, focus_batch, tokenizer, inference and ocr",
+    ("endpoint", "phase"),
+)
+
+
+@contextlib.contextmanager
+def timer(phase: str) -> Iterator[None]:
+    """
+    Context manager observing the duration of a phase of a scan, also recorded
+    as a span of the timeline of the request.
+    """
+    with timeline.span(phase), PHASE_SECONDS.time(phase=phase):
+        yield
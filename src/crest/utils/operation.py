@@ -11,11 +11,13 @@ import logging
 import time
 from typing import Any, Collection, Dict, List, Optional, Tuple
 
+from selenium.webdriver.remote import webdriver
 from selenium.webdriver.remote import webelement
 
 from crest import config
 from crest import utils
-from crest.utils import get_common_function
+from crest.utils import driver_pool
+from crest.utils import timeline
 
 
 class Locator(enum.Enum):
@@ -122,19 +124,58 @@ class Operation:
     Base class for a Crest operation.
     """
 
-    def __init__(self, url: str, locator: int = config.global_args["reporttype"]):
+    def __init__(
+        self,
+        url: str,
+        locator: int = config.global_args["reporttype"],
+        driver: Optional[webdriver.WebDriver] = None,
+    ):
+        """
+        :param url: The URL of the page to check.
+        :param locator: The locator type to report, see Locator.
+        :param driver: Optional WebDriver already showing the page, with the
+            locator helpers defined, e.g. the tab of a shared page session. It
+            is not released by the operation. If not provided, a driver is
+            borrowed from the pool and the page is loaded in it.
+        """
         self._logger = logging.getLogger(self.__class__.__module__).getChild(
             self.__class__.__name__
         )
-        self._driver = get_common_function.get_driver()
-        self._logger.info("Fetching URL %s", url)
         self._pageurl = url
-        self._driver.get(url)
         self._locator = locator
-        if locator == Locator.XPATH.value:
-            utils.define_absolute_xpath_fn(self._driver)
-        else:
-            utils.define_css_path_fn(self._driver)
+        self._owns_driver = driver is None
+        self._driver = driver
+        if driver is None and self._needs_driver():
+            self._open_driver()
+
+    def _needs_driver(self) -> bool:
+        """
+        Whether the operation needs the page loaded in a browser before `main()`
+        is called. Subclasses that can work without a browser override it, and
+        may call `_open_driver()` later if they need one after all.
+
+        :return: True if a WebDriver must be opened on construction.
+        """
+        return True
+
+    def _open_driver(self):
+        """
+        Borrow a WebDriver from the pool, load the page in it and define the
+        locator helpers.
+        """
+        self._owns_driver = True
+        self._driver = driver_pool.get_pool().acquire()
+        self._logger.info("Fetching URL %s", self._pageurl)
+        try:
+            with timeline.span("page"):
+                self._driver.get(self._pageurl)
+                if self._locator == Locator.XPATH.value:
+                    utils.define_absolute_xpath_fn(self._driver)
+                else:
+                    utils.define_css_path_fn(self._driver)
+        except Exception:
+            self._release_driver()
+            raise
 
     def get_css_path(self, element: webelement.WebElement) -> str:
         """
@@ -158,6 +199,39 @@ class Operation:
         )
         return path
 
+    def get_css_paths(self, elements: List[webelement.WebElement]) -> List[str]:
+        """
+        Get the CSS selector paths for the given elements, in a single round
+        trip to the browser.
+
+        :param elements: The elements whose paths will be returned.
+        :return: the CSS selector paths of `elements`, in the same order.
+        """
+        return utils.get_css_paths(self._driver, elements)
+
+    def get_xpaths(self, elements: List[webelement.WebElement]) -> List[str]:
+        """
+        Get the xpaths for the given elements, in a single round trip to the
+        browser.
+
+        :param elements: The elements whose paths will be returned.
+        :return: the xpaths of `elements`, in the same order.
+        """
+        return utils.get_xpaths(self._driver, elements)
+
+    def get_locators(self, elements: List[webelement.WebElement]) -> List[str]:
+        """
+        Get the xpaths or CSS selector paths for the given elements, depending
+        on the locator type of this operation, in a single round trip to the
+        browser.
+
+        :param elements: The elements whose locators will be returned.
+        :return: the locators of `elements`, in the same order.
+        """
+        if self._locator == Locator.XPATH.value:
+            return self.get_xpaths(elements)
+        return self.get_css_paths(elements)
+
     def main(self) -> Response:
         """
         The entrypoint for a Crest operation.
@@ -176,14 +250,22 @@ class Operation:
             duration = round(time.time() - start_time, 2)
             response.statistics.time = duration
             self._update_counts(response)
-            self._driver.quit()
-            self._driver = None
+            self._release_driver()
         return response
 
     def __del__(self):
-        if self._driver:
-            self._driver.quit()
+        self._release_driver()
+
+    def _release_driver(self):
+        """
+        Give the WebDriver used by this operation back to the pool, unless it
+        was provided by the caller.
+        """
+        driver = getattr(self, "_driver", None)
+        if driver:
             self._driver = None
+            if self._owns_driver:
+                driver_pool.get_pool().release(driver)
 
     def _main(self, response: Response):
         """
@@ -0,0 +1,245 @@
+"""
+Module profiling single requests with a sampling profiler, and writing their
+profiles in the speedscope JSON format (https://www.speedscope.app).
+
+A profile samples the stacks of the threads registered to it at a fixed
+interval, from a background thread, so that it adds no overhead to the code
+it profiles besides the sampling itself, and several requests can be profiled
+at once. The profile of the current request is kept in a context variable:
+the threads running in a copy of its context with utils.propagate_context()
+are registered to it while they run.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from crest import config
+
+T = TypeVar("T")
+
+EXTENSION = ".speedscope.json"
+# Format of the profile IDs, also file names in the profile directory.
+ID_PATTERN = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$")
+# Frames of a sampled stack: function name, file and first line.
+FrameKey = Tuple[str, str, int]
+
+
+def get_directory() -> Optional[str]:
+    """
+    Get the directory the profiles are written to, None if profiling is
+    disabled.
+    """
+    return config.global_args["profiling"]["directory"]
+
+
+def get_path(profile_id: str) -> Optional[str]:
+    """
+    Get the path of a profile, None if the ID is not valid or profiling is
+    disabled.
+    """
+    directory = get_directory()
+    if directory is None or not ID_PATTERN.match(profile_id):
+        return None
+    return os.path.join(directory, profile_id + EXTENSION)
+
+
+class Profile:
+    """
+    Sampled stacks of the threads working on a request.
+    """
+
+    def __init__(self, name: str, interval: float):
+        """
+        :param name: Name of the profile, e.g. the profiled endpoint.
+        :param interval: Seconds between two samples.
+        """
+        self.id = "%s-%s" % (time.strftime("%Y%m%dT%H%M%S"), uuid.uuid4().hex[:8])
+        self.name = name
+        self._interval = interval
+        self._lock = threading.Lock()
+        # Registration count of the sampled threads, by thread ID.
+        self._threads: Dict[int, int] = {}
+        self._thread_names: Dict[int, str] = {}
+        self._frames: Dict[FrameKey, int] = {}
+        # Sampled stacks, root first, and their weights in seconds, by thread ID.
+        self._samples: Dict[int, Tuple[List[List[int]], List[float]]] = {}
+        self._stopped = threading.Event()
+        self._start = time.perf_counter()
+        self._end: Optional[float] = None
+        self._sampler = threading.Thread(
+            target=self._sample_loop, name=f"profile-{self.id}", daemon=True
+        )
+        self._sampler.start()
+
+    def add_thread(self):
+        """
+        Sample the current thread, until remove_thread() is called as many
+        times as add_thread().
+        """
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = self._threads.get(ident, 0) + 1
+            self._thread_names.setdefault(ident, threading.current_thread().name)
+
+    def remove_thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            count = self._threads.pop(ident, 0) - 1
+            if count > 0:
+                self._threads[ident] = count
+
+    def stop(self):
+        """
+        Stop sampling, e.g. once the request is over.
+        """
+        if not self._stopped.is_set():
+            self._stopped.set()
+            self._sampler.join()
+            self._end = time.perf_counter()
+
+    def _sample_loop(self):
+        last = time.perf_counter()
+        while not self._stopped.wait(self._interval):
+            now = time.perf_counter()
+            self._sample(now - last)
+            last = now
+
+    def _sample(self, weight: float):
+        with self._lock:
+            threads = list(self._threads)
+        if not threads:
+            return
+        frames = sys._current_frames()
+        with self._lock:
+            for ident in threads:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    key = (code.co_name, code.co_filename, code.co_firstlineno)
+                    stack.append(self._frames.setdefault(key, len(self._frames)))
+                    frame = frame.f_back
+                stack.reverse()
+                samples, weights = self._samples.setdefault(ident, ([], []))
+                samples.append(stack)
+                weights.append(weight)
+
+    def asdict(self) -> Dict[str, Any]:
+        """
+        Convert the profile to the speedscope JSON format, with one sampled
+        profile per thread.
+        """
+        with self._lock:
+            end = (self._end if self._end is not None else time.perf_counter()) - self._start
+            frames = sorted(self._frames, key=self._frames.get)
+            profiles = [
+                {
+                    "type": "sampled",
+                    "name": self._thread_names[ident],
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": round(end, 6),
+                    "samples": samples,
+                    "weights": [round(weight, 6) for weight in weights],
+                }
+                for ident, (samples, weights) in self._samples.items()
+            ]
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.name} {self.id}",
+            "exporter": "crest",
+            "activeProfileIndex": 0,
+            "shared": {
+                "frames": [{"name": name, "file": file, "line": line} for name, file, line in frames]
+            },
+            "profiles": profiles,
+        }
+
+    def save(self, directory: str) -> str:
+        """
+        Stop sampling and write the profile to a directory.
+
+        :return: The path of the profile.
+        """
+        self.stop()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.id + EXTENSION)
+        with open(path, "w", encoding="utf-8") as profile_file:
+            json.dump(self.asdict(), profile_file)
+        return path
+
+
+_current: "contextvars.ContextVar[Optional[Profile]]" = contextvars.ContextVar(
+    "profile", default=None
+)
+
+
+def start(name: str) -> Tuple[Profile, contextvars.Token]:
+    """
+    Start profiling the current request, sampling the current thread and the
+    threads working on the request.
+
+    :param name: Name of the profile, e.g. the profiled endpoint.
+    :return: The profile, to pass to finish() once the request is over, and
+        the token to pass to reset() when leaving its context.
+    """
+    profile = Profile(name, config.global_args["profiling"]["interval"])
+    profile.add_thread()
+    return profile, _current.set(profile)
+
+
+def reset(token: contextvars.Token):
+    """
+    Forget the profile of the current request in the current context.
+    """
+    _current.reset(token)
+
+
+def finish(profile: Profile):
+    """
+    Stop a profile and write it to the profile directory.
+    """
+    try:
+        path = profile.save(get_directory())
+        logging.info("Profile %s of %s written to %s", profile.id, profile.name, path)
+    except OSError:
+        logging.exception("Cannot write profile %s", profile.id)
+
+
+@contextlib.contextmanager
+def sampled() -> Iterator[None]:
+    """
+    Context manager sampling the current thread during its body, if the
+    current request is profiled.
+    """
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    profile.add_thread()
+    try:
+        yield
+    finally:
+        profile.remove_thread()
+
+
+def call(fn: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Call a function, sampling the current thread if the current request is
+    profiled.
+    """
+    with sampled():
+        return fn(*args, **kwargs)
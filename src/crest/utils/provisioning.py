@@ -0,0 +1,248 @@
+"""
+Module resolving the resources needed by the checks, the NLTK data, the
+heading analysis model and chromedriver, from a local artifact directory.
+
+The artifact directory holds the resources and a manifest.json file listing
+the SHA-256 checksum of each of their files, by path relative to the
+directory:
+
+    {"files": {"model/config.json": "<sha256>", ...}}
+
+A resource is verified against the manifest the first time it is resolved,
+and its path is then cached for the life of the process. Without an artifact
+directory, the resources are downloaded as before, and the chromedriver path
+is looked up once per process.
+
+Usage: python -m crest.utils.provisioning {build,verify} DIR
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+from typing import Dict, List, Optional
+
+from crest import config
+
+MANIFEST = "manifest.json"
+# Resources of the artifact directory.
+RESOURCES = ("nltk_data", "model", "chromedriver")
+
+_lock = threading.Lock()
+# Paths of the resolved resources, by name.
+_resolved: Dict[str, str] = {}
+
+
+class ProvisioningError(Exception):
+    """
+    A resource is missing from the artifact directory or does not match its
+    manifest.
+    """
+
+
+def get_artifact_dir() -> Optional[str]:
+    """
+    Get the configured artifact directory, None to download the resources.
+    """
+    return config.global_args["provisioning"]["artifact_dir"]
+
+
+def is_offline() -> bool:
+    """
+    Whether the resources must be resolved from the artifact directory, without
+    network access.
+    """
+    return get_artifact_dir() is not None
+
+
+def sha256sum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as resource_file:
+        for chunk in iter(lambda: resource_file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def list_files(artifact_dir: str, path: str = "") -> List[str]:
+    """
+    List the files of the artifact directory, or of one of its resources, by
+    path relative to the artifact directory.
+    """
+    root = os.path.join(artifact_dir, path)
+    if os.path.isfile(root):
+        return [path]
+    files = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            relative = os.path.relpath(os.path.join(directory, name), artifact_dir)
+            if relative != MANIFEST:
+                files.append(relative.replace(os.sep, "/"))
+    return sorted(files)
+
+
+def load_manifest(artifact_dir: str) -> Dict[str, str]:
+    """
+    Load the checksums of the files of the artifact directory.
+
+    :return: The SHA-256 checksums, by path relative to the artifact directory.
+    """
+    try:
+        with open(os.path.join(artifact_dir, MANIFEST), encoding="utf-8") as manifest:
+            return json.load(manifest)["files"]
+    except (OSError, ValueError, KeyError) as e:
+        raise ProvisioningError(f"Cannot load the manifest of {artifact_dir}: {e}") from e
+
+
+def verify(artifact_dir: str, resource: str, manifest: Dict[str, str]) -> str:
+    """
+    Verify the files of a resource against the manifest.
+
+    :param artifact_dir: The artifact directory.
+    :param resource: The path of the resource relative to the artifact directory.
+    :param manifest: The checksums of the files of the artifact directory.
+    :raise ProvisioningError: A file is missing, unlisted or corrupted.
+    :return: The absolute path of the resource.
+    """
+    path = os.path.join(artifact_dir, resource)
+    prefix = resource.rstrip("/") + "/"
+    listed = {name for name in manifest if name == resource or name.startswith(prefix)}
+    if not listed:
+        raise ProvisioningError(f"{resource} is not listed in the manifest of {artifact_dir}")
+    if not os.path.exists(path):
+        raise ProvisioningError(f"{resource} is missing from {artifact_dir}")
+    found = set(list_files(artifact_dir, resource))
+    if found - listed:
+        raise ProvisioningError(f"Unlisted files in {resource}: {sorted(found - listed)}")
+    for name in sorted(listed):
+        if name not in found:
+            raise ProvisioningError(f"{name} is missing from {artifact_dir}")
+        if sha256sum(os.path.join(artifact_dir, name)) != manifest[name]:
+            raise ProvisioningError(f"Checksum mismatch for {name} in {artifact_dir}")
+    return os.path.abspath(path)
+
+
+def resolve(name: str) -> Optional[str]:
+    """
+    Get the path of a resource in the artifact directory, verifying it the
+    first time.
+
+    :param name: The resource, one of RESOURCES.
+    :raise ProvisioningError: The resource is missing or corrupted.
+    :return: The absolute path of the resource, None without artifact directory.
+    """
+    artifact_dir = get_artifact_dir()
+    if artifact_dir is None:
+        return None
+    if name not in _resolved:
+        with _lock:
+            if name not in _resolved:
+                resource = config.global_args["provisioning"][name]
+                _resolved[name] = verify(artifact_dir, resource, load_manifest(artifact_dir))
+                logging.info("Provisioned %s from %s", name, _resolved[name])
+    return _resolved[name]
+
+
+def get_nltk_data_path() -> Optional[str]:
+    """
+    Get the NLTK data directory of the artifact directory, None without one.
+    """
+    return resolve("nltk_data")
+
+
+def get_model_path() -> str:
+    """
+    Get the directory of the heading analysis model, or its name on the
+    Hugging Face hub without artifact directory.
+    """
+    return resolve("model") or config.global_args["provisioning"]["model_name"]
+
+
+def get_chromedriver_path() -> str:
+    """
+    Get the path of the chromedriver executable, installed by
+    webdriver-manager once per process without artifact directory.
+    """
+    path = resolve("chromedriver")
+    if path is not None:
+        return path
+    if "chromedriver" not in _resolved:
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        with _lock:
+            if "chromedriver" not in _resolved:
+                _resolved["chromedriver"] = ChromeDriverManager().install()
+    return _resolved["chromedriver"]
+
+
+def clear():
+    """
+    Forget the resolved resources, e.g. after changing the configuration.
+    """
+    with _lock:
+        _resolved.clear()
+
+
+def write_manifest(artifact_dir: str) -> Dict[str, str]:
+    """
+    Write the manifest of the files of the artifact directory.
+    """
+    manifest = {name: sha256sum(os.path.join(artifact_dir, name)) for name in list_files(artifact_dir)}
+    with open(os.path.join(artifact_dir, MANIFEST), "w", encoding="utf-8") as manifest_file:
+        json.dump({"files": manifest}, manifest_file, indent=2, sort_keys=True)
+    return manifest
+
+
+def build(artifact_dir: str):
+    """
+    Download the resources into an artifact directory and write its manifest,
+    on a machine with network access.
+    """
+    import nltk
+    from transformers import RobertaTokenizer, RobertaForSequenceClassification
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    from crest.utils import startup_util
+
+    params = config.global_args["provisioning"]
+    os.makedirs(artifact_dir, exist_ok=True)
+    for name in startup_util.NLTK_DATA:
+        nltk.download(name, download_dir=os.path.join(artifact_dir, params["nltk_data"]))
+    model_dir = os.path.join(artifact_dir, params["model"])
+    RobertaTokenizer.from_pretrained(params["model_name"]).save_pretrained(model_dir)
+    RobertaForSequenceClassification.from_pretrained(params["model_name"]).save_pretrained(model_dir)
+    chromedriver = os.path.join(artifact_dir, params["chromedriver"])
+    os.makedirs(os.path.dirname(chromedriver), exist_ok=True)
+    shutil.copy2(ChromeDriverManager().install(), chromedriver)
+    write_manifest(artifact_dir)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m crest.utils.provisioning",
+        description="Build or verify an artifact directory for offline deployments.",
+    )
+    parser.add_argument("command", choices=("build", "verify"))
+    parser.add_argument("artifact_dir")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(message)s")
+    if args.command == "build":
+        build(args.artifact_dir)
+    try:
+        manifest = load_manifest(args.artifact_dir)
+        for name in RESOURCES:
+            verify(args.artifact_dir, config.global_args["provisioning"][name], manifest)
+    except ProvisioningError as e:
+        logging.error("%s", e)
+        return 1
+    logging.info("%s is complete", args.artifact_dir)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
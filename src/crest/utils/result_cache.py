@@ -0,0 +1,166 @@
+"""
+Module providing the cache of check results: a small in-memory LRU tier in
+front of a larger on-disk SQLite tier, both with a time to live.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import collections
+import hashlib
+import json
+import os.path
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, OrderedDict, Tuple
+
+from crest import config
+
+# A cached JSON response, its HTTP status code and the time it was stored.
+Entry = Tuple[Dict[str, Any], int, float]
+# The serialized form of an Entry, as stored.
+_Stored = Tuple[str, int, float]
+
+
+def fingerprint(document: bytes) -> str:
+    """
+    Get the fingerprint of a document.
+    """
+    return hashlib.sha256(document).hexdigest()
+
+
+def make_key(*parts: Any) -> str:
+    """
+    Make a cache key from JSON serializable parts.
+    """
+    return hashlib.sha256(
+        json.dumps(parts, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+class ResultCache:
+    """
+    Two-tier cache of check results.
+
+    Entries expire `ttl` seconds after being stored. The in-memory tier keeps
+    the `memory_entries` most recently used entries, and the SQLite tier, if a
+    path is given, the `disk_entries` most recently used ones. Entries read
+    from disk are promoted to memory.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        memory_entries: int,
+        disk_entries: int = 0,
+        path: Optional[str] = None,
+    ):
+        self._ttl = ttl
+        self._memory_entries = memory_entries
+        self._disk_entries = disk_entries
+        self._memory: OrderedDict[str, _Stored] = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            with self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS results ("
+                    "key TEXT PRIMARY KEY, response TEXT, status_code INTEGER, "
+                    "stored REAL, accessed REAL)"
+                )
+
+    def get(self, key: str) -> Optional[Entry]:
+        """
+        Get an entry, None if it is missing or expired. Each call returns a new
+        copy of the response.
+        """
+        now = time.time()
+        with self._lock:
+            stored = self._memory.get(key)
+            if stored is not None:
+                if stored[2] + self._ttl > now:
+                    self._memory.move_to_end(key)
+                    return json.loads(stored[0]), stored[1], stored[2]
+                del self._memory[key]
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT response, status_code, stored FROM results WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None or row[2] + self._ttl <= now:
+                return None
+            with self._db:
+                self._db.execute(
+                    "UPDATE results SET accessed = ? WHERE key = ?", (now, key)
+                )
+            self._store_in_memory(key, row)
+            return json.loads(row[0]), row[1], row[2]
+
+    def set(self, key: str, response: Dict[str, Any], status_code: int):
+        """
+        Store an entry in both tiers.
+        """
+        now = time.time()
+        stored = json.dumps(response), status_code, now
+        with self._lock:
+            self._store_in_memory(key, stored)
+            if self._db is None:
+                return
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                    (key,) + stored + (now,),
+                )
+                self._db.execute(
+                    "DELETE FROM results WHERE stored <= ?", (now - self._ttl,)
+                )
+                self._db.execute(
+                    "DELETE FROM results WHERE key NOT IN "
+                    "(SELECT key FROM results ORDER BY accessed DESC LIMIT ?)",
+                    (self._disk_entries,),
+                )
+
+    def clear(self):
+        """
+        Drop all the entries.
+        """
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                with self._db:
+                    self._db.execute("DELETE FROM results")
+
+    def _store_in_memory(self, key: str, stored: _Stored):
+        self._memory[key] = tuple(stored)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_entries:
+            self._memory.popitem(last=False)
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[ResultCache]:
+    """
+    Get the process-wide ResultCache, creating it from the "result_cache" entry
+    of the configuration on first use.
+
+    :return: The shared ResultCache instance, None if caching is disabled.
+    """
+    global _cache  # pylint: disable=global-statement
+    params = config.global_args["result_cache"]
+    if not params["enabled"]:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(
+                ttl=params["ttl"],
+                memory_entries=params["memory_entries"],
+                disk_entries=params["disk_entries"],
+                path=params["path"],
+            )
+        return _cache
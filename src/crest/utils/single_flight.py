@@ -0,0 +1,72 @@
+"""
+Module providing the coalescing of identical concurrent calls.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Call:
+    """
+    A call in flight, and the callers waiting for its outcome.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Runs a single call at a time per key: callers asking for a key while a
+    call for it is in flight wait for that call and share its outcome, instead
+    of running their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool, int]:
+        """
+        Call a function, unless a call for the same key is already in flight.
+
+        :param key: The key identifying identical calls.
+        :param fn: The function to call.
+        :return: The result of the call, whether it was shared with another
+            caller that ran it, and the number of callers that waited for it
+            on top of the one that ran it.
+        :raise: The exception raised by the call, to every caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:  # pylint: disable=broad-except
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result, not leader, call.waiters
+
+    def in_flight(self) -> int:
+        """
+        Get the number of calls in flight.
+        """
+        with self._lock:
+            return len(self._calls)
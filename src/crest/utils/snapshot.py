@@ -0,0 +1,281 @@
+"""
+Module capturing snapshots of a page, for offline analysis in Python.
+
+A snapshot holds the DOM tree of the top document, the layout box and a chosen
+set of computed style properties of every rendered node. It is captured with a
+single DOMSnapshot.captureSnapshot DevTools command, instead of one WebDriver
+round trip per element and property, and kept in the compact form returned by
+Chrome: integer node indices, parallel arrays, and all the strings in a single
+table.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+from array import array
+import logging
+import re
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from lxml import etree
+from selenium.webdriver.remote import webdriver
+
+ELEMENT_NODE = 1
+TEXT_NODE = 3
+
+# Computed style properties captured by default: the ones used by the checks
+# running on snapshots.
+DEFAULT_STYLES: Tuple[str, ...] = (
+    "display",
+    "visibility",
+    "opacity",
+    "cursor",
+    "background-color",
+    "text-decoration-color",
+    "box-shadow",
+    "outline-color",
+    "outline-style",
+    "outline-width",
+    "border-top-color",
+    "border-top-style",
+    "border-top-width",
+    "border-right-color",
+    "border-right-style",
+    "border-right-width",
+    "border-bottom-color",
+    "border-bottom-style",
+    "border-bottom-width",
+    "border-left-color",
+    "border-left-style",
+    "border-left-width",
+)
+
+_INVALID_NAME_CHARS_RE = re.compile(r"[^\w.-]")
+
+
+class DomSnapshot:
+    """
+    Snapshot of the DOM and computed styles of the top document of a page.
+
+    Nodes are identified by their index, in document order, and element
+    properties are looked up in the string table only on access.
+    """
+
+    def __init__(self, result: Dict[str, Any], styles: Sequence[str]):
+        """
+        :param result: The result of the DOMSnapshot.captureSnapshot command.
+        :param styles: The computed style properties requested in the command.
+        """
+        self._strings: List[str] = result["strings"]
+        self._styles = {name: i for i, name in enumerate(styles)}
+        document = result["documents"][0]
+        nodes = document["nodes"]
+        layout = document["layout"]
+        self.url = self._string(document.get("documentURL", -1)) or ""
+        self._parents = array("i", nodes["parentIndex"])
+        self._types = array("i", nodes["nodeType"])
+        self._names = array("i", nodes["nodeName"])
+        self._values = array("i", nodes.get("nodeValue", [-1] * len(self._types)))
+        self._attributes = [array("i", a) for a in nodes.get("attributes", [])]
+        self._pseudo = set(nodes.get("pseudoType", {}).get("index", ()))
+        # Index of the layout object of each node, -1 for nodes not rendered.
+        self._layout = array("i", [-1] * len(self._types))
+        for layout_index, node_index in enumerate(layout["nodeIndex"]):
+            self._layout[node_index] = layout_index
+        self._layout_styles = [array("i", s) for s in layout["styles"]]
+        self._bounds = array("d", [v for b in layout["bounds"] for v in b])
+        self._tree: Optional[etree._Element] = None
+        self._elements: Dict[etree._Element, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._types)
+
+    def _string(self, index: int) -> Optional[str]:
+        return self._strings[index] if index >= 0 else None
+
+    def parent(self, node: int) -> int:
+        """
+        Get the index of the parent of a node, -1 for the document.
+        """
+        return self._parents[node]
+
+    def is_element(self, node: int) -> bool:
+        return self._types[node] == ELEMENT_NODE and node not in self._pseudo
+
+    def node_name(self, node: int) -> str:
+        """
+        Get the lowercase name of a node, e.g. "div" or "#text".
+        """
+        return self._strings[self._names[node]].lower()
+
+    def elements(self) -> Iterator[int]:
+        """
+        Iterate over the indices of the elements, in document order.
+        """
+        return (i for i in range(len(self)) if self.is_element(i))
+
+    def attributes(self, node: int) -> Dict[str, str]:
+        """
+        Get the attributes of an element.
+        """
+        if node >= len(self._attributes):
+            return {}
+        flat = self._attributes[node]
+        return {
+            self._strings[flat[i]]: self._strings[flat[i + 1]]
+            for i in range(0, len(flat), 2)
+        }
+
+    def attribute(self, node: int, name: str) -> Optional[str]:
+        """
+        Get the value of an attribute of an element, None if it is not set.
+        """
+        return self.attributes(node).get(name)
+
+    def is_rendered(self, node: int) -> bool:
+        """
+        Whether a node has a layout box, i.e. it is not hidden by
+        `display: none` on it or an ancestor.
+        """
+        return self._layout[node] >= 0
+
+    def style(self, node: int, name: str) -> Optional[str]:
+        """
+        Get a computed style property of a node, None if the node is not
+        rendered.
+
+        :raise KeyError: If the property was not captured.
+        """
+        layout_index = self._layout[node]
+        if layout_index < 0:
+            return None
+        styles = self._layout_styles[layout_index]
+        return self._string(styles[self._styles[name]]) if styles else None
+
+    def styles(self, node: int) -> Dict[str, str]:
+        """
+        Get all the captured computed style properties of a node, an empty dict
+        if the node is not rendered.
+        """
+        layout_index = self._layout[node]
+        if layout_index < 0 or not self._layout_styles[layout_index]:
+            return {}
+        styles = self._layout_styles[layout_index]
+        return {name: self._strings[styles[i]] for name, i in self._styles.items()}
+
+    def bounds(self, node: int) -> Optional[Tuple[float, float, float, float]]:
+        """
+        Get the layout box of a node, as (x, y, width, height), None if the node
+        is not rendered.
+        """
+        layout_index = self._layout[node]
+        if layout_index < 0:
+            return None
+        return tuple(self._bounds[4 * layout_index:4 * layout_index + 4])
+
+    def is_visible(self, node: int) -> bool:
+        """
+        Whether an element is visible: rendered, visibility set to visible and
+        opacity of at least 0.1.
+
+        Unlike the isVisible helper of the media check, which only reads the
+        computed styles of the element itself, elements without layout box,
+        e.g. in an element with `display: none` or with `display: contents`,
+        are not visible.
+        """
+        if not self.is_rendered(node):
+            return False
+        opacity = self.style(node, "opacity")
+        return self.style(node, "visibility") == "visible" and (
+            opacity is None or float(opacity) >= 0.1
+        )
+
+    @property
+    def tree(self) -> etree._Element:
+        """
+        The element tree of the document, as an lxml tree with the same
+        structure as the live DOM, so that it can be queried with XPath or CSS
+        selectors and locators computed on it match the ones computed in the
+        page. Shadow roots, template contents and pseudo-elements are left out,
+        as they are in the live DOM.
+        """
+        if self._tree is None:
+            self._tree = self._build_tree()
+        return self._tree
+
+    def index(self, element: etree._Element) -> int:
+        """
+        Get the index of the node of an element of `tree`.
+        """
+        return self._elements[element]
+
+    def find(self, xpath: str) -> Optional[int]:
+        """
+        Get the index of the element at an absolute xpath, as computed by the
+        absoluteXPath helper, None if there is none.
+        """
+        found = self.tree.getroottree().xpath(xpath)
+        if not found or not isinstance(found[0], etree._Element):
+            return None
+        return self._elements.get(found[0])
+
+    def _build_tree(self) -> etree._Element:
+        """
+        Build the lxml tree of the elements and text of the document.
+        """
+        converted: Dict[int, etree._Element] = {}
+        root = None
+        for node in range(len(self)):
+            parent = converted.get(self._parents[node])
+            if self._types[node] == TEXT_NODE and parent is not None:
+                text = self._string(self._values[node]) or ""
+                if len(parent):
+                    parent[-1].tail = (parent[-1].tail or "") + text
+                else:
+                    parent.text = (parent.text or "") + text
+                continue
+            if not self.is_element(node) or (parent is None and root is not None):
+                continue
+            element = self._make_element(node)
+            if parent is None:
+                root = element
+            else:
+                parent.append(element)
+            converted[node] = element
+            self._elements[element] = node
+        if root is None:
+            root = etree.Element("html")
+        return root
+
+    def _make_element(self, node: int) -> etree._Element:
+        """
+        Create the lxml element of a DOM element, replacing the characters of
+        names that are valid in HTML but not in XML.
+        """
+        name = self.node_name(node)
+        try:
+            element = etree.Element(name)
+        except ValueError:
+            element = etree.Element(_INVALID_NAME_CHARS_RE.sub("_", name))
+        for key, value in self.attributes(node).items():
+            try:
+                element.set(key, value)
+            except ValueError:
+                logging.getLogger(__name__).debug("Skipping attribute %s", key)
+        return element
+
+
+def capture(
+    driver: webdriver.WebDriver, styles: Sequence[str] = DEFAULT_STYLES
+) -> DomSnapshot:
+    """
+    Capture a snapshot of the page shown by a WebDriver.
+
+    :param driver: The Chrome WebDriver showing the page.
+    :param styles: The computed style properties to capture.
+    :return: The snapshot.
+    """
+    result = driver.execute_cdp_cmd(
+        "DOMSnapshot.captureSnapshot",
+        {"computedStyles": list(styles), "includeDOMRects": False},
+    )
+    return DomSnapshot(result, styles)
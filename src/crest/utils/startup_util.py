@@ -1,16 +1,125 @@
-from transformers import RobertaTokenizer, RobertaForSequenceClassification
-import nltk
+"""
+Loading of the heading analysis model and NLTK corpora, on the first request
+of a check needing them or in an optional warm-up phase, and timing report of
+the start-up phases.
+"""
+import contextlib
+import logging
+import threading
+import time
+
 from crest.config import *
+from crest.utils import provisioning
+
+NLTK_DATA = {'stopwords': 'corpora/stopwords', 'punkt': 'tokenizers/punkt'}
+
+# Duration of the start-up phases in seconds, by name, in the order they ran.
+startup_timings = {}
+_started = time.monotonic()
+_lock = threading.Lock()
+_nltk_loaded = False
+
+
+@contextlib.contextmanager
+def timed(phase):
+    """
+    Record the duration of a start-up phase.
+    """
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        startup_timings[phase] = time.monotonic() - start
+
+
+def load_nltk_data():
+    """
+    Download the NLTK corpora used by the checks, unless already available or
+    provisioned in the artifact directory.
+    """
+    global _nltk_loaded
+    if _nltk_loaded:
+        return
+    import nltk
+
+    with _lock:
+        if _nltk_loaded:
+            return
+        data_path = provisioning.get_nltk_data_path()
+        if data_path is not None and data_path not in nltk.data.path:
+            nltk.data.path.insert(0, data_path)
+        for name, path in NLTK_DATA.items():
+            try:
+                nltk.data.find(path)
+            except LookupError:
+                if provisioning.is_offline():
+                    raise provisioning.ProvisioningError(f"NLTK {name} data is not provisioned")
+                nltk.download(name)
+        _nltk_loaded = True
 
 
 def load_transformer_model():
-    roberta_tokenizer = RobertaTokenizer.from_pretrained('gargam/roberta-base-crest')
-    model = RobertaForSequenceClassification.from_pretrained('gargam/roberta-base-crest')
+    from transformers import RobertaTokenizer, RobertaForSequenceClassification
+
+    path = provisioning.get_model_path()
+    offline = provisioning.is_offline()
+    roberta_tokenizer = RobertaTokenizer.from_pretrained(path, local_files_only=offline)
+    model = RobertaForSequenceClassification.from_pretrained(path, local_files_only=offline)
     return roberta_tokenizer, model
 
+
+def get_transformer_model():
+    """
+    Get the tokenizer and model of the heading analysis, loading them on first
+    use.
+
+    :return: The tokenizer and the model.
+    """
+    params = global_args['model_params']
+    if 'transfomer_model' not in params:
+        with _lock:
+            if 'transfomer_model' not in params:
+                roberta_tokenizer, transfomer_model = load_transformer_model()
+                params['tokenizer'] = roberta_tokenizer
+                params['transfomer_model'] = transfomer_model
+    return params['tokenizer'], params['transfomer_model']
+
+
 def crest_init():
-    nltk.download('stopwords')
-    nltk.download('punkt')
-    roberta_tokenizer, transfomer_model = load_transformer_model()
-    global_args['model_params']['tokenizer'] =roberta_tokenizer
-    global_args['model_params']['transfomer_model'] =transfomer_model
+    """
+    Warm up: load the NLTK corpora and the heading analysis model ahead of the
+    first request. The model is loaded once per process, or once in the master
+    process of the preforked server and inherited by its workers.
+    """
+    if provisioning.is_offline():
+        with timed('provisioning'):
+            for name in provisioning.RESOURCES:
+                provisioning.resolve(name)
+    with timed('nltk'):
+        load_nltk_data()
+    with timed('model'):
+        get_transformer_model()
+
+
+def reset():
+    """
+    Restart the start-up timing, e.g. in a forked worker process.
+    """
+    global _started
+    _started = time.monotonic()
+    startup_timings.clear()
+
+
+def log_startup_report():
+    """
+    Log the duration of the start-up phases and the total start-up time, since
+    this module was imported or reset.
+
+    :return: The duration of the phases and the total in seconds, by name.
+    """
+    startup_timings['total'] = time.monotonic() - _started
+    logging.info(
+        "Start-up timings: %s",
+        ", ".join("%s %.2fs" % (phase, seconds) for phase, seconds in startup_timings.items()),
+    )
+    return dict(startup_timings)
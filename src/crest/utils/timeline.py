@@ -0,0 +1,143 @@
+"""
+Module recording the timeline of a request: the tree of the phases of its
+checks, with their duration and the number of WebDriver round trips made
+during each of them.
+
+A timeline is recorded only when a request opts in, and the current span is
+kept in a context variable: threads working on behalf of the request must run
+in a copy of its context, see utils.propagate_context(), for their spans to
+join the same tree. Outside of a recorded request, spans cost a context
+variable lookup.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class Span:
+    """
+    A phase of a request, and the phases nested in it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        # WebDriver round trips made while this span was the innermost one.
+        self.round_trips = 0
+        self.children: List["Span"] = []
+
+    def duration(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return end - self.start
+
+
+class Timeline:
+    """
+    The tree of spans of a request, under a root span.
+    """
+
+    def __init__(self, name: str):
+        self.root = Span(name)
+        # Spans are added from the threads of the request.
+        self._lock = threading.Lock()
+
+    def add(self, parent: Span, name: str) -> Span:
+        span = Span(name)
+        with self._lock:
+            parent.children.append(span)
+        return span
+
+    def count_round_trip(self, span: Span):
+        with self._lock:
+            span.round_trips += 1
+
+    def asdict(self) -> Dict[str, Any]:
+        """
+        Convert the timeline to nested dicts, suitable for serialization as
+        JSON. Durations and start offsets from the root are in milliseconds,
+        and round trips include those of the nested spans. Sibling spans of the
+        same name, e.g. the steps of a loop, are merged into one, with the
+        number of times it ran.
+        """
+        with self._lock:
+            return self._asdict([self.root], self.root.start)
+
+    def _asdict(self, spans: List[Span], origin: float) -> Dict[str, Any]:
+        first = min(spans, key=lambda span: span.start)
+        children: Dict[str, List[Span]] = {}
+        for span in sorted((c for s in spans for c in s.children), key=lambda c: c.start):
+            children.setdefault(span.name, []).append(span)
+        nested = [self._asdict(group, origin) for group in children.values()]
+        result = {
+            "name": first.name,
+            "start": round((first.start - origin) * 1000, 1),
+            "duration": round(sum(span.duration() for span in spans) * 1000, 1),
+            "round_trips": sum(span.round_trips for span in spans)
+            + sum(child["round_trips"] for child in nested),
+        }
+        if len(spans) > 1:
+            result["count"] = len(spans)
+        if nested:
+            result["children"] = nested
+        return result
+
+
+# The timeline of the current request and its innermost open span.
+_current: "contextvars.ContextVar[Optional[Tuple[Timeline, Span]]]" = contextvars.ContextVar(
+    "timeline", default=None
+)
+
+
+def is_recording() -> bool:
+    return _current.get() is not None
+
+
+@contextlib.contextmanager
+def record(name: str) -> Iterator[Timeline]:
+    """
+    Context manager recording the timeline of its body, under a root span.
+    """
+    timeline = Timeline(name)
+    token = _current.set((timeline, timeline.root))
+    try:
+        yield timeline
+    finally:
+        timeline.root.end = time.perf_counter()
+        _current.reset(token)
+
+
+@contextlib.contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Context manager recording its body as a span nested in the current one,
+    if a timeline is being recorded.
+    """
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    timeline, parent = current
+    child = timeline.add(parent, name)
+    token = _current.set((timeline, child))
+    try:
+        yield
+    finally:
+        child.end = time.perf_counter()
+        _current.reset(token)
+
+
+def count_round_trip():
+    """
+    Count a WebDriver round trip in the current span, if a timeline is being
+    recorded.
+    """
+    current = _current.get()
+    if current is not None:
+        timeline, innermost = current
+        timeline.count_round_trip(innermost)
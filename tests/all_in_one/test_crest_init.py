@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the merging and streaming of the all-in-one check results.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import time
+import unittest
+
+from crest.all_in_one import crest_init
+
+
+def make_response(item_id, count, **statistics):
+    return (
+        {
+            "categories": {
+                "error": {"description": "Errors", "count": count, "items": {item_id: {"id": item_id}}}
+            },
+            "statistics": dict(allitemcount=count, totalelements=2 * count, **statistics),
+            "status": {"httpstatuscode": 200, "success": "True"},
+        },
+        200,
+    )
+
+
+RESPONSES = {
+    "kfi": make_response("cr_focus_missing", 1),
+    "ht": make_response("cr_heading_missing", 2),
+    "ct": make_response("cr_captions_missing", 3, totalvideos=4, totalaudios=1),
+    "cc": make_response("cc_alert_in_alert", 4),
+}
+
+
+class FakeAllFuncCheck(crest_init.AllFuncCheck):
+    """
+    AllFuncCheck yielding canned check results.
+    """
+
+    def __init__(self, responses):
+        super().__init__("http://example.com")
+        self.responses = responses
+
+    def iter_results(self):
+        yield from self.responses.items()
+
+
+class TestAllFuncCheck(unittest.TestCase):
+    """
+    Unit tests for the AllFuncCheck class and the merging of responses.
+    """
+
+    def test_merge_responses(self):
+        """
+        Test that the responses of the checks are merged.
+        """
+        output, status_code = crest_init.merge_responses(
+            "http://example.com", RESPONSES.values(), time.time()
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(output["categories"]["error"]["count"], 10)
+        self.assertEqual(len(output["categories"]["error"]["items"]), 4)
+        self.assertNotIn("alert", output["categories"])
+        statistics = output["statistics"]
+        del statistics["time"]
+        self.assertEqual(
+            statistics,
+            {
+                "allitemcount": 10,
+                "totalvideos": 4,
+                "totalaudios": 1,
+                "pageurl": "http://example.com",
+                "totalelements": 20,
+            },
+        )
+
+    def test_stream(self):
+        """
+        Test that each check is streamed, followed by the merged response.
+        """
+        events = list(FakeAllFuncCheck(RESPONSES).stream())
+        self.assertEqual([name for name, _, _ in events], list(RESPONSES) + ["all"])
+        self.assertEqual(events[0][1:], RESPONSES["kfi"])
+        merged = FakeAllFuncCheck(RESPONSES).main()
+        del events[-1][1]["statistics"]["time"], merged[0]["statistics"]["time"]
+        self.assertEqual(events[-1][1:], merged)
+
+    def test_stream_failure(self):
+        """
+        Test that a failed check is streamed, and fails the merged response.
+        """
+        responses = dict(RESPONSES, ht=crest_init.failed_response(ValueError()))
+        events = list(FakeAllFuncCheck(responses).stream())
+        self.assertEqual(events[1], ("ht",) + responses["ht"])
+        self.assertEqual(events[-1][0], "all")
+        self.assertEqual(events[-1][2], 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
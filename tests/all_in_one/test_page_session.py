@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Unit tests for page sessions and their dependency graph runner.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+from crest.all_in_one import page_session
+from crest.utils import driver_pool
+
+
+class TestIterGraph(unittest.TestCase):
+    """
+    Unit tests for the iter_graph function.
+    """
+
+    def test_dependencies(self):
+        """
+        Test that tasks start only after their dependencies are complete.
+        """
+        finished = []
+        lock = threading.Lock()
+
+        def task(name):
+            def run():
+                with lock:
+                    finished.append(name)
+                return name
+
+            return run
+
+        tasks = {
+            "page": page_session.Task(task("page")),
+            "dom": page_session.Task(task("dom"), ("page",)),
+            "check1": page_session.Task(task("check1"), ("page",)),
+            "check2": page_session.Task(task("check2"), ("dom", "check1")),
+        }
+        results = dict(page_session.iter_graph(tasks))
+        self.assertEqual(set(results), set(tasks))
+        self.assertEqual({k: f.result() for k, f in results.items()}, {k: k for k in tasks})
+        self.assertEqual(finished[0], "page")
+        self.assertEqual(finished[-1], "check2")
+
+    def test_failure(self):
+        """
+        Test that a failing task does not prevent its dependents from running.
+        """
+
+        def fail():
+            raise RuntimeError("failed")
+
+        tasks = {
+            "page": page_session.Task(fail),
+            "check": page_session.Task(lambda: "done", ("page",)),
+        }
+        results = dict(page_session.iter_graph(tasks))
+        with self.assertRaises(RuntimeError):
+            results["page"].result()
+        self.assertEqual(results["check"].result(), "done")
+
+    def test_invalid_graph(self):
+        """
+        Test that unknown dependencies and cycles are rejected.
+        """
+        with self.assertRaises(ValueError):
+            list(page_session.iter_graph({"a": page_session.Task(int, ("b",))}))
+        with self.assertRaises(ValueError):
+            list(
+                page_session.iter_graph(
+                    {
+                        "a": page_session.Task(int, ("b",)),
+                        "b": page_session.Task(int, ("a",)),
+                    }
+                )
+            )
+
+
+class FakePool:
+    """
+    Driver pool of mock drivers, with `size` drivers at most.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.in_use = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        driver = self.try_acquire()
+        if driver is None:
+            raise driver_pool.PoolTimeoutError("Pool exhausted")
+        return driver
+
+    def try_acquire(self):
+        with self.lock:
+            if self.in_use >= self.size:
+                return None
+            self.in_use += 1
+        return mock.Mock()
+
+    def release(self, driver):
+        with self.lock:
+            self.in_use -= 1
+
+
+class TestPageSession(unittest.TestCase):
+    """
+    Unit tests for the PageSession class.
+    """
+
+    def run_clones(self, pool, count, duration):
+        # Wall time of count threads holding a cloned tab for duration seconds.
+        with mock.patch.object(driver_pool, "get_pool", return_value=pool):
+            session = page_session.PageSession("http://example.com")
+            session.open()
+            drivers = []
+
+            def check():
+                with session.tab(clone=True) as driver:
+                    drivers.append(driver)
+                    time.sleep(duration)
+
+            threads = [threading.Thread(target=check) for _ in range(count)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            session.close()
+        return elapsed, drivers
+
+    def test_parallel_clones(self):
+        """
+        Test that cloned tabs get browsers of their own and run in parallel.
+        """
+        pool = FakePool(4)
+        elapsed, drivers = self.run_clones(pool, 3, 0.2)
+        self.assertEqual(len(set(map(id, drivers))), 3)
+        self.assertLess(elapsed, 0.4)
+        self.assertEqual(pool.in_use, 0)
+        for driver in drivers:
+            driver.get.assert_called_once_with("http://example.com")
+
+    def test_busy_pool(self):
+        """
+        Test that cloned tabs are opened one at a time in the browser of the
+        session when the pool has no other browser.
+        """
+        pool = FakePool(1)
+        elapsed, drivers = self.run_clones(pool, 2, 0.1)
+        self.assertEqual(len(set(map(id, drivers))), 1)
+        self.assertGreaterEqual(elapsed, 0.2)
+        self.assertEqual(drivers[0].switch_to.new_window.call_count, 2)
+        self.assertEqual(pool.in_use, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
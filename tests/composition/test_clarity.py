@@ -15,6 +15,7 @@ import ddt
 
 from crest.utils import operation
 from crest.composition import clarity
+from crest.composition import clarity_engine
 
 
 @dataclasses.dataclass
@@ -42,17 +43,23 @@ class CaseData:
     items: Sequence[CaseItem]
     __name__: str
     locator: operation.Locator = operation.Locator.UNSPECIFIED
+    engine: clarity_engine.EngineType = clarity_engine.EngineType.BROWSER
 
 
-def _set_locator(args: Tuple[CaseData, operation.Locator]):
+def _set_locator(
+    args: Tuple[CaseData, operation.Locator, clarity_engine.EngineType]
+):
     """
-    Set the locator field in a CaseData object and compute an appropriate test
-    name suffix.
+    Set the locator and engine fields in a copy of a CaseData object and compute
+    an appropriate test name suffix.
     """
-    case_data, locator = args
-    case_data.locator = locator
-    case_data.__name__ = f"{case_data.__name__}_{locator.name.lower()}"
-    return case_data
+    case_data, locator, engine = args
+    name = f"{case_data.__name__}_{locator.name.lower()}"
+    if engine != clarity_engine.EngineType.BROWSER:
+        name = f"{name}_{engine.value}"
+    return dataclasses.replace(
+        case_data, locator=locator, engine=engine, **{"__name__": name}
+    )
 
 
 @ddt.ddt
@@ -197,6 +204,11 @@ class TestClarityComposition(unittest.TestCase):
                     ),
                 ),
                 (operation.Locator.XPATH, operation.Locator.CSS_SELECTOR),
+                (
+                    clarity_engine.EngineType.BROWSER,
+                    clarity_engine.EngineType.STATIC,
+                    clarity_engine.EngineType.SNAPSHOT,
+                ),
             ),
         )
     )
@@ -209,7 +221,9 @@ class TestClarityComposition(unittest.TestCase):
             page.flush()
 
             url = f"file://{page.name}"
-            clarity_composition = clarity.ClarityComposition(url, data.locator.value)
+            clarity_composition = clarity.ClarityComposition(
+                url, data.locator.value, engine=data.engine.value
+            )
             result = clarity_composition.main()
 
             self.assertTrue(result.status.success)
@@ -243,6 +257,25 @@ class TestClarityComposition(unittest.TestCase):
             self.assertEqual(result.statistics.allitemcount, data.allitemcount)
             self.assertEqual(result.statistics.totalelements, data.totalelements)
 
+    def test_static_html_body(self):
+        """
+        Test the static engine on an HTML document provided directly.
+        """
+        clarity_composition = clarity.ClarityComposition(
+            "",
+            operation.Locator.CSS_SELECTOR.value,
+            engine=clarity_engine.EngineType.STATIC.value,
+            html='<div class="alert"><span id="x"><clr-alert></clr-alert></span></div>',
+        )
+        result = clarity_composition.main()
+
+        self.assertTrue(result.status.success)
+        self.assertEqual(result.statistics.totalelements, 2)
+        self.assertEqual(
+            result.categories.error.items["cc_alert_in_alert"].selectors,
+            ["span#x > clr-alert"],
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the compiled index of disallowed Clarity compositions.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import os
+import tempfile
+import unittest
+
+from crest.composition import clarity_components
+from crest.composition import clarity_rules
+
+Components = clarity_components.Components
+
+
+def _id(component: Components) -> int:
+    return clarity_rules.COMPONENT_IDS[component.value]
+
+
+class TestRuleIndex(unittest.TestCase):
+    """
+    Unit tests for the RuleIndex class and its loading functions.
+    """
+
+    def test_default_index(self):
+        """
+        Test a few known rules of the default CSV file.
+        """
+        index = clarity_rules.get_index()
+        rules = index.as_dict()
+        self.assertEqual(len(index.outers), 36)
+        self.assertIn(Components.ALERT.value, rules[Components.ALERT.value])
+        self.assertIn(Components.ACCORDION.value, rules[Components.ALERT.value])
+        self.assertNotIn(Components.ALERT.value, rules[Components.ACCORDION.value])
+        self.assertIn(Components.BUTTON.value, rules[Components.BADGE.value])
+        for outer in index.outers:
+            for inner in index.inners(outer):
+                self.assertTrue(index.disallowed_by[inner] >> outer & 1)
+
+    def test_prune(self):
+        """
+        Test that pruning keeps only the rules between present components.
+        """
+        index = clarity_rules.get_index()
+        alert, accordion = _id(Components.ALERT), _id(Components.ACCORDION)
+        self.assertEqual(index.prune(0), [])
+        self.assertEqual(index.prune(1 << alert), [(alert, [alert])])
+        self.assertEqual(
+            index.prune(1 << alert | 1 << accordion),
+            [(alert, sorted([alert, accordion]))],
+        )
+
+    def test_reload(self):
+        """
+        Test that a modified CSV file is recompiled and a new CSV file can be
+        swapped in.
+        """
+        with tempfile.NamedTemporaryFile(mode="wt", suffix=".csv", delete=False) as csv:
+            csv.write("Internal Component,Alert,Badge\nAlert,n,y\nBadge,y,y\n")
+        try:
+            index = clarity_rules.load_index(csv.name)
+            self.assertIs(clarity_rules.get_index(), index)
+            self.assertEqual(
+                index.as_dict(),
+                {
+                    Components.ALERT.value: {Components.ALERT.value},
+                    Components.BADGE.value: set(),
+                },
+            )
+            with open(csv.name, "wt", encoding="ascii") as update:
+                update.write("Internal Component,Alert,Badge\nAlert,y,y\nBadge,y,n\n")
+            os.utime(csv.name, (index.mtime + 10, index.mtime + 10))
+            reloaded = clarity_rules.get_index()
+            self.assertIsNot(reloaded, index)
+            self.assertEqual(
+                reloaded.as_dict(),
+                {
+                    Components.ALERT.value: set(),
+                    Components.BADGE.value: {Components.BADGE.value},
+                },
+            )
+        finally:
+            clarity_rules.load_index()
+            os.unlink(csv.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
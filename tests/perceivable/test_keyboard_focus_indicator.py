@@ -6,11 +6,73 @@ Functional tests for perceivable keyboard focus indicator checks.
 # SPDX-License-Identifier: MIT
 
 
+import json
+import os
 import os.path
+import tempfile
 import unittest
+from unittest import mock
+
+import lxml.html
 
 
 from crest.perceivable import keyboard_focus_indicator
+from crest.utils import contrast
+
+
+TEST_PAGE_PATH = os.path.abspath(
+    os.path.join(
+        os.path.dirname(__file__),
+        "..",
+        "..",
+        "src",
+        "crest",
+        "templates",
+        "testMePage.html",
+    )
+)
+
+# Page with focusable elements other than links and form controls, with and
+# without focus indicator.
+FOCUSABLE_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<style>
+  :focus { outline: none; }
+  .ring:focus { outline: 2px solid black; }
+</style>
+</head>
+<body>
+  <div contenteditable="true">Editable without focus indicator</div>
+  <div contenteditable="true" class="ring">Editable</div>
+  <div contenteditable="false">Not editable</div>
+  <x-card tabindex="0">Custom element without focus indicator</x-card>
+  <x-card tabindex="0" class="ring">Custom element</x-card>
+  <details><summary class="ring">Summary</summary>Details</details>
+  <span tabindex="-1">Not tabbable</span>
+  <a>Link without href</a>
+  <a href="#top" class="ring">Link</a>
+</body>
+</html>
+"""
+
+# Computed styles of a link without focus indicator, on a white background.
+BASE_STYLES = {
+    "background-color": "rgb(255, 255, 255)",
+    "text-decoration-color": "rgb(0, 0, 238)",
+    "box-shadow": "none",
+    "outline-color": "rgb(0, 0, 238)",
+    "outline-style": "none",
+    "outline-width": "0px",
+}
+for side in ("top", "right", "bottom", "left"):
+    BASE_STYLES.update(
+        {
+            f"border-{side}-color": "rgb(0, 0, 238)",
+            f"border-{side}-style": "none",
+            f"border-{side}-width": "0px",
+        }
+    )
 
 
 class TestFocusIndicator(unittest.TestCase):
@@ -22,18 +84,7 @@ class TestFocusIndicator(unittest.TestCase):
         """
         Test that expected errors are generated when analyzing testMePage.html.
         """
-        test_page_path = os.path.abspath(
-            os.path.join(
-                os.path.dirname(__file__),
-                "..",
-                "..",
-                "src",
-                "crest",
-                "templates",
-                "testMePage.html",
-            )
-        )
-        url = f"file://{test_page_path}"
+        url = f"file://{TEST_PAGE_PATH}"
         focus_indicator = keyboard_focus_indicator.FocusIndicator(url)
         result, statuscode = focus_indicator.main()
         self.assertEqual(statuscode, 200)
@@ -81,6 +132,220 @@ class TestFocusIndicator(unittest.TestCase):
             },
         )
 
+    def test_traversal_modes(self):
+        """
+        Test that the batch traversal in the page and the forced pseudo-classes
+        check the same elements and find the same errors as the traversal with
+        the keyboard, on testMePage.html and on a page with focusable elements
+        other than links and form controls.
+        """
+        with tempfile.NamedTemporaryFile("w", suffix=".html", delete=False) as page:
+            page.write(FOCUSABLE_PAGE)
+        self.addCleanup(os.remove, page.name)
+        for path in (TEST_PAGE_PATH, page.name):
+            results = {}
+            for mode in keyboard_focus_indicator.TRAVERSAL_MODES:
+                focus_indicator = keyboard_focus_indicator.FocusIndicator(f"file://{path}", mode=mode)
+                result, statuscode = focus_indicator.main()
+                self.assertEqual(statuscode, 200)
+                results[mode] = (
+                    result["statistics"]["totalelements"],
+                    focus_indicator.focus_low_elems,
+                    focus_indicator.focus_missing_elems,
+                    result["categories"],
+                )
+            self.assertEqual(results["batch"], results["keyboard"], path)
+            self.assertEqual(results["pseudo"], results["keyboard"], path)
+
+
+class TestStyleRecords(unittest.TestCase):
+    """
+    Unit tests for the compact style records of the focus analysis.
+    """
+
+    def test_compact_styles(self):
+        """
+        Test that colors and widths are parsed, and that records survive a
+        round trip through JSON, as records sent by the page.
+        """
+        record = keyboard_focus_indicator.compact_styles(
+            dict(
+                BASE_STYLES,
+                **{
+                    "box-shadow": "rgba(0, 0, 0, 0.5) 0px 0px 3px 0px, oklch(0.5 0.1 20) 1px 1px",
+                    "outline-width": "1.5px",
+                    "border-top-color": "rgb(1 2 3 / 0)",
+                },
+            )
+        )
+        self.assertEqual(record["background-color"], (255, 255, 255, 255))
+        self.assertEqual(record["border-top-color"], (1, 2, 3, 0))
+        self.assertEqual(record["outline-width"], 1.5)
+        self.assertEqual(record["outline-style"], "none")
+        self.assertEqual(record["box-shadow-colors"], [(0, 0, 0, 128), (148, 74, 75, 255)])
+        self.assertEqual(
+            keyboard_focus_indicator.load_styles(json.loads(json.dumps(record))), record
+        )
+
+    def test_color_visible(self):
+        """
+        Test that colors whose alpha rounds to 0 on 8 bits are transparent, and
+        that colors not parsed are assumed visible.
+        """
+        focus_indicator = object.__new__(keyboard_focus_indicator.FocusIndicator)
+        for color, visible in (
+            ("rgba(0, 0, 0, 0)", False),
+            ("transparent", False),
+            ("rgba(0, 0, 0, 0.001)", False),
+            ("rgb(0 0 0 / 0.1%)", False),
+            ("rgba(0, 0, 0, 0.002)", True),
+            ("rgba(0, 0, 0, 0.5)", True),
+            ("rgb(0, 0, 0)", True),
+            ("currentcolor", True),
+        ):
+            self.assertEqual(
+                focus_indicator.is_color_visible(contrast.parse_color(color)), visible, color
+            )
+        record = keyboard_focus_indicator.compact_styles(
+            dict(
+                BASE_STYLES,
+                **{
+                    "outline-color": "rgba(0, 0, 0, 0.001)",
+                    "outline-style": "solid",
+                    "outline-width": "2px",
+                },
+            )
+        )
+        self.assertEqual(
+            focus_indicator.check_color(record, ["outline-color", "outline-style", "outline-width"]),
+            (False, keyboard_focus_indicator.BLACK),
+        )
+
+    def test_analyse_focus(self):
+        """
+        Test that elements are reported according to the contrast of their
+        focus indicator, and only if their base styles are known.
+        """
+        focus_indicator = object.__new__(keyboard_focus_indicator.FocusIndicator)
+        focus_indicator.total_elems = 0
+        focus_indicator.focus_low_elems = []
+        focus_indicator.focus_missing_elems = []
+        base = keyboard_focus_indicator.compact_styles(BASE_STYLES)
+        focus_indicator.base_css = [base, base, base, None]
+
+        def focused(**styles):
+            styles = {name.replace("_", "-"): value for name, value in styles.items()}
+            record = keyboard_focus_indicator.compact_styles(dict(BASE_STYLES, **styles))
+            return json.loads(json.dumps(record))
+
+        outline = {"outline_style": "solid", "outline_width": "2px"}
+        focus_indicator.analyse_focus(
+            [
+                (0, 0, focused(outline_color="rgb(0, 0, 0)", **outline)),
+                (1, 1, focused(outline_color="rgb(250, 250, 250)", **outline)),
+                (2, 2, focused()),
+                (3, 3, focused()),
+                (-1, 4, focused()),
+                (0, 5, focused(box_shadow="rgb(250, 250, 250) 0px 0px 3px 0px")),
+                (0, 6, focused(box_shadow="rgb(250, 250, 250) 0px 0px 3px, rgb(0, 0, 0) 1px 1px")),
+                (0, 7, focused(background_color="rgb(0, 0, 0)")),
+            ]
+        )
+        self.assertEqual(focus_indicator.focus_low_elems, [1, 5])
+        self.assertEqual(focus_indicator.focus_missing_elems, [2])
+
+    def test_pseudo_state(self):
+        """
+        Test that the focused pseudo-classes are forced on the tabbable targets
+        in focus order, and focus-within on their ancestors, then cleared.
+        """
+        focus_indicator = object.__new__(keyboard_focus_indicator.FocusIndicator)
+        focus_indicator.url = "http://example.com"
+        focus_indicator.total_elems = 0
+        focus_indicator.focus_low_elems = []
+        focus_indicator.focus_missing_elems = []
+        base = keyboard_focus_indicator.compact_styles(BASE_STYLES)
+        focus_indicator.base_css = [base, base, base]
+        focus_indicator.target_keys = [["a", []], ["a", []], ["a", []]]
+        focused = keyboard_focus_indicator.compact_styles(
+            dict(BASE_STYLES, **{"outline-style": "solid", "outline-width": "2px"})
+        )
+        # Targets 10, 11 and 12 among elements 0 to 12, the first one not
+        # tabbable, the last one first in focus order and inside the second.
+        targets = {
+            "banner": False,
+            "count": 3,
+            "keys": [["a", []], ["a", []], ["a", []]],
+            "elements": 13,
+            "tabbable": [2, 1],
+            "ancestors": [[11, 0], [0]],
+        }
+        focus_indicator.driver = mock.Mock()
+        focus_indicator.driver.execute_script.side_effect = lambda script, *args: (
+            targets
+            if script == keyboard_focus_indicator.FOCUS_TARGETS_JS
+            else [{"id": i, "styles": json.loads(json.dumps(focused))} for i in args[0]]
+            if script == keyboard_focus_indicator.FOCUS_TARGET_RECORDS_JS
+            else None
+        )
+        session = mock.MagicMock()
+        session.__enter__.return_value = session
+        session.send.return_value = {"root": {"nodeId": 1}}
+        forced = []
+
+        def send_all(commands):
+            if commands[0][0] == "DOM.querySelectorAll":
+                return [{"nodeIds": [10, 11, 12]}, {"nodeIds": list(range(13))}]
+            forced.extend(
+                (params["nodeId"], params["forcedPseudoClasses"])
+                for method, params in commands
+                if method == "CSS.forcePseudoState"
+            )
+            return [{}] * len(commands)
+
+        session.send_all.side_effect = send_all
+        with mock.patch.object(keyboard_focus_indicator.cdp, "Session", return_value=session):
+            focus_indicator.check_website_with_pseudo_state()
+        classes = keyboard_focus_indicator.FORCED_PSEUDO_CLASSES
+        self.assertEqual(
+            forced,
+            [(11, classes), (0, ["focus-within"]), (12, classes), (11, []), (0, []), (12, [])],
+        )
+        self.assertEqual(focus_indicator.total_elems, 2)
+        self.assertEqual(focus_indicator.focus_low_elems, [])
+        self.assertEqual(focus_indicator.focus_missing_elems, [])
+
+    def test_refresh_base_css(self):
+        """
+        Test that the base styles are captured again when the targets change,
+        even if their number does not, or when forced.
+        """
+        html = lxml.html.fromstring(
+            '<html><body><a href="/1">1</a><div tabindex="0" class="x"></div>'
+            '<a>no href</a></body></html>'
+        )
+        elements = list(html.iter())
+        dom_snapshot = mock.Mock(tree=html)
+        dom_snapshot.index.side_effect = elements.index
+        dom_snapshot.node_name.side_effect = lambda node: elements[node].tag
+        dom_snapshot.attributes.side_effect = lambda node: dict(elements[node].attrib)
+        keys = keyboard_focus_indicator.get_target_keys(dom_snapshot)
+        self.assertEqual(
+            keys,
+            [["a", [["href", "/1"]]], ["div", [["class", "x"], ["tabindex", "0"]]], ["a", []]],
+        )
+        focus_indicator = object.__new__(keyboard_focus_indicator.FocusIndicator)
+        focus_indicator.driver = mock.Mock()
+        focus_indicator.target_keys = keys
+        with mock.patch.object(focus_indicator, "save_complete_base_css") as save:
+            focus_indicator.refresh_base_css(json.loads(json.dumps(keys)))
+            self.assertEqual(save.call_count, 0)
+            focus_indicator.refresh_base_css(keys, force=True)
+            self.assertEqual(save.call_count, 1)
+            swapped = [keys[0], ["div", [["class", "y"], ["tabindex", "0"]]], keys[2]]
+            focus_indicator.refresh_base_css(swapped)
+            self.assertEqual(save.call_count, 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the batch scans.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import gzip
+import os.path
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+from crest import batch
+from crest import checks
+from crest.utils import result_cache
+
+SITEMAP = """<?xml version="1.0" encoding="UTF-8"?>
+<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <url><loc> http://a.com/1 </loc></url>
+  <url><loc>http://a.com/2</loc><lastmod>2023-01-01</lastmod></url>
+</urlset>
+"""
+
+SITEMAP_INDEX = """<?xml version="1.0" encoding="UTF-8"?>
+<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">
+  <sitemap><loc>{}</loc></sitemap>
+  <sitemap><loc>{}</loc></sitemap>
+</sitemapindex>
+"""
+
+
+class TestBatch(unittest.TestCase):
+    """
+    Unit tests for the sitemap parsing and the batch runner.
+    """
+
+    def test_sitemap(self):
+        """
+        Test that sitemaps, gzipped sitemaps and sitemap indexes are parsed.
+        """
+        self.assertEqual(
+            batch.parse_sitemap(SITEMAP.encode()), ["http://a.com/1", "http://a.com/2"]
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            plain = os.path.join(directory, "sitemap.xml")
+            zipped = os.path.join(directory, "sitemap.xml.gz")
+            with open(plain, "w", encoding="utf-8") as sitemap:
+                sitemap.write(SITEMAP.replace("a.com", "b.com"))
+            with open(zipped, "wb") as sitemap:
+                sitemap.write(gzip.compress(SITEMAP.encode()))
+            index = SITEMAP_INDEX.format(f"file://{plain}", f"file://{zipped}")
+            self.assertEqual(
+                batch.parse_sitemap(index.encode(), local=True),
+                ["http://b.com/1", "http://b.com/2", "http://a.com/1", "http://a.com/2"],
+            )
+            self.assertEqual(batch.parse_sitemap(index.encode(), max_depth=0, local=True), [])
+
+    def test_local_sitemap(self):
+        """
+        Test that local sitemaps are only read if allowed, and skipped when
+        listed by a sitemap index.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            plain = os.path.join(directory, "sitemap.xml")
+            with open(plain, "w", encoding="utf-8") as sitemap:
+                sitemap.write(SITEMAP)
+            self.assertEqual(len(batch.load_sitemap(plain, local=True)), 2)
+            for url in (f"file://{plain}", f"FILE://{plain}"):
+                with self.assertRaises(batch.UnsafeSitemapError):
+                    batch.load_sitemap(url)
+            # A path is taken for an http URL without host.
+            with self.assertRaises(requests.exceptions.InvalidURL):
+                batch.load_sitemap(plain)
+            index = SITEMAP_INDEX.format(f"file://{plain}", f"FILE://{plain}")
+            with self.assertLogs(level="WARNING"):
+                self.assertEqual(batch.parse_sitemap(index.encode()), [])
+
+    def test_origin(self):
+        """
+        Test the origin of URLs.
+        """
+        self.assertEqual(batch.get_origin("HTTPS://A.com:8443/x?y"), "https://a.com:8443")
+        self.assertEqual(batch.get_origin("a.com/x"), "http://a.com")
+
+    def test_iter_batch(self):
+        """
+        Test that every page is scanned once, within the concurrency limits.
+        """
+        lock = threading.Lock()
+        active = {}
+        peak = {"all": 0}
+        scanned = []
+
+        def check(data):
+            origin = batch.get_origin(data["url"])
+            with lock:
+                scanned.append(data["url"])
+                active[origin] = active.get(origin, 0) + 1
+                peak[origin] = max(peak.get(origin, 0), active[origin])
+                peak["all"] = max(peak["all"], sum(active.values()))
+            time.sleep(0.02)
+            with lock:
+                active[origin] -= 1
+            return {"reporttype": data["reporttype"]}, 200
+
+        urls = [f"http://a.com/{i}" for i in range(6)] + [f"http://b.com/{i}" for i in range(3)]
+        with mock.patch.dict(checks.CHECKS, {"test": check}), mock.patch.object(
+            result_cache, "get_cache", return_value=None
+        ):
+            results = list(
+                batch.iter_batch(
+                    urls + urls[:2], "test", {"reporttype": 4}, 3, 2
+                )
+            )
+        self.assertEqual(sorted(scanned), sorted(urls))
+        self.assertEqual(sorted(url for url, _, _ in results), sorted(urls))
+        for _, response, status_code in results:
+            self.assertEqual(status_code, 200)
+            self.assertEqual(response["reporttype"], 4)
+        self.assertEqual(peak["all"], 3)
+        self.assertEqual(peak["http://a.com"], 2)
+        self.assertLessEqual(peak["http://b.com"], 2)
+        with self.assertRaises(KeyError):
+            next(batch.iter_batch(urls, "unknown"))
+
+
+if __name__ == "__main__":
+    unittest.main()
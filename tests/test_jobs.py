@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the asynchronous scan jobs.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import http.server
+import json
+import threading
+import time
+import unittest
+
+from crest import jobs
+
+
+def wait_finished(job: jobs.Job, timeout: float = 5) -> jobs.Job:
+    """
+    Wait for a job to finish.
+    """
+    deadline = time.time() + timeout
+    while job.finished is None and time.time() < deadline:
+        time.sleep(0.01)
+    return job
+
+
+class TestJobQueue(unittest.TestCase):
+    """
+    Unit tests for the JobQueue class.
+    """
+
+    def test_run(self):
+        """
+        Test that jobs run the check and keep its result.
+        """
+        queue = jobs.JobQueue(
+            workers=2,
+            max_queued=4,
+            retention=60,
+            runner=lambda check, data: ({"check": check, "url": data["url"]}, 200),
+        )
+        job = queue.submit("cc", {"url": "http://example.com"})
+        self.assertIs(queue.get(job.id), job)
+        wait_finished(job)
+        self.assertEqual(job.status, jobs.JobStatus.DONE)
+        self.assertEqual(
+            job.asdict()["result"], {"check": "cc", "url": "http://example.com"}
+        )
+        self.assertEqual(job.asdict()["statuscode"], 200)
+        self.assertIsNone(queue.get("unknown"))
+
+    def test_failure(self):
+        """
+        Test that failed checks and exceptions mark the job as failed.
+        """
+
+        def runner(check, data):
+            if check == "kfi":
+                raise ValueError()
+            return {"status": {"success": "False"}}, 400
+
+        queue = jobs.JobQueue(workers=1, max_queued=4, retention=60, runner=runner)
+        failed = wait_finished(queue.submit("cc", {}))
+        raised = wait_finished(queue.submit("kfi", {}))
+        self.assertEqual(failed.status, jobs.JobStatus.FAILED)
+        self.assertEqual(raised.status, jobs.JobStatus.FAILED)
+        self.assertEqual(
+            raised.result["status"]["error"], "Failed with exception [ValueError]"
+        )
+        with self.assertRaises(KeyError):
+            queue.submit("unknown", {})
+
+    def test_queue_full(self):
+        """
+        Test that submissions are rejected once the queue is full, and accepted
+        again once it drains.
+        """
+        release = threading.Event()
+
+        def runner(check, data):
+            release.wait(5)
+            return {}, 200
+
+        queue = jobs.JobQueue(workers=1, max_queued=1, retention=60, runner=runner)
+        running = queue.submit("all", {})
+        while running.started is None:
+            time.sleep(0.01)
+        queued = queue.submit("all", {})
+        with self.assertRaises(jobs.QueueFullError):
+            queue.submit("all", {})
+        self.assertEqual(queue.queued(), 1)
+        release.set()
+        wait_finished(queued)
+        self.assertEqual(queued.status, jobs.JobStatus.DONE)
+        wait_finished(queue.submit("all", {}))
+
+    def test_retention(self):
+        """
+        Test that finished jobs are forgotten after the retention time.
+        """
+        queue = jobs.JobQueue(
+            workers=1, max_queued=4, retention=0, runner=lambda check, data: ({}, 200)
+        )
+        job = wait_finished(queue.submit("all", {}))
+        time.sleep(0.01)
+        wait_finished(queue.submit("all", {}))
+        self.assertIsNone(queue.get(job.id))
+
+    def test_webhook(self):
+        """
+        Test that the webhook receives the finished job.
+        """
+        received = []
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_POST(self):  # pylint: disable=invalid-name
+                length = int(self.headers["Content-Length"])
+                received.append(json.loads(self.rfile.read(length)))
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                pass
+
+        server = http.server.HTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.handle_request, daemon=True).start()
+        try:
+            queue = jobs.JobQueue(
+                workers=1,
+                max_queued=4,
+                retention=60,
+                runner=lambda check, data: ({"ok": True}, 200),
+            )
+            job = queue.submit(
+                "ht", {"url": "u"}, webhook=f"http://127.0.0.1:{server.server_port}/"
+            )
+            deadline = time.time() + 5
+            while not received and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(len(received), 1)
+            self.assertEqual(received[0]["id"], job.id)
+            self.assertEqual(received[0]["status"], "done")
+            self.assertEqual(received[0]["result"], {"ok": True})
+        finally:
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the DevTools sessions.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import json
+import unittest
+from unittest import mock
+
+from crest.utils import cdp
+from crest.utils import timeline
+
+
+class FakeSocket:
+    """
+    DevTools websocket answering the commands in reverse order, after an event.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self.received = []
+
+    def send(self, message):
+        self.sent.append(json.loads(message))
+
+    def recv(self):
+        if not self.received:
+            self.received = [{"method": "DOM.documentUpdated", "params": {}}] + [
+                {"id": command["id"], "error": {"message": "boom"}}
+                if command["method"] == "Fail"
+                else {"id": command["id"], "result": {"method": command["method"]}}
+                for command in reversed(self.sent)
+            ]
+        return json.dumps(self.received.pop(0))
+
+    def close(self):
+        pass
+
+
+class TestCdp(unittest.TestCase):
+    """
+    Unit tests for the cdp module.
+    """
+
+    def setUp(self):
+        self.driver = mock.Mock()
+        self.driver.capabilities = {"goog:chromeOptions": {"debuggerAddress": "localhost:9222"}}
+        self.driver.execute_cdp_cmd.side_effect = lambda method, params: (
+            {"targetInfo": {"targetId": "T"}}
+            if method == "Target.getTargetInfo"
+            else {"relayed": method}
+        )
+
+    def test_pipelined(self):
+        """
+        Test that a batch of commands is sent at once, and the results are
+        returned in order of the commands.
+        """
+        socket = FakeSocket()
+        websocket = mock.Mock()
+        websocket.create_connection.return_value = socket
+        with mock.patch.dict("sys.modules", websocket=websocket):
+            session = cdp.Session(self.driver)
+        self.assertTrue(session.pipelined)
+        self.assertEqual(
+            websocket.create_connection.call_args[0][0], "ws://localhost:9222/devtools/page/T"
+        )
+        with session, timeline.record("pseudo") as recorded:
+            results = session.send_all([("DOM.enable", {}), ("CSS.enable", {})])
+            self.assertEqual(results, [{"method": "DOM.enable"}, {"method": "CSS.enable"}])
+            with self.assertRaises(cdp.CdpError):
+                session.send_all([("Fail", {}), ("DOM.disable", {})])
+        self.assertFalse(session.pipelined)
+        self.assertEqual(recorded.asdict()["round_trips"], 2)
+        self.assertEqual([command["id"] for command in socket.sent], [1, 2, 3, 4])
+
+    def test_relayed(self):
+        """
+        Test that the commands are relayed by chromedriver without DevTools
+        address.
+        """
+        self.driver.capabilities = {}
+        with cdp.Session(self.driver) as session:
+            self.assertFalse(session.pipelined)
+            self.assertEqual(session.send("DOM.enable"), {"relayed": "DOM.enable"})
+        self.driver.execute_cdp_cmd.side_effect = RuntimeError("boom")
+        with self.assertRaises(cdp.CdpError):
+            session.send("DOM.enable")
+
+
+if __name__ == "__main__":
+    unittest.main()
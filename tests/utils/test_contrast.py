@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the contrast ratios of colors.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import math
+import unittest
+
+import numpy as np
+
+from crest.utils import contrast
+
+
+def get_luminance(color):
+    """
+    Relative luminance of an (r, g, b) color, with a power per channel.
+    """
+    channels = []
+    for value in color[:3]:
+        value /= 255
+        channels.append(value / 12.92 if value <= 0.03928 else ((value + 0.055) / 1.055) ** 2.4)
+    return 0.2126 * channels[0] + 0.7152 * channels[1] + 0.0722 * channels[2]
+
+
+class TestContrast(unittest.TestCase):
+    """
+    Unit tests for the contrast module.
+    """
+
+    def test_parse_color(self):
+        """
+        Test that the colors are parsed in any CSS syntax, and invalid or
+        context dependent colors are not.
+        """
+        self.assertEqual(contrast.parse_color("rgb(0, 0, 238)"), (0, 0, 238, 255))
+        self.assertEqual(contrast.parse_color("rgba(255, 255, 255, 0.5)"), (255, 255, 255, 128))
+        self.assertEqual(contrast.parse_color("rgb(1 2 3 / 0)"), (1, 2, 3, 0))
+        self.assertEqual(contrast.parse_color("#0f08"), (0, 255, 0, 136))
+        self.assertEqual(contrast.parse_color("RebeccaPurple"), (102, 51, 153, 255))
+        self.assertEqual(contrast.parse_color("transparent"), (0, 0, 0, 0))
+        self.assertEqual(contrast.parse_color("hsl(120 100% 25%)"), (0, 128, 0, 255))
+        for red in (
+            "red",
+            "#f00",
+            "hsl(0deg, 100%, 50%)",
+            "hwb(0 0% 0%)",
+            "lab(54.29 80.8 69.89)",
+            "lch(54.29 106.84 40.85)",
+            "oklab(0.628 0.2249 0.1258)",
+            "oklch(0.628 0.2577 29.23)",
+            "color(srgb 1 0 0)",
+            "color(display-p3 0.9175 0.2003 0.1386)",
+        ):
+            self.assertEqual(contrast.parse_color(red), (255, 0, 0, 255), red)
+        self.assertIsNone(contrast.parse_color("currentcolor"))
+        self.assertIsNone(contrast.parse_color("rgb(1, 2)"))
+        self.assertIsNone(contrast.parse_color(None))
+
+    def test_luminance(self):
+        """
+        Test that the luminances from the lookup table match the WCAG formula,
+        and are NaN for unknown colors.
+        """
+        colors = [(r, g, b) for r in range(0, 256, 15) for g in (0, 128, 255) for b in (7, 200)]
+        np.testing.assert_allclose(
+            contrast.luminance(colors), [get_luminance(color) for color in colors], rtol=1e-12
+        )
+        luminances = contrast.luminance(["rgb(255, 255, 255)", None, "not a color"])
+        self.assertAlmostEqual(luminances[0], 1)
+        self.assertTrue(math.isnan(luminances[1]) and math.isnan(luminances[2]))
+
+    def test_contrast_ratio(self):
+        """
+        Test that contrast ratios do not depend on the order of the colors, and
+        that NaN ratios pass no threshold.
+        """
+        luminances = contrast.luminance(["rgb(0, 0, 0)", "rgb(255, 255, 255)", None])
+        ratios = contrast.contrast_ratio(luminances, luminances[[1, 0, 0]])
+        self.assertAlmostEqual(ratios[0], 21)
+        self.assertAlmostEqual(ratios[1], 21)
+        self.assertEqual(contrast.passes(ratios, 3).tolist(), [True, True, False])
+
+    def test_contrast_matrix(self):
+        """
+        Test that the matrix has the ratio of every pair of colors, and that
+        the masks apply each threshold.
+        """
+        ratios = contrast.contrast_matrix(["black", "white", "#777", "nope"], ["white", "black"])
+        self.assertEqual(ratios.shape, (4, 2))
+        self.assertAlmostEqual(ratios[0, 0], 21)
+        self.assertAlmostEqual(ratios[1, 1], 21)
+        self.assertAlmostEqual(ratios[1, 0], 1)
+        np.testing.assert_allclose(contrast.contrast_matrix(["#777"]), [[1]])
+        masks = contrast.contrast_masks(ratios)
+        self.assertEqual(set(masks), set(contrast.WCAG_THRESHOLDS))
+        self.assertEqual(
+            masks["aa"].tolist(), [[True, False], [False, True], [False, True], [False, False]]
+        )
+        masks = contrast.contrast_masks(ratios, {"low": 4})
+        self.assertEqual(
+            masks["low"].tolist(), [[True, False], [False, True], [True, True], [False, False]]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
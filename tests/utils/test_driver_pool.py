@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the WebDriver pool.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import threading
+import unittest
+
+from crest.utils import driver_pool
+
+
+class FakeSwitchTo:
+    """
+    Minimal stand-in for selenium's SwitchTo object.
+    """
+
+    def __init__(self, driver):
+        self._driver = driver
+
+    def window(self, handle):
+        self._driver.current_handle = handle
+
+
+class FakeDriver:
+    """
+    Minimal stand-in for a Chrome WebDriver, recording the calls made by the
+    pool.
+    """
+
+    def __init__(self):
+        self.window_handles = ["main"]
+        self.current_handle = "main"
+        self.switch_to = FakeSwitchTo(self)
+        self.healthy = True
+        self.quit_called = False
+        self.cdp_commands = []
+        self.urls = []
+
+    def get_window_size(self):
+        return {"width": 800, "height": 600}
+
+    def set_window_size(self, width, height):
+        pass
+
+    def execute_script(self, script, *args):
+        if not self.healthy:
+            raise RuntimeError("browser crashed")
+        if script == "return 1;":
+            return 1
+        return "https://example.com"
+
+    def execute_cdp_cmd(self, cmd, params):
+        self.cdp_commands.append(cmd)
+
+    def close(self):
+        self.window_handles.remove(self.current_handle)
+
+    def get(self, url):
+        self.urls.append(url)
+
+    def quit(self):
+        self.quit_called = True
+
+
+class TestDriverPool(unittest.TestCase):
+    """
+    Unit tests for the DriverPool class.
+    """
+
+    def setUp(self):
+        self.launched = []
+
+    def _factory(self):
+        driver = FakeDriver()
+        self.launched.append(driver)
+        return driver
+
+    def test_reuse(self):
+        """
+        Test that a released driver is reset and handed out again.
+        """
+        pool = driver_pool.DriverPool(size=2, max_uses=10, factory=self._factory)
+        driver = pool.acquire()
+        driver.window_handles.append("extra")
+        pool.release(driver)
+        self.assertIs(pool.acquire(), driver)
+        self.assertEqual(len(self.launched), 1)
+        self.assertEqual(driver.window_handles, ["main"])
+        self.assertIn("Network.clearBrowserCookies", driver.cdp_commands)
+        self.assertIn("Storage.clearDataForOrigin", driver.cdp_commands)
+        self.assertEqual(driver.urls, ["about:blank"])
+
+    def test_recycle(self):
+        """
+        Test that a driver is quit after serving the maximum number of scans.
+        """
+        pool = driver_pool.DriverPool(size=1, max_uses=2, factory=self._factory)
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        pool.release(first)
+        self.assertTrue(first.quit_called)
+        second = pool.acquire()
+        self.assertIsNot(second, first)
+        self.assertEqual(pool.stats().recycled, 1)
+        self.assertEqual(pool.stats().launched, 2)
+
+    def test_health_check(self):
+        """
+        Test that an idle driver failing the health check is replaced.
+        """
+        pool = driver_pool.DriverPool(size=1, max_uses=10, factory=self._factory)
+        first = pool.acquire()
+        pool.release(first)
+        first.healthy = False
+        second = pool.acquire()
+        self.assertIsNot(second, first)
+        self.assertTrue(first.quit_called)
+        self.assertEqual(pool.stats().discarded, 1)
+
+    def test_bounded(self):
+        """
+        Test that the pool never launches more drivers than its size and that
+        waiting callers get a driver once it is released.
+        """
+        pool = driver_pool.DriverPool(size=1, max_uses=10, factory=self._factory)
+        first = pool.acquire()
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+        waiter.start()
+        waiter.join(0.2)
+        self.assertEqual(acquired, [])
+        pool.release(first)
+        waiter.join(5)
+        self.assertEqual(acquired, [first])
+        stats = pool.stats()
+        self.assertEqual(stats.size, 1)
+        self.assertEqual(stats.in_use, 1)
+        self.assertEqual(stats.waits, 1)
+        self.assertGreater(stats.wait_time, 0)
+        self.assertEqual(len(self.launched), 1)
+
+    def test_timeout(self):
+        """
+        Test that acquire gives up after the acquire timeout.
+        """
+        pool = driver_pool.DriverPool(
+            size=1, max_uses=10, acquire_timeout=0.1, factory=self._factory
+        )
+        pool.acquire()
+        with self.assertRaises(driver_pool.PoolTimeoutError):
+            pool.acquire()
+
+    def test_try_acquire(self):
+        """
+        Test that try_acquire returns None instead of waiting when all the
+        drivers are in use.
+        """
+        pool = driver_pool.DriverPool(size=1, max_uses=10, factory=self._factory)
+        driver = pool.try_acquire()
+        self.assertIsNotNone(driver)
+        self.assertIsNone(pool.try_acquire())
+        pool.release(driver)
+        self.assertIs(pool.try_acquire(), driver)
+
+    def test_failed_warm(self):
+        """
+        Test that a launch failing in the background is logged and frees its
+        slot in the pool.
+        """
+
+        def factory():
+            raise TimeoutError("chromedriver download timed out")
+
+        pool = driver_pool.DriverPool(size=1, max_uses=10, factory=factory)
+        pool._prelaunch = 1  # pylint: disable=protected-access
+        with self.assertLogs(driver_pool.__name__, level="ERROR"):
+            pool._warm_logged()  # pylint: disable=protected-access
+        stats = pool.stats()
+        self.assertEqual(stats.idle, 0)
+        self.assertEqual(stats.in_use, 0)
+        pool._factory = self._factory  # pylint: disable=protected-access
+        self.assertIs(pool.try_acquire(), self.launched[0])
+
+    def test_prelaunch(self):
+        """
+        Test that warm() launches the configured number of idle drivers.
+        """
+        pool = driver_pool.DriverPool(size=3, max_uses=10, factory=self._factory)
+        pool._prelaunch = 2  # pylint: disable=protected-access
+        pool.warm()
+        stats = pool.stats()
+        self.assertEqual(stats.idle, 2)
+        self.assertEqual(stats.in_use, 0)
+        pool.close()
+        self.assertTrue(all(d.quit_called for d in self.launched))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the accounting of the WebDriver round trips.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import unittest
+from unittest import mock
+
+from selenium.webdriver.remote import webdriver
+
+from crest.utils import instrumented_driver
+from crest.utils import operation
+
+
+class Check(operation.Operation):
+    def _main(self, response):
+        pass
+
+
+class TestInstrumentedDriver(unittest.TestCase):
+    """
+    Unit tests for the instrumented_driver module.
+    """
+
+    def setUp(self):
+        # A driver without browser, answering every command with its name.
+        self.driver = object.__new__(instrumented_driver.InstrumentedChrome)
+        self.driver.session_id = None
+        patcher = mock.patch.object(
+            webdriver.WebDriver,
+            "execute",
+            autospec=True,
+            side_effect=lambda _, command, params=None: {"value": command},
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_not_recording(self):
+        """
+        Test that commands are not accounted outside of a recording.
+        """
+        with mock.patch.object(instrumented_driver, "get_caller") as get_caller:
+            self.assertEqual(self.driver.execute_script("return 1"), "w3cExecuteScript")
+        get_caller.assert_not_called()
+
+    def test_record_commands(self):
+        """
+        Test that commands are counted and sized by command and by the check
+        method sending them.
+        """
+        check = Check("https://example.com", driver=self.driver)
+        with instrumented_driver.record_commands() as stats:
+            check.get_css_path(None)
+            check.get_xpath(None)
+            self.driver.get_cookies()
+        result = stats.asdict()
+        self.assertEqual(result["calls"], 3)
+        self.assertEqual(result["commands"]["w3cExecuteScript"]["calls"], 2)
+        self.assertEqual(result["commands"]["getCookies"]["received"], len('"getCookies"'))
+        self.assertEqual(
+            result["commands"]["w3cExecuteScript"]["sent"],
+            len('{"script": "return cssPath(arguments[0]);", "args": [null]}')
+            + len('{"script": "return absoluteXPath(arguments[0]);", "args": [null]}'),
+        )
+        self.assertEqual(
+            {name: caller["commands"] for name, caller in result["callers"].items()},
+            {
+                "Check.get_css_path": {"w3cExecuteScript": 1},
+                "Check.get_xpath": {"w3cExecuteScript": 1},
+                "other": {"getCookies": 1},
+            },
+        )
+        self.assertIn("3 round trips", stats.summary())
+
+
+if __name__ == "__main__":
+    unittest.main()
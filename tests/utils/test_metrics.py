@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the metrics exposed in the Prometheus format.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+from concurrent import futures
+import unittest
+
+from crest import utils
+from crest.utils import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Unit tests for the metrics module.
+    """
+
+    def metric(self, cls, *args, **kwargs):
+        metric = cls(*args, **kwargs)
+        self.addCleanup(metrics.REGISTRY.unregister, metric)
+        return metric
+
+    def test_counter(self):
+        """
+        Test that counters are labelled with the current endpoint.
+        """
+        counter = self.metric(metrics.Counter, "test_total", "Test", ("endpoint", "status"))
+        counter.inc(status="200")
+        token = metrics.set_endpoint("/a")
+        try:
+            counter.inc(2, status="200")
+        finally:
+            metrics.reset_endpoint(token)
+        self.assertEqual(counter.get(endpoint="/a", status="200"), 2)
+        self.assertEqual(
+            counter.render(),
+            [
+                "# HELP test_total Test",
+                "# TYPE test_total counter",
+                'test_total{endpoint="/a",status="200"} 2',
+                'test_total{endpoint="none",status="200"} 1',
+            ],
+        )
+        with self.assertRaises(ValueError):
+            counter.inc(other="x")
+
+    def test_histogram(self):
+        """
+        Test the cumulative buckets, sum and count of histograms.
+        """
+        histogram = self.metric(metrics.Histogram, "test_seconds", "Test", ("phase",), (0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value, phase='a"b')
+        self.assertEqual(
+            histogram.render()[2:],
+            [
+                'test_seconds_bucket{phase="a\\"b",le="0.1"} 2',
+                'test_seconds_bucket{phase="a\\"b",le="1"} 3',
+                'test_seconds_bucket{phase="a\\"b",le="+Inf"} 4',
+                'test_seconds_sum{phase="a\\"b"} 2.65',
+                'test_seconds_count{phase="a\\"b"} 4',
+            ],
+        )
+
+    def test_gauge(self):
+        """
+        Test that gauges can be read from a function.
+        """
+        gauge = self.metric(metrics.Gauge, "test_drivers", "Test", ("state",))
+        gauge.set_function(lambda: {("idle",): 1, ("in_use",): 3})
+        self.assertEqual(
+            gauge.render()[2:], ['test_drivers{state="idle"} 1', 'test_drivers{state="in_use"} 3']
+        )
+        self.assertIn("# TYPE test_drivers gauge\n", metrics.REGISTRY.render())
+
+    def test_propagate_context(self):
+        """
+        Test that the endpoint follows the work submitted to thread pools, and
+        the generators consumed later.
+        """
+        token = metrics.set_endpoint("/b")
+        try:
+            get_endpoint = utils.propagate_context(metrics.get_endpoint)
+            endpoints = utils.iter_in_context(metrics.get_endpoint() for _ in range(2))
+        finally:
+            metrics.reset_endpoint(token)
+        self.assertEqual(list(endpoints), ["/b"] * 2)
+        with futures.ThreadPoolExecutor(2) as executor:
+            self.assertEqual(list(executor.map(lambda _: get_endpoint(), range(4))), ["/b"] * 4)
+            self.assertEqual(executor.submit(metrics.get_endpoint).result(), "none")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the sampling profiler of the requests.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+from concurrent import futures
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from crest import config
+from crest import utils
+from crest.utils import profiling
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class TestProfiling(unittest.TestCase):
+    """
+    Unit tests for the profiling module.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        patcher = mock.patch.dict(
+            config.global_args["profiling"], directory=self.directory, interval=0.001
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_threads(self):
+        """
+        Test that the threads working on a profiled request are sampled, and
+        the other threads are not.
+        """
+        profile, token = profiling.start("/crest/api/all")
+        try:
+            task = utils.propagate_context(busy_wait)
+            other = threading.Thread(target=busy_wait, args=(0.05,), name="other")
+            other.start()
+            with futures.ThreadPoolExecutor(1, thread_name_prefix="worker") as executor:
+                executor.submit(task, 0.05).result()
+            other.join()
+        finally:
+            profiling.reset(token)
+        profiling.finish(profile)
+        path = profiling.get_path(profile.id)
+        self.assertEqual(os.path.dirname(path), self.directory)
+        with open(path, encoding="utf-8") as profile_file:
+            result = json.load(profile_file)
+        names = {thread["name"] for thread in result["profiles"]}
+        self.assertIn("worker_0", names)
+        self.assertNotIn("other", names)
+        frames = result["shared"]["frames"]
+        worker = next(thread for thread in result["profiles"] if thread["name"] == "worker_0")
+        self.assertTrue(
+            any(frames[sample[-1]]["name"] == "busy_wait" for sample in worker["samples"])
+        )
+        self.assertEqual(len(worker["samples"]), len(worker["weights"]))
+
+    def test_not_profiled(self):
+        """
+        Test that nothing is sampled outside of a profiled request, and that
+        only profile IDs are valid paths.
+        """
+        with mock.patch.object(profiling.Profile, "add_thread") as add_thread:
+            utils.propagate_context(busy_wait)(0)
+        add_thread.assert_not_called()
+        self.assertIsNone(profiling.get_path("../manifest"))
+        with mock.patch.dict(config.global_args["profiling"], directory=None):
+            self.assertIsNone(profiling.get_path("20230101T000000-0123abcd"))
+
+
+if __name__ == "__main__":
+    unittest.main()
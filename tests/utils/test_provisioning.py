@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the provisioning of resources from an artifact directory.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from crest import config
+from crest.utils import provisioning
+
+FILES = {
+    "nltk_data/corpora/stopwords.zip": b"stopwords",
+    "model/config.json": b"{}",
+    "model/pytorch_model.bin": b"weights",
+    "chromedriver/chromedriver": b"#!/bin/sh",
+}
+
+
+class TestProvisioning(unittest.TestCase):
+    """
+    Unit tests for the provisioning module.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.artifact_dir = directory.name
+        for name, content in FILES.items():
+            self.write(name, content)
+        provisioning.write_manifest(self.artifact_dir)
+        patcher = mock.patch.dict(
+            config.global_args["provisioning"], artifact_dir=self.artifact_dir
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        provisioning.clear()
+        self.addCleanup(provisioning.clear)
+
+    def write(self, name, content):
+        path = os.path.join(self.artifact_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as resource_file:
+            resource_file.write(content)
+
+    def test_resolve(self):
+        """
+        Test that resources are verified once, then served from the cache.
+        """
+        self.assertTrue(provisioning.is_offline())
+        with mock.patch.object(
+            provisioning, "sha256sum", wraps=provisioning.sha256sum
+        ) as sha256sum:
+            model = provisioning.get_model_path()
+            self.assertEqual(model, os.path.join(self.artifact_dir, "model"))
+            self.assertEqual(sha256sum.call_count, 2)
+            self.assertEqual(provisioning.get_model_path(), model)
+            self.assertEqual(sha256sum.call_count, 2)
+        self.assertEqual(
+            provisioning.get_chromedriver_path(),
+            os.path.join(self.artifact_dir, "chromedriver/chromedriver"),
+        )
+        self.assertEqual(
+            provisioning.get_nltk_data_path(), os.path.join(self.artifact_dir, "nltk_data")
+        )
+
+    def test_corrupted(self):
+        """
+        Test that corrupted, unlisted and missing files are rejected.
+        """
+        self.write("chromedriver/chromedriver", b"tampered")
+        with self.assertRaisesRegex(provisioning.ProvisioningError, "Checksum mismatch"):
+            provisioning.get_chromedriver_path()
+        self.write("model/extra.bin", b"")
+        with self.assertRaisesRegex(provisioning.ProvisioningError, "Unlisted"):
+            provisioning.get_model_path()
+        os.remove(os.path.join(self.artifact_dir, "nltk_data/corpora/stopwords.zip"))
+        with self.assertRaisesRegex(provisioning.ProvisioningError, "missing"):
+            provisioning.get_nltk_data_path()
+        os.remove(os.path.join(self.artifact_dir, provisioning.MANIFEST))
+        with self.assertRaisesRegex(provisioning.ProvisioningError, "manifest"):
+            provisioning.resolve("model")
+
+    def test_online(self):
+        """
+        Test that without artifact directory, the model is fetched by name and
+        chromedriver is installed once.
+        """
+        with mock.patch.dict(config.global_args["provisioning"], artifact_dir=None), mock.patch(
+            "webdriver_manager.chrome.ChromeDriverManager"
+        ) as manager:
+            manager.return_value.install.return_value = "/bin/chromedriver"
+            self.assertFalse(provisioning.is_offline())
+            self.assertEqual(provisioning.get_model_path(), "gargam/roberta-base-crest")
+            self.assertIsNone(provisioning.get_nltk_data_path())
+            self.assertEqual(provisioning.get_chromedriver_path(), "/bin/chromedriver")
+            self.assertEqual(provisioning.get_chromedriver_path(), "/bin/chromedriver")
+            self.assertEqual(manager.return_value.install.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the cache of check results.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import os.path
+import tempfile
+import time
+import unittest
+
+from crest.utils import result_cache
+
+
+class TestResultCache(unittest.TestCase):
+    """
+    Unit tests for the ResultCache class and the key helpers.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache", "results.sqlite3")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_keys(self):
+        """
+        Test that keys depend on all their parts, but not on the order of
+        dict items.
+        """
+        key = result_cache.make_key("cc", 1, "http://a", {"x": 1, "y": 2}, "f")
+        self.assertEqual(
+            key, result_cache.make_key("cc", 1, "http://a", {"y": 2, "x": 1}, "f")
+        )
+        self.assertNotEqual(
+            key, result_cache.make_key("cc", 2, "http://a", {"x": 1, "y": 2}, "f")
+        )
+        self.assertNotEqual(
+            result_cache.fingerprint(b"<html></html>"),
+            result_cache.fingerprint(b"<html> </html>"),
+        )
+
+    def test_memory_lru(self):
+        """
+        Test that the least recently used entries are evicted from memory, and
+        that every read returns a copy.
+        """
+        cache = result_cache.ResultCache(ttl=60, memory_entries=2)
+        cache.set("a", {"n": 1}, 200)
+        cache.set("b", {"n": 2}, 200)
+        response, status_code, _ = cache.get("a")
+        self.assertEqual((response, status_code), ({"n": 1}, 200))
+        response["n"] = 10
+        cache.set("c", {"n": 3}, 200)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a")[0], {"n": 1})
+        self.assertEqual(cache.get("c")[0], {"n": 3})
+
+    def test_ttl(self):
+        """
+        Test that entries expire.
+        """
+        cache = result_cache.ResultCache(
+            ttl=0.05, memory_entries=2, disk_entries=2, path=self.path
+        )
+        cache.set("a", {"n": 1}, 200)
+        self.assertIsNotNone(cache.get("a"))
+        time.sleep(0.06)
+        self.assertIsNone(cache.get("a"))
+
+    def test_disk(self):
+        """
+        Test that entries are kept on disk across instances, up to the disk
+        limit.
+        """
+        cache = result_cache.ResultCache(
+            ttl=60, memory_entries=1, disk_entries=2, path=self.path
+        )
+        cache.set("a", {"n": 1}, 200)
+        cache.set("b", {"n": 2}, 200)
+        self.assertEqual(cache.get("a")[0], {"n": 1})
+        cache.set("c", {"n": 3}, 200)
+        reopened = result_cache.ResultCache(
+            ttl=60, memory_entries=1, disk_entries=2, path=self.path
+        )
+        self.assertEqual(reopened.get("a")[0], {"n": 1})
+        self.assertEqual(reopened.get("c")[0], {"n": 3})
+        self.assertIsNone(reopened.get("b"))
+        reopened.clear()
+        self.assertIsNone(reopened.get("c"))
+
+
+if __name__ == "__main__":
+    unittest.main()
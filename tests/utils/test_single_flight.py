@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the coalescing of identical concurrent calls.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import threading
+import time
+import unittest
+
+from crest.utils import single_flight
+
+
+class TestSingleFlight(unittest.TestCase):
+    """
+    Unit tests for the SingleFlight class.
+    """
+
+    def run_concurrently(self, flight, key, fn, count):
+        """
+        Call `flight.do(key, fn)` from `count` threads, and get the outcome of
+        each call, its result or the exception it raised.
+        """
+        outcomes = []
+        lock = threading.Lock()
+
+        def call():
+            try:
+                outcome = flight.do(key, fn)
+            except Exception as e:  # pylint: disable=broad-except
+                outcome = e
+            with lock:
+                outcomes.append(outcome)
+
+        threads = [threading.Thread(target=call) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return outcomes
+
+    def test_coalescing(self):
+        """
+        Test that concurrent calls for a key run the function once and share
+        its result.
+        """
+        flight = single_flight.SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return "result"
+
+        def release_when_waiting():
+            while "k" not in flight._calls or flight._calls["k"].waiters < 3:  # pylint: disable=protected-access
+                time.sleep(0.001)
+            release.set()
+
+        releaser = threading.Thread(target=release_when_waiting)
+        releaser.start()
+        outcomes = self.run_concurrently(flight, "k", fn, 4)
+        releaser.join(5)
+        self.assertEqual(calls, [1])
+        self.assertEqual(
+            sorted(outcomes), [("result", False, 3)] + [("result", True, 3)] * 3
+        )
+        self.assertEqual(flight.in_flight(), 0)
+
+    def test_keys(self):
+        """
+        Test that calls for different keys, or sequential calls, all run.
+        """
+        flight = single_flight.SingleFlight()
+        self.assertEqual(flight.do("a", lambda: 1), (1, False, 0))
+        self.assertEqual(flight.do("a", lambda: 2), (2, False, 0))
+        self.assertEqual(flight.do("b", lambda: 3), (3, False, 0))
+
+    def test_error(self):
+        """
+        Test that the exception of a call is raised to every caller, and that
+        the key is released.
+        """
+        flight = single_flight.SingleFlight()
+        release = threading.Event()
+
+        def fn():
+            release.wait(5)
+            raise ValueError("failed")
+
+        def release_when_waiting():
+            while "k" not in flight._calls or flight._calls["k"].waiters < 1:  # pylint: disable=protected-access
+                time.sleep(0.001)
+            release.set()
+
+        releaser = threading.Thread(target=release_when_waiting)
+        releaser.start()
+        outcomes = self.run_concurrently(flight, "k", fn, 2)
+        releaser.join(5)
+        self.assertEqual(len(outcomes), 2)
+        for outcome in outcomes:
+            self.assertIsInstance(outcome, ValueError)
+        self.assertEqual(flight.do("k", lambda: 1), (1, False, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
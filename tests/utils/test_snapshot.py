@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the page snapshots.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+import unittest
+
+from lxml import etree
+
+from crest.utils import snapshot
+
+STYLES = ("display", "visibility", "opacity", "background-color")
+VISIBLE = ("block", "visible", "1", "rgba(0, 0, 0, 0)")
+
+# (parent, node type, node name, attributes, text, styles or None if the node
+# is not rendered, pseudo-element)
+NODES = [
+    (-1, 9, "#document", {}, None, None, False),
+    (0, 1, "HTML", {}, None, VISIBLE, False),
+    (1, 1, "HEAD", {}, None, None, False),
+    (1, 1, "BODY", {}, None, ("block", "visible", "1", "rgb(255, 255, 255)"), False),
+    (3, 1, "DIV", {"id": "main", "@click": "go()"}, None, VISIBLE, False),
+    (4, 1, "A", {"href": "#"}, None, ("inline", "visible", "1", "rgba(0, 0, 0, 0)"), False),
+    (5, 3, "#text", {}, "link", ("inline", "visible", "1", "rgba(0, 0, 0, 0)"), False),
+    (5, 1, "::before", {}, None, ("inline", "visible", "1", "rgba(0, 0, 0, 0)"), True),
+    (4, 1, "VIDEO", {}, None, ("inline", "hidden", "1", "rgba(0, 0, 0, 0)"), False),
+    (4, 1, "DIV", {"class": "folded"}, None, None, False),
+    (9, 1, "A", {}, None, None, False),
+    (4, 11, "#document-fragment", {}, None, None, False),
+    (11, 1, "SPAN", {}, None, VISIBLE, False),
+    (4, 1, "VIDEO", {}, None, ("inline", "visible", "0.05", "rgba(0, 0, 0, 0)"), False),
+    (4, 1, "VIDEO", {}, None, ("inline", "visible", "0.5", "rgba(0, 0, 0, 0)"), False),
+]
+
+
+def make_result():
+    """
+    Build a DOMSnapshot.captureSnapshot result for NODES.
+    """
+    strings = []
+
+    def string(value):
+        if value is None:
+            return -1
+        if value not in strings:
+            strings.append(value)
+        return strings.index(value)
+
+    nodes = {
+        "parentIndex": [],
+        "nodeType": [],
+        "nodeName": [],
+        "nodeValue": [],
+        "attributes": [],
+        "pseudoType": {"index": [], "value": []},
+    }
+    layout = {"nodeIndex": [], "styles": [], "bounds": []}
+    for index, (parent, node_type, name, attributes, text, styles, pseudo) in enumerate(NODES):
+        nodes["parentIndex"].append(parent)
+        nodes["nodeType"].append(node_type)
+        nodes["nodeName"].append(string(name))
+        nodes["nodeValue"].append(string(text))
+        nodes["attributes"].append(
+            [string(v) for item in attributes.items() for v in item]
+        )
+        if pseudo:
+            nodes["pseudoType"]["index"].append(index)
+            nodes["pseudoType"]["value"].append(string("before"))
+        if styles is not None:
+            layout["nodeIndex"].append(index)
+            layout["styles"].append([string(v) for v in styles])
+            layout["bounds"].append([0, 10 * index, 100, 10])
+    document = {"documentURL": string("http://example.com/"), "nodes": nodes, "layout": layout}
+    return {"documents": [document], "strings": strings}
+
+
+class TestDomSnapshot(unittest.TestCase):
+    """
+    Unit tests for the DomSnapshot class.
+    """
+
+    def setUp(self):
+        self.snapshot = snapshot.DomSnapshot(make_result(), STYLES)
+
+    def test_nodes(self):
+        """
+        Test the node, attribute and style accessors.
+        """
+        self.assertEqual(self.snapshot.url, "http://example.com/")
+        self.assertEqual(len(self.snapshot), len(NODES))
+        self.assertEqual(self.snapshot.node_name(4), "div")
+        self.assertEqual(self.snapshot.parent(4), 3)
+        self.assertFalse(self.snapshot.is_element(7))
+        self.assertEqual(list(self.snapshot.elements())[:3], [1, 2, 3])
+        self.assertEqual(self.snapshot.attribute(5, "href"), "#")
+        self.assertIsNone(self.snapshot.attribute(5, "id"))
+        self.assertEqual(self.snapshot.style(3, "background-color"), "rgb(255, 255, 255)")
+        self.assertEqual(dict(zip(STYLES, VISIBLE)), self.snapshot.styles(4))
+        self.assertIsNone(self.snapshot.style(9, "display"))
+        self.assertEqual(self.snapshot.styles(9), {})
+        self.assertEqual(self.snapshot.bounds(4), (0, 40, 100, 10))
+        self.assertIsNone(self.snapshot.bounds(10))
+
+    def test_visibility(self):
+        """
+        Test that visibility follows the rules of the isVisible page helper.
+        """
+        self.assertTrue(self.snapshot.is_visible(5))
+        self.assertFalse(self.snapshot.is_visible(8))
+        self.assertFalse(self.snapshot.is_visible(10))
+        self.assertFalse(self.snapshot.is_visible(13))
+        self.assertTrue(self.snapshot.is_visible(14))
+
+    def test_tree(self):
+        """
+        Test that the tree mirrors the live DOM, without shadow roots and
+        pseudo-elements.
+        """
+        self.assertEqual(
+            etree.tostring(self.snapshot.tree, encoding="unicode"),
+            '<html><head/><body><div id="main"><a href="#">link</a><video/>'
+            '<div class="folded"><a/></div><video/><video/></div></body></html>',
+        )
+        self.assertEqual(self.snapshot.find("/html[1]/body[1]/div[1]/video[3]"), 14)
+        self.assertEqual(self.snapshot.find("/html[1]/body[1]/div[1]/div[1]/a[1]"), 10)
+        self.assertIsNone(self.snapshot.find("/html[1]/body[1]/span[1]"))
+        element = self.snapshot.tree.find("body/div/a")
+        self.assertEqual(self.snapshot.index(element), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the on-demand loading of the model and the start-up timings.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+from concurrent import futures
+import time
+import unittest
+from unittest import mock
+
+from crest.config import global_args
+from crest.utils import startup_util
+
+
+class TestStartupUtil(unittest.TestCase):
+    """
+    Unit tests for the startup_util module.
+    """
+
+    def test_get_transformer_model(self):
+        """
+        Test that the model is loaded once, by the first of concurrent callers.
+        """
+
+        def load():
+            time.sleep(0.05)
+            return "tokenizer", "model"
+
+        with mock.patch.dict(global_args["model_params"]), mock.patch.object(
+            startup_util, "load_transformer_model", side_effect=load
+        ) as load_model:
+            global_args["model_params"].pop("tokenizer", None)
+            global_args["model_params"].pop("transfomer_model", None)
+            with futures.ThreadPoolExecutor(4) as executor:
+                results = list(executor.map(lambda _: startup_util.get_transformer_model(), range(4)))
+            self.assertEqual(results, [("tokenizer", "model")] * 4)
+            self.assertEqual(load_model.call_count, 1)
+            self.assertEqual(global_args["model_params"]["transfomer_model"], "model")
+        self.assertNotEqual(global_args["model_params"].get("transfomer_model"), "model")
+
+    def test_startup_report(self):
+        """
+        Test that the start-up phases and the total are reported.
+        """
+        with mock.patch.dict(startup_util.startup_timings, clear=True):
+            startup_util.reset()
+            with startup_util.timed("phase"):
+                time.sleep(0.01)
+            report = startup_util.log_startup_report()
+        self.assertEqual(list(report), ["phase", "total"])
+        self.assertGreaterEqual(report["phase"], 0.01)
+        self.assertGreaterEqual(report["total"], report["phase"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the timeline of the requests.
+"""
+# Copyright 2023 VMware, Inc.
+# SPDX-License-Identifier: MIT
+
+from concurrent import futures
+import unittest
+
+from crest import utils
+from crest.utils import timeline
+
+
+def strip_times(node):
+    """
+    Drop the start offsets and durations of a timeline converted to dicts.
+    """
+    node = {k: v for k, v in node.items() if k not in ("start", "duration")}
+    if "children" in node:
+        node["children"] = [strip_times(child) for child in node["children"]]
+    return node
+
+
+class TestTimeline(unittest.TestCase):
+    """
+    Unit tests for the timeline module.
+    """
+
+    def test_not_recording(self):
+        """
+        Test that spans and round trips are ignored outside of a timeline.
+        """
+        self.assertFalse(timeline.is_recording())
+        with timeline.span("page"):
+            timeline.count_round_trip()
+        self.assertFalse(timeline.is_recording())
+
+    def test_nested_spans(self):
+        """
+        Test that spans are nested, round trips are counted in their span and
+        its ancestors, and repeated spans are merged.
+        """
+        with timeline.record("kfi") as recorded:
+            with timeline.span("page"):
+                timeline.count_round_trip()
+                for _ in range(2):
+                    with timeline.span("inject_helpers"):
+                        timeline.count_round_trip()
+            with timeline.span("traversal"):
+                for _ in range(3):
+                    with timeline.span("focus_step"):
+                        timeline.count_round_trip()
+                        timeline.count_round_trip()
+        self.assertFalse(timeline.is_recording())
+        result = recorded.asdict()
+        self.assertEqual(result["start"], 0)
+        self.assertGreaterEqual(result["duration"], result["children"][1]["duration"])
+        self.assertEqual(
+            strip_times(result),
+            {
+                "name": "kfi",
+                "round_trips": 9,
+                "children": [
+                    {
+                        "name": "page",
+                        "round_trips": 3,
+                        "children": [{"name": "inject_helpers", "round_trips": 2, "count": 2}],
+                    },
+                    {
+                        "name": "traversal",
+                        "round_trips": 6,
+                        "children": [{"name": "focus_step", "round_trips": 6, "count": 3}],
+                    },
+                ],
+            },
+        )
+
+    def test_threads(self):
+        """
+        Test that the spans of the threads working on a request join its
+        timeline.
+        """
+
+        def task(name):
+            with timeline.span(name):
+                timeline.count_round_trip()
+
+        with timeline.record("all") as recorded:
+            with futures.ThreadPoolExecutor(2) as executor:
+                for name in ("cc", "kfi"):
+                    executor.submit(utils.propagate_context(task), name).result()
+            # Work submitted without the context of the request is not recorded.
+            executor = futures.ThreadPoolExecutor(1)
+            executor.submit(task, "other").result()
+            executor.shutdown()
+        self.assertEqual(
+            strip_times(recorded.asdict()),
+            {
+                "name": "all",
+                "round_trips": 2,
+                "children": [
+                    {"name": "cc", "round_trips": 1},
+                    {"name": "kfi", "round_trips": 1},
+                ],
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()